@@ -0,0 +1,269 @@
+import abc
+import logging
+import os
+import select
+import socket
+import threading
+import uuid
+from collections import defaultdict
+from typing import Callable, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from app.db.database import engine
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Seconds waited before listening again after a failure
+LISTEN_RETRY_DELAY = 1
+
+# Handlers are called with the ID of the changed entity, or None when any entity may have changed
+Handler = Callable[[Optional[int]], None]
+
+
+class InvalidationBus:
+    """
+    Broadcasts entity changed events to the other worker processes, so they can drop
+    or refresh what they keep in memory about the entity.
+    The publishing process applies the change itself: events are only delivered to
+    the handlers of the other processes, through the transport given to start().
+    Events are delivered at most once. When a transport may have lost events, every
+    handler is called with None.
+    """
+
+    def __init__(self):
+        self.sender = uuid.uuid4().hex
+        self._handlers = defaultdict(list)
+        self._transport = None
+
+    def subscribe(self, entity: str, handler: Handler):
+        self._handlers[entity].append(handler)
+
+    def publish(self, entity: str, id: Optional[int] = None):
+        """
+        :param entity: kind of the changed entity
+        :param id: ID of the changed entity, None if any entity of this kind may have changed
+        """
+        if self._transport is not None:
+            self._transport.send(self.encode(entity, id))
+
+    def start(self, transport: "Transport"):
+        self.stop()
+        self._transport = transport
+        transport.start(self.receive, self.reset)
+
+    def stop(self):
+        if self._transport is not None:
+            self._transport.stop()
+            self._transport = None
+
+    def encode(self, entity: str, id: Optional[int]) -> str:
+        return "%s:%s:%s" % (self.sender, entity, "" if id is None else id)
+
+    def receive(self, message: str):
+        sender, entity, id = message.split(":")
+        if sender != self.sender:
+            self.dispatch(entity, int(id) if id else None)
+
+    def reset(self):
+        """
+        Calls every handler with None, when events may have been lost.
+        """
+        for entity in list(self._handlers):
+            self.dispatch(entity, None)
+
+    def dispatch(self, entity: str, id: Optional[int]):
+        for handler in self._handlers.get(entity, []):
+            try:
+                handler(id)
+            except Exception:
+                logger.exception("Invalidation of %s %s failed", entity, id)
+
+
+class Transport(abc.ABC):
+    """
+    Delivers the messages sent by a process to the other processes.
+    """
+
+    def start(self, receive: Callable[[str], None], reset: Callable[[], None]):
+        """
+        :param receive: called with each message received
+        :param reset: called when messages may have been lost
+        """
+        self._receive = receive
+        self._reset = reset
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self.listen, name=type(self).__name__, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    @abc.abstractmethod
+    def listen(self):
+        """
+        Receives the messages until the transport is stopped, in the thread started by start().
+        """
+
+    @abc.abstractmethod
+    def send(self, message: str):
+        """
+        Sends the message to the other processes.
+        """
+
+
+class PostgresTransport(Transport):
+    """
+    Transport over Postgres LISTEN/NOTIFY, which reaches every process connected
+    to the same DB whatever the host it runs on.
+    https://www.postgresql.org/docs/current/sql-notify.html
+    """
+
+    def __init__(self, engine: Engine, channel: str):
+        self.engine = engine
+        self.channel = channel
+
+    def send(self, message: str):
+        with self.engine.connect() as conn:
+            conn.execution_options(autocommit=True).execute(
+                text("SELECT pg_notify(:channel, :message)"), channel=self.channel, message=message)
+
+    def listen(self):
+        while not self._stopped.is_set():
+            try:
+                self._listen()
+            except Exception:
+                logger.exception("Listening on channel %s failed", self.channel)
+                self._stopped.wait(LISTEN_RETRY_DELAY)
+
+    def _listen(self):
+        # A connection outside of the pool, as it is held while the process runs
+        dialect = self.engine.dialect
+        cargs, cparams = dialect.create_connect_args(self.engine.url)
+        conn = dialect.connect(*cargs, **cparams)
+        try:
+            conn.autocommit = True
+            conn.cursor().execute('LISTEN "%s"' % self.channel)
+            # Events sent while there was no listener are lost
+            self._reset()
+            while not self._stopped.is_set():
+                if select.select([conn], [], [], 1) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    self._receive(conn.notifies.pop(0).payload)
+        finally:
+            conn.close()
+
+
+class SocketTransport(Transport):
+    """
+    Transport over UNIX datagram sockets for a single host, like the workers of a
+    development server on SQLite. Each process binds a socket in the given directory
+    and sends messages to every other socket found there.
+    Sends never block: when the queue of a process is full, the message is dropped and
+    the process is sent a reset marker instead, as soon as its queue has room again.
+    """
+
+    # Datagram which tells a process that messages to it were lost
+    RESET = b"reset"
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.path = os.path.join(directory, "%s-%s.sock" % (os.getpid(), uuid.uuid4().hex[:8]))
+
+    def start(self, receive: Callable[[str], None], reset: Callable[[], None]):
+        os.makedirs(self.directory, exist_ok=True)
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._socket.bind(self.path)
+        self._socket.settimeout(1)
+        # A separate socket, so a process which does not keep up never blocks the request publishing the change
+        self._send_socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._send_socket.setblocking(False)
+        # Sockets which missed messages and were not sent the reset marker yet
+        self._missed = set()
+        self._lock = threading.Lock()
+        super().start(receive, reset)
+
+    def stop(self):
+        super().stop()
+        self._socket.close()
+        self._send_socket.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def send(self, message: str):
+        data = message.encode()
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if path != self.path:
+                self._send_to(path, data)
+
+    def _send_to(self, path: str, data: bytes):
+        with self._lock:
+            # The reset marker also covers this message
+            missed = path in self._missed
+            try:
+                self._send_socket.sendto(self.RESET if missed else data, path)
+                self._missed.discard(path)
+            except BlockingIOError:
+                # The queue of the process is full
+                self._missed.add(path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Socket of a process which is gone
+                self._missed.discard(path)
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+            except OSError:
+                logger.exception("Sending to %s failed", path)
+                self._missed.add(path)
+
+    def _send_resets(self):
+        """
+        Sends the reset marker to the processes which missed messages, without waiting for the next message.
+        """
+        with self._lock:
+            missed = list(self._missed)
+        for path in missed:
+            self._send_to(path, self.RESET)
+
+    def listen(self):
+        while not self._stopped.is_set():
+            if self._missed:
+                self._send_resets()
+            try:
+                data = self._socket.recv(4096)
+            except socket.timeout:
+                continue
+            except OSError:
+                if not self._stopped.is_set():
+                    logger.exception("Receiving on %s failed", self.path)
+                return
+            if data == self.RESET:
+                self._reset()
+            else:
+                self._receive(data.decode())
+
+
+def create_transport() -> Optional[Transport]:
+    """
+    Creates the transport of the invalidation bus configured in the settings.
+    By default, Postgres notifications are used on Postgres, and UNIX sockets otherwise.
+    :return: the transport, None when the bus is local to the process
+    """
+    kind = settings.INVALIDATION_BUS
+    if kind == "auto":
+        kind = "postgres" if engine.dialect.name == "postgresql" else "socket"
+    if kind == "postgres":
+        return PostgresTransport(engine, settings.INVALIDATION_BUS_CHANNEL)
+    if kind == "socket":
+        return SocketTransport(settings.INVALIDATION_BUS_SOCKET_DIR)
+    return None
+
+
+invalidation_bus = InvalidationBus()
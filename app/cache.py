@@ -0,0 +1,176 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional
+
+from app.bus import invalidation_bus
+from app.settings import settings
+
+
+class TTLCache:
+    """
+    Bounded in-process cache. Entries expire after a time to live, and the least
+    recently used entry is evicted when the cache is full: when it has maxsize
+    entries, or when their values take more than maxbytes, if given.
+    Hit, miss, eviction and expiration counters are kept to tune its size and TTL.
+    """
+
+    def __init__(self, name: str, maxsize: int, ttl: float, timer: Callable[[], float] = time.monotonic,
+                 maxbytes: Optional[int] = None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.maxbytes = maxbytes
+        # Total size of the values, as measured by sizeof()
+        self.bytes = 0
+        self._timer = timer
+        # key -> (expiration time, value), least recently used first
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0 and self.ttl > 0 and self.maxbytes != 0
+
+    def sizeof(self, value: Any) -> int:
+        """
+        Size of a value in bytes, which caches bounded by maxbytes override.
+        """
+        return 0
+
+    def get(self, key: Hashable, default: Any = None, valid: Optional[Callable[[Any], bool]] = None) -> Any:
+        """
+        :param valid: function telling whether a value is still valid, invalid values expire
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > self._timer() and (valid is None or valid(entry[1])):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                self._remove(key)
+                self.expirations += 1
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any):
+        if not self.enabled:
+            return
+        size = self.sizeof(value)
+        with self._lock:
+            self._remove(key)
+            # Caching it would evict everything else
+            if self.maxbytes is not None and size > self.maxbytes:
+                return
+            self._entries[key] = (self._timer() + self.ttl, value)
+            self.bytes += size
+            while len(self._entries) > self.maxsize or (self.maxbytes is not None and self.bytes > self.maxbytes):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def get_many(self, keys: Iterable[Hashable], load: Callable[[List], Iterable],
+                 key: Callable[[Any], Hashable]) -> List:
+        """
+        Gets the values of the given keys, loading the missing ones in a single call.
+        :param keys: keys to look up
+        :param load: function returning the values of a list of missing keys
+        :param key: function returning the key of a loaded value
+        :return: the values found, in the order of the keys
+        """
+        found = {i: self.get(i) for i in keys}
+        missing = [i for i, value in found.items() if value is None]
+        if missing:
+            for value in load(missing):
+                self.set(key(value), value)
+                found[key(value)] = value
+        return [i for i in found.values() if i is not None]
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def _remove(self, key: Hashable):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= self.sizeof(entry[1])
+
+    def on_changed(self, key: Optional[Hashable]):
+        """
+        Invalidation bus handler, None clears the whole cache.
+        """
+        if key is None:
+            self.clear()
+        else:
+            self.invalidate(key)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "name": self.name,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "bytes": self.bytes,
+                "maxbytes": self.maxbytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+class ResponseCache(TTLCache):
+    """
+    Cache of encoded responses, bounded by their total size. Each response is stored
+    with the version of the entity it was built from, and only served for this version,
+    so it is never stale whatever the changes the cache was not told about.
+    """
+
+    def get_body(self, key: Hashable, version: Any) -> Optional[bytes]:
+        entry = self.get(key, valid=lambda i: i[0] == version)
+        return entry[1] if entry is not None else None
+
+    def set_body(self, key: Hashable, version: Any, body: bytes):
+        self.set(key, (version, body))
+
+    def sizeof(self, value: Any) -> int:
+        return len(value[1])
+
+
+# Every cache created by create_cache() and create_response_cache(), for monitoring
+caches: List[TTLCache] = []
+
+
+def create_cache(name: str) -> TTLCache:
+    """
+    Creates a cache sized from the settings, registered under the given name.
+    The cache is invalidated by the changes of the entity of the same name
+    published by the other workers on the invalidation bus.
+    """
+    return _register(TTLCache(name, settings.CACHE_MAX_SIZE, settings.CACHE_TTL), name)
+
+
+def create_response_cache(name: str, entity: str) -> ResponseCache:
+    """
+    Creates a cache of encoded responses sized from the settings, registered under the given
+    name and invalidated by the changes of the given entity published on the invalidation bus.
+    """
+    cache = ResponseCache(name, settings.CACHE_MAX_SIZE, settings.CACHE_TTL,
+                          maxbytes=settings.RESPONSE_CACHE_MAX_BYTES)
+    return _register(cache, entity)
+
+
+def _register(cache: TTLCache, entity: str) -> TTLCache:
+    caches.append(cache)
+    invalidation_bus.subscribe(entity, cache.on_changed)
+    return cache
@@ -0,0 +1,158 @@
+import zlib
+from typing import List, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+
+class GzipCompressor:
+
+    def __init__(self, level: int):
+        # 16 + MAX_WBITS writes the gzip header and trailer
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        # A sync flush sends what was compressed so far, so the chunks of a stream are not held back
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+class BrotliCompressor:
+
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.process(data) + self._compressor.finish()
+
+
+def available_encodings(encodings: List[str]) -> List[str]:
+    """
+    :param encodings: content codings, br and gzip, in the order of preference
+    :return: the ones which can be used, brotli requiring the Brotli package
+    """
+    return [i for i in encodings if i != "br" or brotli is not None]
+
+
+def negotiate_encoding(accept_encoding: str, encodings: List[str]) -> Optional[str]:
+    """
+    Picks the content coding of a response from the Accept-Encoding header of the request.
+    https://tools.ietf.org/html/rfc7231#section-5.3.4
+    :param accept_encoding: Accept-Encoding header of the request
+    :param encodings: available content codings, in the order of preference of the server
+    :return: the accepted coding with the highest quality, the server preference breaking ties, None if none is
+    """
+    qualities = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = 1.0
+        name, _, value = params.strip().partition("=")
+        if name.strip() == "q":
+            try:
+                quality = float(value)
+            except ValueError:
+                quality = 0.0
+        qualities[coding.strip().lower()] = quality
+
+    best, best_quality = None, 0.0
+    for coding in encodings:
+        quality = qualities.get(coding, qualities.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+class CompressionMiddleware:
+    """
+    Compresses the responses with brotli or gzip, as negotiated with the Accept-Encoding header.
+    Responses smaller than minimum_size are sent as they are, compressing them costs more than it saves.
+    Streaming responses are compressed chunk by chunk, whatever their size.
+    Works like the Starlette GZipMiddleware, which supports neither brotli nor compression levels.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, encodings: Optional[List[str]] = None,
+                 gzip_level: int = 6, brotli_quality: int = 5):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.encodings = available_encodings(["br", "gzip"] if encodings is None else encodings)
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] == "http" and self.encodings:
+            encoding = negotiate_encoding(Headers(scope=scope).get("Accept-Encoding", ""), self.encodings)
+            if encoding:
+                responder = CompressionResponder(self.app, encoding, self.create_compressor(encoding),
+                                                 self.minimum_size)
+                await responder(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+    def create_compressor(self, encoding: str):
+        if encoding == "br":
+            return BrotliCompressor(self.brotli_quality)
+        return GzipCompressor(self.gzip_level)
+
+
+class CompressionResponder:
+    """
+    Compresses the response of a single request.
+    """
+
+    def __init__(self, app: ASGIApp, encoding: str, compressor, minimum_size: int):
+        self.app = app
+        self.encoding = encoding
+        self.compressor = compressor
+        self.minimum_size = minimum_size
+        self.send = None
+        self.start_message = None
+        # None until the first body message decides whether the response is compressed
+        self.compressing = None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    async def send_compressed(self, message: Message):
+        if message["type"] == "http.response.start":
+            # Held until the first body message, which tells whether the headers change
+            self.start_message = message
+            return
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.compressing is None:
+            headers = MutableHeaders(raw=self.start_message["headers"])
+            self.compressing = "content-encoding" not in headers and (more_body or len(body) >= self.minimum_size)
+            if self.compressing:
+                body = self.compress(body, more_body)
+                headers["Content-Encoding"] = self.encoding
+                headers.add_vary_header("Accept-Encoding")
+                if more_body:
+                    # The length of a stream is not known in advance
+                    del headers["Content-Length"]
+                else:
+                    headers["Content-Length"] = str(len(body))
+            await self.send(self.start_message)
+        elif self.compressing:
+            body = self.compress(body, more_body)
+
+        if self.compressing:
+            message = dict(message, body=body)
+        await self.send(message)
+
+    def compress(self, body: bytes, more_body: bool) -> bytes:
+        return self.compressor.compress(body) if more_body else self.compressor.finish(body)
@@ -0,0 +1,105 @@
+import itertools
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from types import SimpleNamespace
+from typing import Any, Awaitable, Callable, List, Optional
+
+from databases import Database
+from databases.core import Connection
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.sql import ClauseElement
+
+from app.db.queries import add_query
+from app.settings import settings
+
+
+def create_async_database(uri: str) -> Database:
+    """
+    Creates the asyncio connection pool of the async DB mode: asyncpg for Postgres, aiosqlite for SQLite.
+    The Postgres pool is sized like the one of the blocking engine, SQLite connections are not pooled.
+    https://www.encode.io/databases/
+    :param uri: DB connection URI
+    :return: the database, connected by the application startup
+    """
+    options = {}
+    if make_url(uri).get_backend_name() == "postgresql":
+        options["min_size"] = settings.DB_POOL_SIZE
+        options["max_size"] = settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW
+    return Database(uri, **options)
+
+
+async_database = create_async_database(settings.SQLALCHEMY_DATABASE_URI)
+async_replicas = [create_async_database(uri) for uri in settings.SQLALCHEMY_REPLICA_URIS]
+_replica_counter = itertools.count()
+
+
+async def connect_async_databases():
+    for i in [async_database] + async_replicas:
+        await i.connect()
+
+
+async def disconnect_async_databases():
+    for i in [async_database] + async_replicas:
+        await i.disconnect()
+
+
+class AsyncSession:
+    """
+    Connection of an async unit of work. Rows are returned with attribute access, like the DB models,
+    so the DTOs are built by the same from_model classmethods. The statements are recorded in the
+    query statistics of the current request.
+    """
+
+    def __init__(self, connection: Connection):
+        self.connection = connection
+
+    async def fetch_all(self, query: ClauseElement) -> List[SimpleNamespace]:
+        rows = await self._execute(self.connection.fetch_all, query)
+        return [SimpleNamespace(**dict(i)) for i in rows]
+
+    async def fetch_one(self, query: ClauseElement) -> Optional[SimpleNamespace]:
+        row = await self._execute(self.connection.fetch_one, query)
+        return SimpleNamespace(**dict(row)) if row is not None else None
+
+    async def fetch_values(self, query: ClauseElement) -> Optional[tuple]:
+        """
+        :return: the values of the first row, like a version, None if there is no row
+        """
+        row = await self._execute(self.connection.fetch_one, query)
+        return tuple(row.values()) if row is not None else None
+
+    async def _execute(self, fetch: Callable[[ClauseElement], Awaitable], query: ClauseElement) -> Any:
+        start = time.perf_counter()
+        try:
+            return await fetch(query)
+        finally:
+            add_query(time.perf_counter() - start)
+
+
+# Session of the async unit of work open in the current task, if any
+_current_session = ContextVar("current_async_session", default=None)
+
+
+@asynccontextmanager
+async def async_db_session():
+    """
+    Async context manager which provides a read-only unit of work to the nested block,
+    on a single connection and transaction. Like with db_session(), nested blocks join the
+    unit of work of the outermost one, which goes to a read replica, in turns, when there is any.
+    :return: an AsyncSession
+    """
+    session = _current_session.get()
+    if session is not None:
+        yield session
+        return
+
+    database = async_replicas[next(_replica_counter) % len(async_replicas)] if async_replicas else async_database
+    async with database.connection() as connection:
+        async with connection.transaction():
+            session = AsyncSession(connection)
+            token = _current_session.set(session)
+            try:
+                yield session
+            finally:
+                _current_session.reset(token)
@@ -1,33 +1,135 @@
+import itertools
 from contextlib import contextmanager
+from contextvars import ContextVar
 
 from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.url import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy.pool import QueuePool
 
+from app.db.pool import PoolMetrics, instrumented_pool_class, pool_metrics
+from app.db.queries import attach_query_stats
 from app.settings import settings
 
-engine = create_engine(settings.SQLALCHEMY_DATABASE_URI)
+
+def create_db_engine(uri: str, name: str) -> Engine:
+    """
+    Creates an engine with the pool configured from the settings and instrumented
+    with live metrics, registered under the given name. The statements it executes
+    are counted and timed in the statistics of the current request.
+    :param uri: DB connection URI
+    :param name: name of the engine in the pool metrics
+    :return: the new engine
+    """
+    url = make_url(uri)
+    dialect = url.get_dialect()
+    metrics = PoolMetrics(name)
+    pool_class = instrumented_pool_class(dialect.get_pool_class(url), metrics)
+
+    options = {
+        "poolclass": pool_class,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+    }
+    if issubclass(pool_class, QueuePool):
+        options["pool_size"] = settings.DB_POOL_SIZE
+        options["max_overflow"] = settings.DB_MAX_OVERFLOW
+        options["pool_timeout"] = settings.DB_POOL_TIMEOUT
+    if dialect.name == "sqlite":
+        # Connections may be used by another thread than the one which opened them, like the steps of a streaming response
+        options["connect_args"] = {"check_same_thread": False}
+    if dialect.name == "postgresql":
+        # Send executemany() calls, like bulk association inserts, as multi-row INSERT statements
+        options["executemany_mode"] = "values"
+
+    engine = create_engine(url, **options)
+    metrics.attach(engine)
+    pool_metrics.append(metrics)
+    attach_query_stats(engine)
+    return engine
+
+
+engine = create_db_engine(settings.SQLALCHEMY_DATABASE_URI, "primary")
 SessionLocal = scoped_session(sessionmaker(autocommit=False, autoflush=False, bind=engine, expire_on_commit=False))
 
+replica_engines = [create_db_engine(uri, "replica-%s" % i) for i, uri in enumerate(settings.SQLALCHEMY_REPLICA_URIS, 1)]
+ReplicaSessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False)
+_replica_counter = itertools.count()
+
+
+def select_replica() -> Engine:
+    """
+    Picks the replica engine for a read-only unit of work, either in turns or
+    the one with the fewest connections checked out.
+    """
+    if settings.DB_REPLICA_SELECTION == "least_connections":
+        return min(replica_engines, key=lambda i: i.pool.metrics.checked_out)
+    return replica_engines[next(_replica_counter) % len(replica_engines)]
+
+
 Base = declarative_base()
 
 
+# Session of the unit of work open in the current context, if any
+_current_session = ContextVar("current_session", default=None)
+
+
 @contextmanager
-def db_session():
+def db_session(read_only: bool = False):
     """
     Context manager which provides transaction management for the nested
     block. A transaction is started when the block is entered, and then either
     committed if the block exits without incident, or rolled back if an error
     is raised.
+    Nested blocks join the unit of work of the outermost one: they share its
+    session, and only the outermost block commits or rolls back. This way a
+    service method and the service methods it calls use a single connection
+    checkout and a single commit.
+    Read-only units of work go to a read replica when there is any. Reads nested
+    in a write unit of work stay on the primary.
     https://docs.sqlalchemy.org/en/13/orm/session_basics.html
+    :param read_only: whether the block only reads from the DB
     :return: a scoped session
     """
-    session = SessionLocal()
+    session = _current_session.get()
+    if session is not None:
+        if not read_only and session.info.get("read_only"):
+            raise RuntimeError("A write unit of work cannot be nested in a read-only one")
+        yield session
+        return
+
+    if read_only and replica_engines:
+        session = ReplicaSessionLocal(bind=select_replica(), info={"read_only": True})
+    else:
+        session = SessionLocal()
+    token = _current_session.set(session)
     try:
         yield session
         session.commit()
     except Exception:
         session.rollback()
         raise
+    finally:
+        _current_session.reset(token)
+        session.close()
+
+
+@contextmanager
+def streaming_session():
+    """
+    Context manager which provides a read-only session to blocks running across
+    several threads, like the generator of a streaming response. As each step may
+    run in another thread and context, the session is neither the one of the
+    current unit of work nor shared with the db_session blocks nested in it.
+    :return: a session, closed when the block exits
+    """
+    if replica_engines:
+        session = ReplicaSessionLocal(bind=select_replica(), info={"read_only": True})
+    else:
+        session = SessionLocal.session_factory()
+    try:
+        yield session
     finally:
         session.close()
@@ -1,9 +1,10 @@
 from datetime import datetime
 
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Index
 from sqlalchemy.orm import relationship, backref
 
 from app.db.database import Base
+from app.db.search import add_search_indexes, add_trigram_extension
 
 
 class User(Base):
@@ -15,9 +16,23 @@ class User(Base):
     last_name = Column(String)
     is_active = Column(Boolean, default=True)
     is_admin = Column(Boolean, default=False)
-    organization_id = Column(Integer, ForeignKey("organization.id"), nullable=False, index=True)
+    organization_id = Column(Integer, ForeignKey("organization.id"), nullable=False)
     organization = relationship("Organization", backref="users")
     roles = relationship('Role', secondary="user_role")
+    # Incremented on every change of the user details, to build their ETag
+    version = Column(Integer, default=1, server_default="1", nullable=False)
+
+    __table_args__ = (
+        # Keyset pagination over the users of an organization
+        Index("ix_user_organization_id_id", "organization_id", "id"),
+        # Keyset pagination over the active or admin users
+        Index("ix_user_is_active_id", "is_active", "id"),
+        Index("ix_user_is_admin_id", "is_admin", "id"),
+        # Prefix search. Postgres only uses an index for LIKE 'prefix%' with the pattern operators
+        Index("ix_user_email_pattern", "email", postgresql_ops={"email": "text_pattern_ops"}),
+        Index("ix_user_first_name", "first_name", postgresql_ops={"first_name": "text_pattern_ops"}),
+        Index("ix_user_last_name", "last_name", postgresql_ops={"last_name": "text_pattern_ops"}),
+    )
 
 
 class Organization(Base):
@@ -25,6 +40,8 @@ class Organization(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(200), unique=True, index=True, nullable=False)
+    # Incremented on every change of the organization, to build the ETag of its details
+    version = Column(Integer, default=1, server_default="1", nullable=False)
 
 
 class Right(Base):
@@ -54,19 +71,37 @@ class RoleRight(Base):
     __tablename__ = "role_right"
 
     id = Column(Integer, primary_key=True, index=True)
-    role_id = Column(Integer, ForeignKey("role.id"), nullable=False, index=True)
+    role_id = Column(Integer, ForeignKey("role.id"), nullable=False)
     role = relationship("Role", backref=backref("role_rights", cascade="all, delete, delete-orphan"))
     right_id = Column(Integer, ForeignKey("right.id"), nullable=False, index=True)
     right = relationship("Right", backref=backref("role_rights", cascade="all, delete, delete-orphan"))
     created_date_time = Column(DateTime, default=datetime.utcnow(), nullable=False)
 
+    __table_args__ = (
+        # Rights of a role without reading the table rows
+        Index("ix_role_right_role_id_right_id", "role_id", "right_id"),
+    )
+
 
 class UserRole(Base):
     __tablename__ = "user_role"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("user.id"), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("user.id"), nullable=False)
     user = relationship("User", backref=backref("user_roles", cascade="all, delete, delete-orphan"))
-    role_id = Column(Integer, ForeignKey("role.id"), nullable=False, index=True)
+    role_id = Column(Integer, ForeignKey("role.id"), nullable=False)
     role = relationship("Role", backref=backref("user_roles", cascade="all, delete, delete-orphan"))
     created_date_time = Column(DateTime, default=datetime.utcnow(), nullable=False)
+
+    __table_args__ = (
+        # Roles of a user, and users of a role, without reading the table rows
+        Index("ix_user_role_user_id_role_id", "user_id", "role_id"),
+        Index("ix_user_role_role_id_user_id", "role_id", "user_id"),
+    )
+
+
+# Fuzzy search of the users, roles and rights
+add_trigram_extension(Base.metadata)
+add_search_indexes(User.__table__, ["first_name", "last_name", "email"])
+add_search_indexes(Role.__table__, ["name"])
+add_search_indexes(Right.__table__, ["name"])
@@ -0,0 +1,66 @@
+import threading
+import time
+from typing import List, Type
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+
+from app.metrics import Histogram
+
+# Upper bounds, in seconds, of the checkout wait histogram buckets
+CHECKOUT_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class PoolMetrics:
+    """
+    Live metrics of a connection pool: connections currently checked out and
+    time spent waiting for a connection on checkout.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.engine = None
+        self.checked_out = 0
+        self.checkout_wait = Histogram(CHECKOUT_WAIT_BUCKETS)
+        self._lock = threading.Lock()
+
+    def attach(self, engine: Engine):
+        """
+        Track the connections checked out of the given engine pool.
+        """
+        self.engine = engine
+        event.listen(engine, "checkout", self._on_checkout)
+        event.listen(engine, "checkin", self._on_checkin)
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        with self._lock:
+            self.checked_out += 1
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.checked_out -= 1
+
+
+# Metrics of every engine created by the application
+pool_metrics: List[PoolMetrics] = []
+
+
+class _CheckoutTimingMixin:
+    metrics: PoolMetrics
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            self.metrics.checkout_wait.observe(time.perf_counter() - start)
+
+
+def instrumented_pool_class(pool_class: Type[Pool], metrics: PoolMetrics) -> Type[Pool]:
+    """
+    Build a subclass of the given pool class which records its checkout waits in metrics.
+    The metrics are a class attribute so they survive the pool being recreated by
+    Engine.dispose() or after a disconnect.
+    """
+    return type(pool_class.__name__, (_CheckoutTimingMixin, pool_class), {"metrics": metrics})
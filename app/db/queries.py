@@ -0,0 +1,82 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Generator
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class QueryStats:
+    """
+    Number of SQL statements executed and time spent executing them, in seconds.
+    """
+    __slots__ = ("count", "duration")
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+
+# Statistics of the request being served, if any. The object is set by the request and updated in place,
+# so the route handlers running in the threadpool, with a copy of the context, update the same one
+_current_stats = ContextVar("query_stats", default=None)
+
+
+@contextmanager
+def record_queries() -> Generator[QueryStats, None, None]:
+    """
+    Context manager which records the statements executed while the nested block runs,
+    including by the threads it runs code in with a copy of its context.
+    A block nested in another one records its statements in its own statistics, which are added
+    to the ones of the enclosing block when it exits, like the requests served while a benchmark runs.
+    :return: the statistics of the statements, updated as they are executed
+    """
+    parent = _current_stats.get()
+    stats = QueryStats()
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+        if parent is not None:
+            # Added once, by the thread which entered the block, rather than by each thread running in its context
+            parent.count += stats.count
+            parent.duration += stats.duration
+
+
+def attach_query_stats(engine: Engine):
+    """
+    Record the statements executed by the given engine in the QueryStats of the current context.
+    """
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # A stack, as statements may be executed while another one runs, like the ones of a custom type
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def add_query(duration: float):
+    """
+    Record a statement executed in the given time, in seconds, in the QueryStats of the current context.
+    Used for the statements which do not go through an engine, like the ones of the async DB mode.
+    """
+    stats = _current_stats.get()
+    if stats is not None:
+        # Only the thread or task serving the request updates it at a time, so no lock is needed
+        stats.count += 1
+        stats.duration += duration
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    add_query(time.perf_counter() - conn.info["query_start_time"].pop())
+
+
+def _handle_error(exception_context):
+    # after_cursor_execute is not called for a failed statement, its start time is dropped here
+    connection = exception_context.connection
+    if exception_context.cursor is not None and connection is not None and connection.info.get("query_start_time"):
+        connection.info["query_start_time"].pop()
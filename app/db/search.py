@@ -0,0 +1,69 @@
+import sqlite3
+from typing import Sequence
+
+from sqlalchemy import DDL, MetaData, Table, event
+
+# First SQLite release with the FTS5 trigram tokenizer
+SQLITE_TRIGRAM_VERSION = (3, 34, 0)
+
+
+def has_trigram_tokenizer() -> bool:
+    """
+    Whether the SQLite library Python is linked against has the FTS5 trigram tokenizer.
+    Without it, the full-text tables are not created and the search falls back to LIKE.
+    """
+    return sqlite3.sqlite_version_info >= SQLITE_TRIGRAM_VERSION
+
+
+def search_table_name(table: Table) -> str:
+    """
+    Name of the SQLite full-text table indexing the searchable columns of the table.
+    """
+    return "%s_search" % table.name
+
+
+def add_search_indexes(table: Table, columns: Sequence[str]):
+    """
+    Registers the indexes of the fuzzy search over the given columns, created and dropped with the table.
+    On Postgres, these are pg_trgm GIN indexes, which serve the similarity operators and ILIKE '%substring%'.
+    https://www.postgresql.org/docs/current/pgtrgm.html
+    On SQLite, an FTS5 table with the trigram tokenizer, kept in sync with the table by triggers. It requires
+    SQLite 3.34 or later: the table is skipped with older versions.
+    https://www.sqlite.org/fts5.html#the_trigram_tokenizer
+    """
+    for column in columns:
+        event.listen(table, "after_create", DDL(
+            'CREATE INDEX IF NOT EXISTS "ix_%(table)s_%(column)s_trgm" ON "%(table)s" USING gin ("%(column)s" gin_trgm_ops)',
+            context={"table": table.name, "column": column},
+        ).execute_if(dialect="postgresql"))
+
+    context = {
+        "table": table.name,
+        "search": search_table_name(table),
+        "columns": ", ".join(columns),
+        "new": ", ".join("new.%s" % i for i in columns),
+        "old": ", ".join("old.%s" % i for i in columns),
+    }
+    statements = [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS %(search)s "
+        "USING fts5(%(columns)s, content='%(table)s', content_rowid='id', tokenize='trigram')",
+        'CREATE TRIGGER IF NOT EXISTS %(search)s_insert AFTER INSERT ON "%(table)s" BEGIN '
+        "INSERT INTO %(search)s(rowid, %(columns)s) VALUES (new.id, %(new)s); END",
+        'CREATE TRIGGER IF NOT EXISTS %(search)s_delete AFTER DELETE ON "%(table)s" BEGIN '
+        "INSERT INTO %(search)s(%(search)s, rowid, %(columns)s) VALUES ('delete', old.id, %(old)s); END",
+        'CREATE TRIGGER IF NOT EXISTS %(search)s_update AFTER UPDATE ON "%(table)s" BEGIN '
+        "INSERT INTO %(search)s(%(search)s, rowid, %(columns)s) VALUES ('delete', old.id, %(old)s); "
+        "INSERT INTO %(search)s(rowid, %(columns)s) VALUES (new.id, %(new)s); END",
+    ]
+    for statement in statements:
+        event.listen(table, "after_create", DDL(statement, context=context).execute_if(
+            dialect="sqlite", callable_=lambda *args, **kwargs: has_trigram_tokenizer()))
+    # The triggers are dropped with the table, not the full-text table, which would keep the rows of the dropped one
+    event.listen(table, "before_drop", DDL("DROP TABLE IF EXISTS %(search)s", context=context).execute_if(dialect="sqlite"))
+
+
+def add_trigram_extension(metadata: MetaData):
+    """
+    Registers the creation of the pg_trgm extension, which the search indexes require, before the tables.
+    """
+    event.listen(metadata, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"))
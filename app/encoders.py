@@ -0,0 +1,30 @@
+import json
+from typing import Any
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+def _set_fields(obj: Any) -> dict:
+    """
+    Encodes the DTOs orjson does not support natively as the dict of their set fields.
+    """
+    if isinstance(obj, BaseModel):
+        return {k: v for k, v in obj.__dict__.items() if k in obj.__fields_set__}
+    raise TypeError
+
+
+def dumps(content: Any) -> bytes:
+    """
+    Encodes DTOs, and the lists and dicts of DTOs, to JSON. Only the set fields of the DTOs are encoded.
+    orjson is used when it is installed, jsonable_encoder and the json module otherwise.
+    """
+    if orjson is not None:
+        return orjson.dumps(content, default=_set_fields)
+    return json.dumps(jsonable_encoder(content, exclude_unset=True), ensure_ascii=False, allow_nan=False,
+                      separators=(",", ":")).encode("utf-8")
@@ -1,17 +1,29 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
 import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from starlette import status
 from starlette.requests import Request
-from starlette.responses import RedirectResponse, JSONResponse
+from starlette.responses import RedirectResponse, JSONResponse, PlainTextResponse
 
+from app.bus import invalidation_bus, create_transport
+from app.compression import CompressionMiddleware
 from app.config.exceptions import ValidationException
 from app.db import models
+from app.db.async_database import connect_async_databases, disconnect_async_databases
 from app.db.database import engine
+from app.metrics import Exposition, MetricsMiddleware
+from app.routers import monitoring
 from app.routers import organizations
+from app.routers import permissions
 from app.routers import rights
 from app.routers import roles
+from app.routers import search
 from app.routers import users
+from app.services.monitoring import MonitoringService
+from app.settings import settings
 
 app = FastAPI(
     title="FastAPI - Users management sample application",
@@ -26,14 +38,76 @@ app.add_middleware(
     allow_credentials=True,
 )
 
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.COMPRESSION_MINIMUM_SIZE,
+    encodings=settings.COMPRESSION_ENCODINGS,
+    gzip_level=settings.COMPRESSION_GZIP_LEVEL,
+    brotli_quality=settings.COMPRESSION_BROTLI_QUALITY,
+)
+
+# Added last, so it is the outermost middleware and the durations include the other ones
+app.add_middleware(MetricsMiddleware, routes=app.routes)
+
 models.Base.metadata.create_all(bind=engine)
 
 
+@app.on_event("startup")
+async def configure_threadpool():
+    """
+    The blocking route handlers and DB access, all of them outside the async DB mode, run in the
+    event loop default executor. Its size bounds the number of in-flight blocking requests per worker.
+    """
+    if settings.THREADPOOL_SIZE:
+        loop = asyncio.get_event_loop()
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=settings.THREADPOOL_SIZE))
+
+
+@app.on_event("startup")
+async def connect_async_db():
+    """
+    In the async DB mode, the read routes of the rights, roles and organizations run on the event loop
+    with the asyncio connection pools.
+    """
+    if settings.DB_ASYNC:
+        await connect_async_databases()
+
+
+@app.on_event("shutdown")
+async def disconnect_async_db():
+    if settings.DB_ASYNC:
+        await disconnect_async_databases()
+
+
+@app.on_event("startup")
+def start_invalidation_bus():
+    """
+    Each worker keeps caches and a permission index in memory, which the changes
+    made by the other workers invalidate.
+    """
+    transport = create_transport()
+    if transport:
+        invalidation_bus.start(transport)
+
+
+@app.on_event("shutdown")
+def stop_invalidation_bus():
+    invalidation_bus.stop()
+
+
 @app.get("/", name="home")
 def main():
     return RedirectResponse(url="/docs/")
 
 
+@app.get("/metrics", name="metrics", response_class=PlainTextResponse)
+def metrics():
+    """
+    Metrics of the requests, DB pools and caches of this worker, in the Prometheus text format.
+    """
+    return PlainTextResponse(MonitoringService().get_metrics(), media_type=Exposition.CONTENT_TYPE)
+
+
 app.include_router(
     users.router,
     prefix="/users",
@@ -58,6 +132,25 @@ app.include_router(
     tags=["rights"],
 )
 
+app.include_router(
+    permissions.router,
+    prefix="/permissions",
+    tags=["permissions"],
+)
+
+app.include_router(
+    search.router,
+    prefix="/search",
+    tags=["search"],
+)
+
+
+app.include_router(
+    monitoring.router,
+    prefix="/monitoring",
+    tags=["monitoring"],
+)
+
 
 @app.exception_handler(ValidationException)
 async def validation_exception_handler(request: Request, exc: ValidationException) -> JSONResponse:
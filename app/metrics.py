@@ -0,0 +1,190 @@
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from starlette.routing import BaseRoute
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.db.queries import QueryStats, record_queries
+
+
+class Histogram:
+    """
+    Histogram of observed values, with Prometheus-like cumulative buckets.
+    Observations take a short uncontended lock, so it can stay enabled in production.
+    """
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(sorted(buckets))
+        # One counter per bucket, plus one for values above the last bucket (+Inf)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def snapshot(self) -> Dict:
+        """
+        :return: the cumulative count of observations for each bucket upper bound,
+        the total number of observations and their sum
+        """
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+
+        buckets = {}
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        return {"buckets": buckets, "count": cumulative, "sum": total}
+
+
+# Upper bounds of the histogram buckets of the requests: duration in seconds, DB statements and DB time in seconds
+REQUEST_DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+REQUEST_QUERIES_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+REQUEST_DB_DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+
+class RouteMetrics:
+    """
+    Metrics of the requests to a route with a method: duration, DB statements and DB time of each request,
+    and number of responses by status code.
+    """
+
+    def __init__(self):
+        self.duration = Histogram(REQUEST_DURATION_BUCKETS)
+        self.queries = Histogram(REQUEST_QUERIES_BUCKETS)
+        self.db_duration = Histogram(REQUEST_DB_DURATION_BUCKETS)
+        self.responses: Dict[int, int] = {}
+
+    def observe(self, status_code: int, duration: float, queries: QueryStats):
+        self.duration.observe(duration)
+        self.queries.observe(queries.count)
+        self.db_duration.observe(queries.duration)
+        # Only updated by the event loop thread
+        self.responses[status_code] = self.responses.get(status_code, 0) + 1
+
+
+class RequestMetrics:
+    """
+    Metrics of the requests served by this process, by route name and method.
+    They are updated by the middleware, which runs in the event loop thread, so the counters need no lock.
+    """
+
+    def __init__(self):
+        self.routes: Dict[Tuple[str, str], RouteMetrics] = {}
+        self.in_flight = 0
+
+    def route(self, name: str, method: str) -> RouteMetrics:
+        metrics = self.routes.get((name, method))
+        if metrics is None:
+            metrics = self.routes[(name, method)] = RouteMetrics()
+        return metrics
+
+
+request_metrics = RequestMetrics()
+
+
+class MetricsMiddleware:
+    """
+    Records the metrics of each request under the name of the route which served it,
+    "unmatched" when none did.
+    """
+
+    def __init__(self, app: ASGIApp, routes: Sequence[BaseRoute], metrics: RequestMetrics = request_metrics):
+        """
+        :param routes: routes of the application, whose names are the labels of the metrics.
+        Routes added after the middleware are taken into account.
+        """
+        self.app = app
+        self.routes = routes
+        self.metrics = metrics
+        self._names = {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # Not started when an error is raised, and sent as an internal server error by the outer middleware
+        status_code = 500
+
+        async def send_with_status(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        self.metrics.in_flight += 1
+        start = time.perf_counter()
+        try:
+            with record_queries() as queries:
+                await self.app(scope, receive, send_with_status)
+        finally:
+            self.metrics.in_flight -= 1
+            route = self.metrics.route(self.route_name(scope), scope["method"])
+            route.observe(status_code, time.perf_counter() - start, queries)
+
+    def route_name(self, scope: Scope) -> str:
+        # The router sets the endpoint of the matching route in the scope
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        if endpoint not in self._names:
+            self._names = {i.endpoint: i.name for i in self.routes if hasattr(i, "endpoint")}
+        return self._names.get(endpoint, "unmatched")
+
+
+class Exposition:
+    """
+    Metrics in the Prometheus text format.
+    https://prometheus.io/docs/instrumenting/exposition_formats/#text-based-format
+    """
+    CONTENT_TYPE = "text/plain; version=0.0.4"
+
+    def __init__(self):
+        self.lines: List[str] = []
+
+    def counter(self, name: str, help: str, samples: Iterable[Tuple[Dict[str, str], float]]):
+        self._header(name, "counter", help)
+        for labels, value in samples:
+            self._sample(name, labels, value)
+
+    def gauge(self, name: str, help: str, samples: Iterable[Tuple[Dict[str, str], float]]):
+        self._header(name, "gauge", help)
+        for labels, value in samples:
+            self._sample(name, labels, value)
+
+    def histogram(self, name: str, help: str, samples: Iterable[Tuple[Dict[str, str], Histogram]]):
+        """
+        :param samples: histograms, with their labels
+        """
+        self._header(name, "histogram", help)
+        for labels, histogram in samples:
+            snapshot = histogram.snapshot()
+            for bound, count in snapshot["buckets"].items():
+                self._sample(name + "_bucket", dict(labels, le="+Inf" if bound == "inf" else bound), count)
+            self._sample(name + "_sum", labels, snapshot["sum"])
+            self._sample(name + "_count", labels, snapshot["count"])
+
+    def render(self) -> str:
+        return "\n".join(self.lines) + "\n"
+
+    def _header(self, name: str, type: str, help: str):
+        self.lines.append("# HELP %s %s" % (name, help))
+        self.lines.append("# TYPE %s %s" % (name, type))
+
+    def _sample(self, name: str, labels: Dict[str, str], value: float):
+        if labels:
+            name += "{%s}" % ",".join('%s="%s"' % (key, _escape(label)) for key, label in labels.items())
+        self.lines.append("%s %s" % (name, value))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
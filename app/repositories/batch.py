@@ -0,0 +1,54 @@
+from datetime import datetime
+from typing import Any, Dict, List
+
+from sqlalchemy import bindparam
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.orm import Session
+
+
+def save_by_name(db: Session, model: Any, rows: List[Dict], existing: Dict[str, Any], upsert: bool) -> List[int]:
+    """
+    Inserts the rows of a model with a unique name and a description, like roles and rights.
+    With upsert, the ones whose name already exists update the description of the existing
+    record, if it changed. Otherwise, an IntegrityError is raised when a name already exists.
+    Postgres runs a single INSERT ... ON CONFLICT (name) DO UPDATE, which also handles the
+    records created or changed meanwhile. Other DBs run an executemany() insert of the new
+    records and an executemany() update of the changed ones.
+    :param model: model of the records
+    :param rows: name and description of each record
+    :param existing: records which already exist, by name
+    :param upsert: whether the existing records are updated
+    :return: IDs of the records actually updated
+    """
+    if not rows:
+        return []
+    table = model.__table__
+    now = datetime.utcnow()
+
+    if not upsert:
+        # Fails on the names created since existing was read
+        db.execute(table.insert(), rows)
+        updated = []
+    elif db.get_bind().dialect.name == "postgresql":
+        statement = postgresql_insert(table).values(rows)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.name],
+            set_={"description": statement.excluded.description, "modified_date_time": now},
+            where=table.c.description.is_distinct_from(statement.excluded.description),
+        )
+        # Inserted and updated records are returned, not the unchanged ones. Only the updated
+        # ones have a modification time, the inserted rows do not set it
+        returned = db.execute(statement.returning(table.c.id, table.c.modified_date_time))
+        updated = [id for id, modified_date_time in returned if modified_date_time is not None]
+    else:
+        new = [i for i in rows if i["name"] not in existing]
+        changed = [{"b_name": i["name"], "b_description": i["description"]} for i in rows
+                   if i["name"] in existing and existing[i["name"]].description != i["description"]]
+        if new:
+            db.execute(table.insert(), new)
+        if changed:
+            db.execute(table.update().where(table.c.name == bindparam("b_name"))
+                       .values(description=bindparam("b_description"), modified_date_time=now), changed)
+        updated = [existing[i["b_name"]].id for i in changed]
+    db.flush()
+    return updated
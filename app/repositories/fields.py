@@ -0,0 +1,27 @@
+from typing import List
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import load_only, joinedload, selectinload
+
+from app.schemas.fields import Fields
+
+
+def fields_options(model, fields: Fields) -> List:
+    """
+    Loader options which only load the requested fields of a DB model: its columns, and the
+    relationships with the requested columns of their related models. The other relationships
+    are left lazy, they are never loaded as long as they are not read.
+    :param model: DB model class
+    :param fields: requested fields, named like the attributes of the model
+    """
+    relationships = inspect(model).relationships
+    columns = [i for i in fields if i not in relationships]
+    options = [load_only(*columns)]
+    for name in fields:
+        if name in relationships:
+            attribute = getattr(model, name)
+            option = selectinload(attribute) if relationships[name].uselist else joinedload(attribute)
+            if fields[name] is not True:
+                option = option.load_only(*fields[name])
+            options.append(option)
+    return options
@@ -1,41 +1,103 @@
-from typing import List, Any
+from types import SimpleNamespace
+from typing import List, Any, Optional
 
 from serum import dependency
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 
-from app.db.models import Organization
+from app.db.async_database import AsyncSession
+from app.db.models import Organization, User
 from app.schemas.organization import OrganizationCreateDTO, OrganizationUpdateDTO
 
 
 @dependency
 class OrganizationRepository:
 
-    def get_all(self, db: Session) -> List[Organization]:
-        return db.query(Organization).all()
+    def get_all(self, db: Session, after: Optional[int], limit: int) -> List[Organization]:
+        query = db.query(Organization).order_by(Organization.id)
+        if after is not None:
+            query = query.filter(Organization.id > after)
+        return query.limit(limit).all()
 
     def get_by_id(self, db: Session, id: int) -> Organization:
         return db.query(Organization).get(id)
 
+    def get_by_ids(self, db: Session, ids: List[int]) -> List[Organization]:
+        if not ids:
+            return []
+        return db.query(Organization).filter(Organization.id.in_(ids)).all()
+
     def get_by_name(self, db: Session, name: str) -> Organization:
         return db.query(Organization).filter(Organization.name == name).first()
 
+    def get_users(self, db: Session, id: int, after: Optional[int], limit: int) -> List[User]:
+        query = db.query(User).filter(User.organization_id == id).order_by(User.id)
+        if after is not None:
+            query = query.filter(User.id > after)
+        return query.limit(limit).all()
+
+    def get_version(self, db: Session, id: int, limit: int) -> Optional[tuple]:
+        """
+        Returns a value which changes whenever the details of the organization change:
+        its version, and the number, versions and last ID of the given number of first users.
+        """
+        org = db.query(Organization.id, Organization.version).filter(Organization.id == id).first()
+        if not org:
+            return None
+
+        users = db.query(User.id, User.version).filter(User.organization_id == id).order_by(User.id).limit(limit).subquery()
+        return tuple(org) + tuple(db.query(func.count(users.c.id), func.sum(users.c.version), func.max(users.c.id)).one())
+
     def create(self, db: Session, data: OrganizationCreateDTO) -> Organization:
         org = Organization()
         org.name = data.name
 
         db.add(org)
-        db.commit()
+        db.flush()
         return org
 
     def update(self, db: Session, id: int, data: OrganizationUpdateDTO) -> Organization:
         org = self.get_by_id(db, id)
         org.name = data.name
+        org.version = Organization.version + 1
 
-        db.commit()
-        db.refresh(org)
+        db.flush()
         return org
 
     def delete(self, db: Session, id: int) -> Any:
         org = self.get_by_id(db, id)
         db.delete(org)
-        db.commit()
+        db.flush()
+
+
+@dependency
+class AsyncOrganizationRepository:
+    """
+    Read queries of the organizations for the async DB mode, as SQLAlchemy Core statements.
+    """
+
+    async def get_all(self, db: AsyncSession, after: Optional[int], limit: int) -> List[SimpleNamespace]:
+        query = select([Organization.__table__]).order_by(Organization.id)
+        if after is not None:
+            query = query.where(Organization.id > after)
+        return await db.fetch_all(query.limit(limit))
+
+    async def get_by_id(self, db: AsyncSession, id: int) -> Optional[SimpleNamespace]:
+        return await db.fetch_one(select([Organization.__table__]).where(Organization.id == id))
+
+    async def get_users(self, db: AsyncSession, id: int, after: Optional[int], limit: int) -> List[SimpleNamespace]:
+        query = select([User.__table__]).where(User.organization_id == id).order_by(User.id)
+        if after is not None:
+            query = query.where(User.id > after)
+        return await db.fetch_all(query.limit(limit))
+
+    async def get_version(self, db: AsyncSession, id: int, limit: int) -> Optional[tuple]:
+        """
+        Same value as OrganizationRepository.get_version.
+        """
+        org = await db.fetch_values(select([Organization.id, Organization.version]).where(Organization.id == id))
+        if not org:
+            return None
+
+        users = select([User.id, User.version]).where(User.organization_id == id).order_by(User.id).limit(limit).alias()
+        return org + await db.fetch_values(select([func.count(users.c.id), func.sum(users.c.version), func.max(users.c.id)]))
@@ -0,0 +1,22 @@
+from typing import List, Tuple
+
+from serum import dependency
+from sqlalchemy.orm import Session
+
+from app.db.models import UserRole, RoleRight
+
+
+@dependency
+class PermissionRepository:
+
+    def get_user_roles(self, db: Session) -> List[Tuple[int, int]]:
+        return db.query(UserRole.user_id, UserRole.role_id).all()
+
+    def get_role_rights(self, db: Session) -> List[Tuple[int, int]]:
+        return db.query(RoleRight.role_id, RoleRight.right_id).all()
+
+    def get_role_ids(self, db: Session, user_id: int) -> List[int]:
+        return [i for i, in db.query(UserRole.role_id).filter(UserRole.user_id == user_id)]
+
+    def get_right_ids(self, db: Session, role_id: int) -> List[int]:
+        return [i for i, in db.query(RoleRight.right_id).filter(RoleRight.role_id == role_id)]
@@ -1,32 +1,59 @@
 from datetime import datetime
-from typing import List, Any
+from types import SimpleNamespace
+from typing import List, Any, Optional, Dict
 
 from serum import dependency
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 
+from app.db.async_database import AsyncSession
 from app.db.models import Right
+from app.repositories.batch import save_by_name
 from app.schemas.right import RightCreateDTO, RightUpdateDTO
 
 
 @dependency
 class RightRepository:
 
-    def get_all(self, db: Session) -> List[Right]:
-        return db.query(Right).all()
+    def get_all(self, db: Session, after: Optional[int], limit: int) -> List[Right]:
+        query = db.query(Right).order_by(Right.id)
+        if after is not None:
+            query = query.filter(Right.id > after)
+        return query.limit(limit).all()
 
     def get_by_id(self, db: Session, id: int) -> Right:
         return db.query(Right).get(id)
 
+    def get_by_ids(self, db: Session, ids: List[int]) -> List[Right]:
+        if not ids:
+            return []
+        return db.query(Right).filter(Right.id.in_(ids)).all()
+
     def get_by_name(self, db: Session, name: str) -> Right:
         return db.query(Right).filter(Right.name == name).first()
 
+    def get_by_names(self, db: Session, names: List[str]) -> List[Right]:
+        if not names:
+            return []
+        return db.query(Right).filter(Right.name.in_(names)).populate_existing().all()
+
+    def save_batch(self, db: Session, data: List[RightCreateDTO], existing: Dict[str, Right], upsert: bool) -> List[int]:
+        """
+        Creates the given rights, or with upsert updates the description of the existing ones, in bulk.
+        :return: IDs of the rights actually updated
+        """
+        return save_by_name(db, Right, [{"name": i.name, "description": i.description} for i in data], existing, upsert)
+
+    def get_version(self, db: Session, id: int) -> Optional[tuple]:
+        return db.query(Right.id, Right.modified_date_time).filter(Right.id == id).first()
+
     def create(self, db: Session, data: RightCreateDTO) -> Right:
         right = Right()
         right.name = data.name
         right.description = data.description
 
         db.add(right)
-        db.commit()
+        db.flush()
         return right
 
     def update(self, db: Session, id: int, data: RightUpdateDTO) -> Right:
@@ -35,11 +62,29 @@ class RightRepository:
         right.description = data.description
         right.modified_date_time = datetime.utcnow()
 
-        db.commit()
-        db.refresh(right)
+        db.flush()
         return right
 
     def delete(self, db: Session, id: int) -> Any:
         right = self.get_by_id(db, id)
         db.delete(right)
-        db.commit()
+        db.flush()
+
+
+@dependency
+class AsyncRightRepository:
+    """
+    Read queries of the rights for the async DB mode, as SQLAlchemy Core statements.
+    """
+
+    async def get_all(self, db: AsyncSession, after: Optional[int], limit: int) -> List[SimpleNamespace]:
+        query = select([Right.__table__]).order_by(Right.id)
+        if after is not None:
+            query = query.where(Right.id > after)
+        return await db.fetch_all(query.limit(limit))
+
+    async def get_by_id(self, db: AsyncSession, id: int) -> Optional[SimpleNamespace]:
+        return await db.fetch_one(select([Right.__table__]).where(Right.id == id))
+
+    async def get_version(self, db: AsyncSession, id: int) -> Optional[tuple]:
+        return await db.fetch_values(select([Right.id, Right.modified_date_time]).where(Right.id == id))
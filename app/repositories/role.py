@@ -1,33 +1,75 @@
 from datetime import datetime
-from typing import List, Any
+from types import SimpleNamespace
+from typing import List, Any, Optional, Dict
 
 from serum import dependency
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session, selectinload
 
-from app.db.models import Role, Right
+from app.db.async_database import AsyncSession
+from app.db.models import Role, RoleRight, Right
+from app.repositories.batch import save_by_name
 from app.schemas.role import RoleCreateDTO, RoleUpdateDTO
 
 
 @dependency
 class RoleRepository:
+    # Loader options required to build a RoleDetailsDTO with a fixed number of queries
+    details_options = (selectinload(Role.rights),)
 
-    def get_all(self, db: Session) -> List[Role]:
-        return db.query(Role).all()
+    def get_all(self, db: Session, after: Optional[int], limit: int) -> List[Role]:
+        query = db.query(Role).order_by(Role.id)
+        if after is not None:
+            query = query.filter(Role.id > after)
+        return query.limit(limit).all()
 
     def get_by_id(self, db: Session, id: int) -> Role:
         return db.query(Role).get(id)
 
+    def get_details(self, db: Session, id: int) -> Role:
+        return db.query(Role).options(*self.details_options).populate_existing().filter(Role.id == id).first()
+
+    def get_by_ids(self, db: Session, ids: List[int]) -> List[Role]:
+        if not ids:
+            return []
+        return db.query(Role).filter(Role.id.in_(ids)).all()
+
     def get_by_name(self, db: Session, name: str) -> Role:
         return db.query(Role).filter(Role.name == name).first()
 
+    def get_by_names(self, db: Session, names: List[str]) -> List[Role]:
+        if not names:
+            return []
+        return db.query(Role).filter(Role.name.in_(names)).populate_existing().all()
+
+    def save_batch(self, db: Session, data: List[RoleCreateDTO], existing: Dict[str, Role], upsert: bool) -> List[int]:
+        """
+        Creates the given roles, or with upsert updates the description of the existing ones, in bulk.
+        :return: IDs of the roles actually updated
+        """
+        return save_by_name(db, Role, [{"name": i.name, "description": i.description} for i in data], existing, upsert)
+
+    def get_version(self, db: Session, id: int) -> Optional[tuple]:
+        """
+        Returns a value which changes whenever the details of the role change:
+        its modification time, and its rights.
+        As a right modification time is the most recent one, the latest is enough to detect changes of any right.
+        """
+        return db.query(Role.id, Role.modified_date_time, func.count(Right.id), func.max(Right.modified_date_time)) \
+            .outerjoin(RoleRight, RoleRight.role_id == Role.id) \
+            .outerjoin(Right, Right.id == RoleRight.right_id) \
+            .filter(Role.id == id) \
+            .group_by(Role.id, Role.modified_date_time) \
+            .first()
+
     def create(self, db: Session, data: RoleCreateDTO) -> Role:
         role = Role()
         role.name = data.name
         role.description = data.description
 
         db.add(role)
-        db.commit()
-        return role
+        db.flush()
+        return self.get_details(db, role.id)
 
     def update(self, db: Session, id: int, data: RoleUpdateDTO) -> Role:
         role = self.get_by_id(db, id)
@@ -35,31 +77,74 @@ class RoleRepository:
         role.description = data.description
         role.modified_date_time = datetime.utcnow()
 
-        db.commit()
-        db.refresh(role)
-        return role
+        db.flush()
+        return self.get_details(db, id)
 
     def delete(self, db: Session, id: int) -> Any:
         role = self.get_by_id(db, id)
         db.delete(role)
-        db.commit()
+        db.flush()
 
     def add_rights(self, db: Session, id: int, right_ids: List[int]):
-        role = self.get_by_id(db, id)
-        for right_id in right_ids:
-            right = db.query(Right).get(right_id)
-            role.rights.append(right)
-
-        db.commit()
-        db.refresh(role)
-        return role
+        """
+        Assigns the given rights to a role with a single multi-row insert.
+        Rights already assigned to the role are skipped.
+        """
+        assigned = {right_id for right_id, in db.query(RoleRight.right_id)
+                    .filter(RoleRight.role_id == id, RoleRight.right_id.in_(right_ids))}
+        rows = [{"role_id": id, "right_id": right_id} for right_id in dict.fromkeys(right_ids) if right_id not in assigned]
+        if rows:
+            db.execute(RoleRight.__table__.insert(), rows)
+        self._touch(db, id)
+
+        db.flush()
+        return self.get_details(db, id)
 
     def remove_rights(self, db: Session, id: int, right_ids: List[int]):
-        role = self.get_by_id(db, id)
-        for right_id in right_ids:
-            right = db.query(Right).get(right_id)
-            role.rights.remove(right)
+        db.query(RoleRight) \
+            .filter(RoleRight.role_id == id, RoleRight.right_id.in_(right_ids)) \
+            .delete(synchronize_session=False)
+        self._touch(db, id)
+
+        db.flush()
+        return self.get_details(db, id)
+
+    def _touch(self, db: Session, id: int):
+        db.query(Role).filter(Role.id == id).update({Role.modified_date_time: datetime.utcnow()}, synchronize_session=False)
 
-        db.commit()
-        db.refresh(role)
+
+@dependency
+class AsyncRoleRepository:
+    """
+    Read queries of the roles for the async DB mode, as SQLAlchemy Core statements.
+    """
+
+    async def get_all(self, db: AsyncSession, after: Optional[int], limit: int) -> List[SimpleNamespace]:
+        query = select([Role.__table__]).order_by(Role.id)
+        if after is not None:
+            query = query.where(Role.id > after)
+        return await db.fetch_all(query.limit(limit))
+
+    async def get_details(self, db: AsyncSession, id: int) -> Optional[SimpleNamespace]:
+        """
+        Returns the role with its rights, with two queries.
+        """
+        role = await db.fetch_one(select([Role.__table__]).where(Role.id == id))
+        if role:
+            role.rights = await db.fetch_all(select([Right.__table__])
+                                             .select_from(Right.__table__.join(RoleRight, RoleRight.right_id == Right.id))
+                                             .where(RoleRight.role_id == id)
+                                             .order_by(Right.id))
         return role
+
+    async def get_version(self, db: AsyncSession, id: int) -> Optional[tuple]:
+        """
+        Same value as RoleRepository.get_version.
+        """
+        return await db.fetch_values(
+            select([Role.id, Role.modified_date_time, func.count(Right.id), func.max(Right.modified_date_time)])
+            .select_from(Role.__table__
+                         .outerjoin(RoleRight, RoleRight.role_id == Role.id)
+                         .outerjoin(Right, Right.id == RoleRight.right_id))
+            .where(Role.id == id)
+            .group_by(Role.id, Role.modified_date_time))
@@ -0,0 +1,59 @@
+from typing import List, Sequence
+
+from serum import dependency
+from sqlalchemy import func, or_, literal_column, table, column
+from sqlalchemy.orm import Session
+
+from app.db.models import User, Role, Right
+from app.db.search import has_trigram_tokenizer, search_table_name
+
+
+@dependency
+class SearchRepository:
+
+    def search_users(self, db: Session, query: str, limit: int) -> List[User]:
+        return self._search(db, User, (User.first_name, User.last_name, User.email), query, limit)
+
+    def search_roles(self, db: Session, query: str, limit: int) -> List[Role]:
+        return self._search(db, Role, (Role.name,), query, limit)
+
+    def search_rights(self, db: Session, query: str, limit: int) -> List[Right]:
+        return self._search(db, Right, (Right.name,), query, limit)
+
+    def _search(self, db: Session, model, columns: Sequence, query: str, limit: int) -> list:
+        """
+        Returns the rows with a column containing the query, or a word similar to it, best matches first.
+        Both use the trigram indexes of the columns, so the table is never scanned, except on SQLite older than 3.34,
+        which has no trigram tokenizer and only finds the rows containing the query.
+        """
+        if db.get_bind().dialect.name == "postgresql":
+            return self._search_trigram_indexes(db, model, columns, query, limit)
+        if has_trigram_tokenizer():
+            return self._search_full_text_table(db, model, query, limit)
+        return self._search_like(db, model, columns, query, limit)
+
+    def _search_trigram_indexes(self, db: Session, model, columns: Sequence, query: str, limit: int) -> list:
+        pattern = self._like_pattern(query)
+        # column %> query is "query <% column", whether a word of the column is similar to the query.
+        # The percent sign is doubled for the driver paramstyle, like SQLAlchemy does for the modulo operator
+        conditions = [i.op("%%>")(query) for i in columns] + [i.ilike(pattern, escape="/") for i in columns]
+        score = func.greatest(*[func.word_similarity(query, i) for i in columns])
+        return db.query(model).filter(or_(*conditions)).order_by(score.desc(), model.id).limit(limit).all()
+
+    def _search_full_text_table(self, db: Session, model, query: str, limit: int) -> list:
+        name = search_table_name(model.__table__)
+        search = table(name, column("rowid"), column("rank"))
+        # Any trigram of the query matches, the rank (BM25) favours the rows sharing the most with it
+        trigrams = dict.fromkeys(query[i:i + 3].lower() for i in range(len(query) - 2))
+        match = " OR ".join('"%s"' % i.replace('"', '""') for i in trigrams)
+        rows = db.query(model).join(search, search.c.rowid == model.id).filter(literal_column(name).match(match))
+        return rows.order_by(search.c.rank, model.id).limit(limit).all()
+
+    def _search_like(self, db: Session, model, columns: Sequence, query: str, limit: int) -> list:
+        # SQLite without the trigram tokenizer: a scan for the rows containing the query, without typo tolerance
+        pattern = self._like_pattern(query)
+        conditions = [i.ilike(pattern, escape="/") for i in columns]
+        return db.query(model).filter(or_(*conditions)).order_by(model.id).limit(limit).all()
+
+    def _like_pattern(self, query: str) -> str:
+        return "%" + query.replace("/", "//").replace("%", "/%").replace("_", "/_") + "%"
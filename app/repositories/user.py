@@ -1,21 +1,117 @@
-from typing import List, Any
+import csv
+import io
+from typing import List, Any, Optional, Iterator, Set
 
 from serum import dependency
-from sqlalchemy.orm import Session
+from sqlalchemy import func, and_, or_, tuple_
+from sqlalchemy.orm import Session, joinedload, selectinload
 
-from app.db.models import User, Role
-from app.schemas.user import UserCreateDTO, UserUpdateDTO
+from app.db.models import User, UserRole, Right, RoleRight, Organization, Role
+from app.repositories.fields import fields_options
+from app.schemas.fields import Fields
+from app.schemas.user import UserCreateDTO, UserUpdateDTO, UserFilterDTO
 
 
 @dependency
 class UserRepository:
-
-    def get_all(self, db: Session) -> List[User]:
-        return db.query(User).all()
+    # Loader options required to build a UserDetailsDTO with a fixed number of queries
+    details_options = (joinedload(User.organization), selectinload(User.roles))
+    # Columns of the exported users
+    export_columns = (User.id, User.email, User.first_name, User.last_name, User.is_active, User.is_admin,
+                      User.organization_id)
+
+    # Sort keys of the users list. Each one ends with the ID, so they are unique and usable for keyset pagination
+    sort_keys = {
+        "id": (User.id,),
+        "email": (User.email, User.id),
+    }
+
+    def get_all(self, db: Session, after: Optional[int], limit: int,
+                filters: Optional[UserFilterDTO] = None, sort: str = "id", fields: Optional[Fields] = None) -> List[User]:
+        """
+        Returns a page of users, optionally filtered, ordered by the given sort key.
+        The cursor is the ID of the last user of the previous page: with another sort key than the
+        ID, the sort key of this user is read in the same query to find the users after it.
+        Only the given fields are loaded, if any.
+        """
+        keys = self.sort_keys[sort]
+        query = db.query(User).order_by(*keys)
+        if fields:
+            query = query.options(*fields_options(User, fields))
+        if filters:
+            query = self._filter(db, query, filters)
+        if after is not None:
+            if len(keys) == 1:
+                query = query.filter(User.id > after)
+            else:
+                anchor = [db.query(i).filter(User.id == after).as_scalar() for i in keys[:-1]]
+                query = query.filter(tuple_(*keys) > tuple_(*anchor, after))
+        return query.limit(limit).all()
+
+    def _filter(self, db: Session, query, filters: UserFilterDTO):
+        if filters.organization_id is not None:
+            query = query.filter(User.organization_id == filters.organization_id)
+        if filters.is_active is not None:
+            query = query.filter(User.is_active == filters.is_active)
+        if filters.is_admin is not None:
+            query = query.filter(User.is_admin == filters.is_admin)
+        if filters.email:
+            query = query.filter(self._starts_with(db, User.email, filters.email))
+        if filters.name:
+            query = query.filter(or_(self._starts_with(db, User.first_name, filters.name),
+                                     self._starts_with(db, User.last_name, filters.name)))
+        if filters.role_id is not None:
+            users = db.query(UserRole.user_id).filter(UserRole.role_id == filters.role_id)
+            query = query.filter(User.id.in_(users.subquery()))
+        return query
+
+    def _starts_with(self, db: Session, column, prefix: str):
+        """
+        Case sensitive prefix condition which can use the index of the column.
+        """
+        if db.get_bind().dialect.name == "postgresql":
+            return column.startswith(prefix, autoescape=True)
+        # SQLite LIKE is case insensitive, so it cannot use an index with the default (binary) collation, a range can
+        return and_(column >= prefix, column < prefix + "\U0010ffff")
+
+    def iter_export(self, db: Session, organization_id: Optional[int], is_active: Optional[bool],
+                    batch_size: int) -> Iterator[tuple]:
+        """
+        Iterates over the export columns of the users ordered by ID. Rows are fetched in batches,
+        through a server-side cursor where the DB supports it, so they are never all in memory.
+        """
+        query = db.query(*self.export_columns).order_by(User.id)
+        if organization_id is not None:
+            query = query.filter(User.organization_id == organization_id)
+        if is_active is not None:
+            query = query.filter(User.is_active == is_active)
+        return iter(query.yield_per(batch_size))
 
     def get_by_id(self, db: Session, id: int) -> User:
         return db.query(User).get(id)
 
+    def get_details(self, db: Session, id: int, fields: Optional[Fields] = None) -> User:
+        """
+        Returns the user with what a UserDetailsDTO needs loaded, or only the given fields if any.
+        """
+        options = fields_options(User, fields) if fields else self.details_options
+        return db.query(User).options(*options).populate_existing().filter(User.id == id).first()
+
+    def get_version(self, db: Session, id: int) -> Optional[tuple]:
+        """
+        Returns a value which changes whenever the details of the user change:
+        its version, the version of its organization, and its roles.
+        As a role modification time is the most recent one, the latest is enough to detect changes of any role.
+        """
+        return db.query(User.id, User.version, Organization.version,
+                        func.count(Role.id), func.max(Role.modified_date_time)) \
+            .join(Organization, Organization.id == User.organization_id) \
+            .outerjoin(UserRole, UserRole.user_id == User.id) \
+            .outerjoin(Role, Role.id == UserRole.role_id) \
+            .filter(User.id == id) \
+            .group_by(User.id, User.version, Organization.version) \
+            .first()
+
     def create(self, db: Session, data: UserCreateDTO) -> User:
         user = User()
         user.first_name = data.first_name
@@ -25,8 +121,8 @@ class UserRepository:
         user.organization_id = data.organization_id
 
         db.add(user)
-        db.commit()
-        return user
+        db.flush()
+        return self.get_details(db, user.id)
 
     def update(self, db: Session, id: int, data: UserUpdateDTO) -> User:
         user = self.get_by_id(db, id)
@@ -35,35 +131,81 @@ class UserRepository:
         user.is_admin = data.is_admin
         user.is_active = data.is_active
         user.organization_id = data.organization_id
+        user.version = User.version + 1
 
-        db.commit()
-        db.refresh(user)
-        return user
+        db.flush()
+        return self.get_details(db, id)
 
     def delete(self, db: Session, id: int) -> Any:
         user = self.get_by_id(db, id)
         db.delete(user)
-        db.commit()
+        db.flush()
 
     def get_by_email(self, db: Session, email: str) -> User:
         return db.query(User).filter(User.email == email).first()
 
-    def add_roles(self, db: Session, id: int, role_ids: List[int]) -> User:
-        user = self.get_by_id(db, id)
-        for role_id in role_ids:
-            role = db.query(Role).get(role_id)
-            user.roles.append(role)
+    def get_existing_emails(self, db: Session, emails: List[str]) -> Set[str]:
+        if not emails:
+            return set()
+        return {email for email, in db.query(User.email).filter(User.email.in_(emails))}
+
+    def bulk_create(self, db: Session, users: List[UserCreateDTO]):
+        """
+        Inserts the given users without loading them back.
+        Postgres gets them through COPY, other DBs through a single executemany() insert.
+        """
+        if not users:
+            return
+        rows = [{"email": i.email, "first_name": i.first_name, "last_name": i.last_name, "is_active": i.is_active,
+                 "is_admin": i.is_admin, "organization_id": i.organization_id, "version": 1} for i in users]
+
+        if db.get_bind().dialect.name == "postgresql":
+            columns = list(rows[0])
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows([row[i] for i in columns] for row in rows)
+            buffer.seek(0)
+            cursor = db.connection().connection.cursor()
+            cursor.copy_expert('COPY "%s" (%s) FROM STDIN WITH (FORMAT csv)'
+                               % (User.__tablename__, ", ".join(columns)), buffer)
+        else:
+            db.execute(User.__table__.insert(), rows)
+        db.flush()
+
+    def get_rights(self, db: Session, id: int, after: Optional[int], limit: int) -> List[Right]:
+        """
+        Returns the effective rights of a user, granted by any of its roles, without duplicates.
+        """
+        granted = db.query(RoleRight.right_id) \
+            .join(UserRole, UserRole.role_id == RoleRight.role_id) \
+            .filter(UserRole.user_id == id)
+        query = db.query(Right).filter(Right.id.in_(granted.subquery())).order_by(Right.id)
+        if after is not None:
+            query = query.filter(Right.id > after)
+        return query.limit(limit).all()
 
-        db.commit()
-        db.refresh(user)
-        return user
+    def add_roles(self, db: Session, id: int, role_ids: List[int]) -> User:
+        """
+        Assigns the given roles to a user with a single multi-row insert.
+        Roles already assigned to the user are skipped.
+        """
+        assigned = {role_id for role_id, in db.query(UserRole.role_id)
+                    .filter(UserRole.user_id == id, UserRole.role_id.in_(role_ids))}
+        rows = [{"user_id": id, "role_id": role_id} for role_id in dict.fromkeys(role_ids) if role_id not in assigned]
+        if rows:
+            db.execute(UserRole.__table__.insert(), rows)
+        self._increment_version(db, id)
+
+        db.flush()
+        return self.get_details(db, id)
 
     def remove_roles(self, db: Session, id: int, role_ids: List[int]) -> User:
-        user = self.get_by_id(db, id)
-        for role_id in role_ids:
-            role = db.query(Role).get(role_id)
-            user.roles.remove(role)
+        db.query(UserRole) \
+            .filter(UserRole.user_id == id, UserRole.role_id.in_(role_ids)) \
+            .delete(synchronize_session=False)
+        self._increment_version(db, id)
+
+        db.flush()
+        return self.get_details(db, id)
 
-        db.commit()
-        db.refresh(user)
-        return user
+    def _increment_version(self, db: Session, id: int):
+        db.query(User).filter(User.id == id).update({User.version: User.version + 1}, synchronize_session=False)
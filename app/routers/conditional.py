@@ -0,0 +1,48 @@
+import hashlib
+from typing import Any, Optional
+
+from starlette import status
+from starlette.requests import Request
+from starlette.responses import Response
+
+
+def make_etag(version: tuple) -> str:
+    """
+    Builds a weak ETag from the version of an entity.
+    """
+    return 'W/"%s"' % hashlib.sha1(repr(tuple(version)).encode()).hexdigest()
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Weak comparison of an ETag with the ones of an If-None-Match header.
+    https://tools.ietf.org/html/rfc7232#section-3.2
+    """
+    if not if_none_match:
+        return False
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or (tag[2:] if tag.startswith("W/") else tag) == opaque:
+            return True
+    return False
+
+
+def not_modified(request: Request, response: Response, version: Optional[tuple],
+                 representation: Any = None) -> Optional[Response]:
+    """
+    Sets the ETag built from the version of the requested entity on the response, and
+    returns a 304 Not Modified response when the client copy is still current, so the
+    details do not have to be loaded and serialized again.
+    :param version: version of the requested entity, None if it does not exist
+    :param representation: what varies in the representation of a same version, like the requested fields
+    :return: the 304 response, None when the details have to be sent
+    """
+    if version is None:
+        return None
+
+    etag = make_etag(tuple(version) + (representation,) if representation else version)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return None
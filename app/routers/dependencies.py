@@ -0,0 +1,44 @@
+from typing import Any, Awaitable, Callable, Optional
+
+from fastapi import Query
+from fastapi.concurrency import run_in_threadpool
+
+from app.settings import settings
+
+
+class PageParams:
+    """
+    Keyset pagination query parameters shared by the list endpoints.
+    """
+
+    def __init__(self,
+                 after: Optional[int] = Query(None, description="Return records with an ID greater than this one"),
+                 limit: int = Query(settings.PAGE_SIZE_DEFAULT, ge=1, le=settings.PAGE_SIZE_MAX)):
+        self.after = after
+        self.limit = limit
+
+
+async def page_params(after: Optional[int] = Query(None, description="Return records with an ID greater than this one"),
+                      limit: int = Query(settings.PAGE_SIZE_DEFAULT, ge=1, le=settings.PAGE_SIZE_MAX)) -> PageParams:
+    """
+    PageParams of the async routes: a class dependency is run in the threadpool, a coroutine on the event loop.
+    """
+    return PageParams(after, limit)
+
+
+class ThreadpoolService:
+    """
+    Awaitable view of a blocking service, for the async routes outside of the async DB mode:
+    each method call runs in the threadpool, like the one of a blocking route handler.
+    """
+
+    def __init__(self, service: Any):
+        self.service = service
+
+    def __getattr__(self, name: str) -> Callable[..., Awaitable]:
+        method = getattr(self.service, name)
+
+        async def call(*args, **kwargs):
+            return await run_in_threadpool(method, *args, **kwargs)
+
+        return call
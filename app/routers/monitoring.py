@@ -0,0 +1,29 @@
+from typing import List
+
+from fastapi import Depends, APIRouter
+
+from app.schemas.monitoring import PoolStatusDTO, CacheStatsDTO
+from app.services.monitoring import MonitoringService
+
+router = APIRouter()
+service = MonitoringService()
+
+
+def get_service():
+    return service
+
+
+@router.get("/pool", name="monitoring-pool", response_model=List[PoolStatusDTO])
+def pool_status(service: MonitoringService = Depends(get_service)) -> List[PoolStatusDTO]:
+    """
+    Retrieve the status of the DB connection pools.
+    """
+    return service.get_pool_status()
+
+
+@router.get("/cache", name="monitoring-cache", response_model=List[CacheStatsDTO])
+def cache_stats(service: MonitoringService = Depends(get_service)) -> List[CacheStatsDTO]:
+    """
+    Retrieve the hit, miss and eviction counters of the entity caches.
+    """
+    return service.get_cache_stats()
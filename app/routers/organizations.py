@@ -1,33 +1,62 @@
-from typing import List, Any
+from typing import Any
 
 from fastapi import Depends, APIRouter
+from starlette.requests import Request
+from starlette.responses import Response
 
+from app.routers.conditional import not_modified
+from app.routers.dependencies import PageParams, ThreadpoolService, page_params
+from app.routers.responses import DTOResponse
 from app.schemas.organization import OrganizationDTO, OrganizationDetailsDTO, OrganizationCreateDTO, \
     OrganizationUpdateDTO
-from app.services.organization import OrganizationService
+from app.schemas.page import PageDTO
+from app.schemas.user import UserDTO
+from app.services.organization import OrganizationService, AsyncOrganizationService
+from app.settings import settings
 
 router = APIRouter()
 service = OrganizationService()
+async_service = AsyncOrganizationService()
 
 
 def get_service():
     return service
 
 
-@router.get("/", name="organization-get-all", response_model=List[OrganizationDTO])
-def show_records(service: OrganizationService = Depends(get_service)) -> List[OrganizationDTO]:
+async def get_read_service():
     """
-    Retrieve all organizations.
+    Service of the read routes: the async one in the async DB mode, the blocking one run in the threadpool otherwise.
     """
-    return service.get_all()
+    return async_service if settings.DB_ASYNC else ThreadpoolService(service)
+
+
+@router.get("/", name="organization-get-all", response_model=PageDTO[OrganizationDTO])
+async def show_records(page: PageParams = Depends(page_params),
+                       service: AsyncOrganizationService = Depends(get_read_service)) -> PageDTO[OrganizationDTO]:
+    """
+    Retrieve a page of organizations, ordered by ID.
+    """
+    return DTOResponse(await service.get_all(page.after, page.limit))
 
 
 @router.get("/{id}", name="organization-get-details", response_model=OrganizationDetailsDTO)
-def details(id: int, service: OrganizationService = Depends(get_service)) -> OrganizationDetailsDTO:
+async def details(id: int, request: Request, response: Response,
+                  service: AsyncOrganizationService = Depends(get_read_service)) -> OrganizationDetailsDTO:
     """
     Retrieve organization details.
+    The response has an ETag: when it is given in If-None-Match and the details did not change, 304 is returned.
+    """
+    unchanged, org = await service.get_details_if_modified(id, lambda version: not_modified(request, response, version))
+    return unchanged or DTOResponse(org, headers=response.headers)
+
+
+@router.get("/{id}/users", name="organization-get-users", response_model=PageDTO[UserDTO])
+async def users(id: int, page: PageParams = Depends(page_params),
+                service: AsyncOrganizationService = Depends(get_read_service)) -> PageDTO[UserDTO]:
+    """
+    Retrieve a page of the organization users, ordered by ID.
     """
-    return service.get_details(id)
+    return DTOResponse(await service.get_users(id, page.after, page.limit))
 
 
 @router.delete("/{id}", name="organization-delete")
@@ -0,0 +1,22 @@
+from typing import List
+
+from fastapi import Depends, APIRouter
+
+from app.schemas.permission import PermissionCheckDTO, PermissionCheckResultDTO
+from app.services.permission import PermissionService
+
+router = APIRouter()
+service = PermissionService()
+
+
+def get_service():
+    return service
+
+
+@router.post("/check", name="permission-check", response_model=List[PermissionCheckResultDTO])
+def check(checks: List[PermissionCheckDTO],
+          service: PermissionService = Depends(get_service)) -> List[PermissionCheckResultDTO]:
+    """
+    Check in a single request whether each user has the paired right through any of its roles.
+    """
+    return service.check(checks)
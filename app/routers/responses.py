@@ -0,0 +1,17 @@
+from typing import Any
+
+from starlette.responses import JSONResponse
+
+from app.encoders import dumps
+
+
+class DTOResponse(JSONResponse):
+    """
+    JSON response of DTOs built from trusted DB data, like the ones of the from_model classmethods.
+    FastAPI sends the responses returned by a route as they are: the DTOs are not validated and
+    copied again against the response_model of the route, which is only kept for the documentation.
+    Only the set fields of the DTOs are serialized, with orjson when it is installed.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
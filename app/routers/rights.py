@@ -1,33 +1,53 @@
 from typing import List, Any
 
-from fastapi import Depends, APIRouter
+from fastapi import Depends, APIRouter, Query
+from starlette.requests import Request
+from starlette.responses import Response
 
+from app.routers.conditional import not_modified
+from app.routers.dependencies import PageParams, ThreadpoolService, page_params
+from app.routers.responses import DTOResponse
+from app.schemas.page import PageDTO
 from app.schemas.right import RightDTO, RightCreateDTO, \
     RightUpdateDTO
-from app.services.right import RightService
+from app.services.right import RightService, AsyncRightService
+from app.settings import settings
 
 router = APIRouter()
 service = RightService()
+async_service = AsyncRightService()
 
 
 def get_service():
     return service
 
 
-@router.get("/", name="right-get-all", response_model=List[RightDTO])
-def show_records(service: RightService = Depends(get_service)) -> List[RightDTO]:
+async def get_read_service():
     """
-    Retrieve all rights.
+    Service of the read routes: the async one in the async DB mode, the blocking one run in the threadpool otherwise.
     """
-    return service.get_all()
+    return async_service if settings.DB_ASYNC else ThreadpoolService(service)
+
+
+@router.get("/", name="right-get-all", response_model=PageDTO[RightDTO])
+async def show_records(page: PageParams = Depends(page_params),
+                       service: AsyncRightService = Depends(get_read_service)) -> PageDTO[RightDTO]:
+    """
+    Retrieve a page of rights, ordered by ID.
+    """
+    return DTOResponse(await service.get_all(page.after, page.limit))
 
 
 @router.get("/{id}", name="right-get-details", response_model=RightDTO)
-def details(id: int, service: RightService = Depends(get_service)) -> RightDTO:
+async def details(id: int, request: Request, response: Response,
+                  service: AsyncRightService = Depends(get_read_service)) -> RightDTO:
     """
     Retrieve right details.
+    The response has an ETag: when it is given in If-None-Match and the details did not change, 304 is returned.
+    The encoded details are cached until they change.
     """
-    return service.get_details(id)
+    unchanged, body = await service.get_details_json(id, lambda version: not_modified(request, response, version))
+    return unchanged or Response(body, media_type="application/json", headers=response.headers)
 
 
 @router.delete("/{id}", name="right-delete")
@@ -46,6 +66,16 @@ def create(data: RightCreateDTO, service: RightService = Depends(get_service)) -
     return service.create(data)
 
 
+@router.post("/batch", name="right-create-batch", response_model=List[RightDTO])
+def create_batch(data: List[RightCreateDTO],
+                 upsert: bool = Query(False, description="Update the description of the existing rights instead of failing"),
+                 service: RightService = Depends(get_service)) -> List[RightDTO]:
+    """
+    Create rights in a single transaction.
+    """
+    return service.create_batch(data, upsert)
+
+
 @router.put("/{id}", name="right-update", response_model=RightDTO)
 def update(id: int, data: RightUpdateDTO,
            service: RightService = Depends(get_service)) -> RightDTO:
@@ -1,33 +1,53 @@
 from typing import List, Any
 
-from fastapi import Depends, APIRouter
-
+from fastapi import Depends, APIRouter, Query
+from starlette.requests import Request
+from starlette.responses import Response
+
+from app.routers.conditional import not_modified
+from app.routers.dependencies import PageParams, ThreadpoolService, page_params
+from app.routers.responses import DTOResponse
+from app.schemas.page import PageDTO
 from app.schemas.role import RoleDTO, RoleDetailsDTO, RoleCreateDTO, \
     RoleUpdateDTO
-from app.services.role import RoleService
+from app.services.role import RoleService, AsyncRoleService
+from app.settings import settings
 
 router = APIRouter()
 service = RoleService()
+async_service = AsyncRoleService()
 
 
 def get_service():
     return service
 
 
-@router.get("/", name="role-get-all", response_model=List[RoleDTO])
-def show_records(service: RoleService = Depends(get_service)) -> List[RoleDTO]:
+async def get_read_service():
+    """
+    Service of the read routes: the async one in the async DB mode, the blocking one run in the threadpool otherwise.
+    """
+    return async_service if settings.DB_ASYNC else ThreadpoolService(service)
+
+
+@router.get("/", name="role-get-all", response_model=PageDTO[RoleDTO])
+async def show_records(page: PageParams = Depends(page_params),
+                       service: AsyncRoleService = Depends(get_read_service)) -> PageDTO[RoleDTO]:
     """
-    Retrieve all role.
+    Retrieve a page of roles, ordered by ID.
     """
-    return service.get_all()
+    return DTOResponse(await service.get_all(page.after, page.limit))
 
 
 @router.get("/{id}", name="role-get-details", response_model=RoleDetailsDTO)
-def details(id: int, service: RoleService = Depends(get_service)) -> RoleDetailsDTO:
+async def details(id: int, request: Request, response: Response,
+                  service: AsyncRoleService = Depends(get_read_service)) -> RoleDetailsDTO:
     """
     Retrieve role details.
+    The response has an ETag: when it is given in If-None-Match and the details did not change, 304 is returned.
+    The encoded details are cached until they change.
     """
-    return service.get_details(id)
+    unchanged, body = await service.get_details_json(id, lambda version: not_modified(request, response, version))
+    return unchanged or Response(body, media_type="application/json", headers=response.headers)
 
 
 @router.delete("/{id}", name="role-delete")
@@ -46,6 +66,16 @@ def create(data: RoleCreateDTO, service: RoleService = Depends(get_service)) ->
     return service.create(data)
 
 
+@router.post("/batch", name="role-create-batch", response_model=List[RoleDTO])
+def create_batch(data: List[RoleCreateDTO],
+                 upsert: bool = Query(False, description="Update the description of the existing roles instead of failing"),
+                 service: RoleService = Depends(get_service)) -> List[RoleDTO]:
+    """
+    Create roles in a single transaction.
+    """
+    return service.create_batch(data, upsert)
+
+
 @router.put("/{id}", name="role-update", response_model=RoleDetailsDTO)
 def update(id: int, data: RoleUpdateDTO,
            service: RoleService = Depends(get_service)) -> RoleDetailsDTO:
@@ -0,0 +1,24 @@
+from fastapi import Depends, APIRouter, Query
+
+from app.routers.responses import DTOResponse
+from app.schemas.search import SearchResultDTO
+from app.services.search import SearchService
+from app.settings import settings
+
+router = APIRouter()
+service = SearchService()
+
+
+def get_service():
+    return service
+
+
+@router.get("/", name="search", response_model=SearchResultDTO)
+def search(q: str = Query(..., min_length=3, max_length=200),
+           limit: int = Query(settings.SEARCH_LIMIT_DEFAULT, ge=1, le=settings.SEARCH_LIMIT_MAX),
+           service: SearchService = Depends(get_service)) -> SearchResultDTO:
+    """
+    Search the users by name and email, and the roles and rights by name.
+    Matches contain the query, or a word close to it, and are ranked best first.
+    """
+    return DTOResponse(service.search(q, limit))
@@ -1,32 +1,78 @@
-from typing import List, Any
-
-from fastapi import Depends, APIRouter
-
-from app.schemas.user import UserDTO, UserDetailsDTO, UserCreateDTO, UserUpdateDTO
+from typing import List, Any, Optional
+
+from fastapi import Depends, APIRouter, Query
+from fastapi.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import Response, StreamingResponse
+
+from app.config.exceptions import ValidationException
+from app.routers.conditional import not_modified
+from app.routers.dependencies import PageParams
+from app.routers.responses import DTOResponse
+from app.schemas.page import PageDTO
+from app.schemas.right import RightDTO
+from app.schemas.user import UserDTO, UserDetailsDTO, UserCreateDTO, UserUpdateDTO, UserImportResultDTO, UserFilterDTO
 from app.services.user import UserService
 
 router = APIRouter()
 service = UserService()
 
+FIELDS_DESCRIPTION = "Comma separated fields to return, like id,email,organization.name. All of them by default"
+
 
 def get_service():
     return service
 
 
-@router.get("/", name="user-get-all", response_model=List[UserDTO])
-def get_all(service: UserService = Depends(get_service)) -> List[UserDTO]:
+@router.get("/", name="user-get-all", response_model=PageDTO[UserDTO])
+def get_all(page: PageParams = Depends(), filters: UserFilterDTO = Depends(),
+            sort: str = Query("id", regex="^(id|email)$"),
+            fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+            service: UserService = Depends(get_service)) -> PageDTO[UserDTO]:
+    """
+    Retrieve a page of users, optionally filtered, ordered by ID or email.
+    The email and name filters are prefixes, the name one matches the first or the last name.
+    """
+    return DTOResponse(service.get_all(page.after, page.limit, filters, sort, fields))
+
+
+# Declared before /{id}, which would match it otherwise
+@router.get("/export", name="user-export", response_class=StreamingResponse)
+def export(format: str = Query("ndjson", regex="^(ndjson|csv)$"),
+           organization_id: Optional[int] = None,
+           is_active: Optional[bool] = None,
+           service: UserService = Depends(get_service)) -> StreamingResponse:
     """
-    Retrieve all users.
+    Export all the users, ordered by ID, as NDJSON or CSV.
+    The export is streamed, so it can be used whatever the number of users.
     """
-    return service.get_all()
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        service.export(format, organization_id, is_active),
+        media_type=media_type,
+        headers={"Content-Disposition": "attachment; filename=users.%s" % format},
+    )
 
 
 @router.get("/{id}", name="user-get-details", response_model=UserDetailsDTO)
-def details(id: int, service: UserService = Depends(get_service)) -> UserDetailsDTO:
+def details(id: int, request: Request, response: Response,
+            fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+            service: UserService = Depends(get_service)) -> UserDetailsDTO:
     """
     Retrieve user details.
+    The response has an ETag: when it is given in If-None-Match and the details did not change, 304 is returned.
     """
-    return service.get_details(id)
+    unchanged, user = service.get_details_if_modified(
+        id, lambda version: not_modified(request, response, version, fields), fields)
+    return unchanged or DTOResponse(user, headers=response.headers)
+
+
+@router.get("/{id}/rights", name="user-get-rights", response_model=PageDTO[RightDTO])
+def rights(id: int, page: PageParams = Depends(), service: UserService = Depends(get_service)) -> PageDTO[RightDTO]:
+    """
+    Retrieve a page of the user effective rights, granted by any of its roles, ordered by ID.
+    """
+    return DTOResponse(service.get_rights(id, page.after, page.limit))
 
 
 @router.delete("/{id}", name="user-delete")
@@ -45,6 +91,20 @@ def create(data: UserCreateDTO, service: UserService = Depends(get_service)) ->
     return service.create(data)
 
 
+@router.post("/bulk", name="user-bulk-import", response_model=UserImportResultDTO)
+async def bulk_import(request: Request, format: str = Query("ndjson", regex="^(ndjson|csv)$"),
+                      service: UserService = Depends(get_service)) -> UserImportResultDTO:
+    """
+    Create users from an NDJSON or CSV body, with one user per line (after a header line for CSV).
+    Invalid users are reported with their line, and do not prevent the others from being created.
+    """
+    try:
+        content = (await request.body()).decode()
+    except UnicodeDecodeError:
+        raise ValidationException("The import must be UTF-8 encoded")
+    return await run_in_threadpool(service.import_users, format, content)
+
+
 @router.put("/{id}", name="user-update", response_model=UserDetailsDTO)
 def update(id: int, data: UserUpdateDTO, service: UserService = Depends(get_service)) -> UserDetailsDTO:
     """
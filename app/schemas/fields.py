@@ -0,0 +1,67 @@
+from functools import partial
+from typing import Any, Dict, Optional, Type
+
+from pydantic import BaseModel
+from pydantic.fields import ModelField
+
+from app.config.exceptions import ValidationException
+
+# Requested fields of a DTO, by name: True for the whole field, or the requested fields of a nested DTO
+Fields = Dict[str, Any]
+
+
+def parse_fields(value: Optional[str], cls: Type[BaseModel]) -> Optional[Fields]:
+    """
+    Parses a sparse fieldset, like "id,email,organization.name", into the requested fields of a DTO.
+    The ID is always included, the one of the nested DTOs too.
+    :param value: comma separated field names, nested ones joined to their parent with a dot
+    :param cls: DTO the fields belong to
+    :return: the requested fields, None when all are
+    """
+    if not value:
+        return None
+
+    fields = {"id": True}
+    for path in value.split(","):
+        path = path.strip()
+        name, _, nested = path.partition(".")
+        field = cls.__fields__.get(name)
+        if field is None:
+            raise ValidationException("Unknown field %s" % path)
+        if not nested:
+            fields[name] = True
+            continue
+
+        nested_cls = _nested_dto(field)
+        if nested_cls is None or nested not in nested_cls.__fields__:
+            raise ValidationException("Unknown field %s" % path)
+        if fields.get(name) is not True:
+            fields[name] = dict(fields.get(name) or {"id": True}, **{nested: True})
+    return fields
+
+
+def from_model_fields(cls: Type[BaseModel], instance: Any, fields: Fields) -> BaseModel:
+    """
+    Convert a DB model instance to a DTO instance with the requested fields only.
+    Other attributes of the instance are not read, so they do not have to be loaded, and
+    the DTO is not validated. Only the requested fields are set: they are the only ones
+    serialized by DTOResponse.
+    """
+    values = {}
+    for name, nested in fields.items():
+        value = getattr(instance, name)
+        nested_cls = _nested_dto(cls.__fields__[name])
+        if nested_cls is not None and value is not None:
+            convert = nested_cls.from_model if nested is True else partial(from_model_fields, nested_cls, fields=nested)
+            value = [convert(i) for i in value] if isinstance(value, list) else convert(value)
+        values[name] = value
+    return cls.construct(_fields_set=set(values), **values)
+
+
+def _nested_dto(field: ModelField) -> Optional[Type[BaseModel]]:
+    """
+    :return: the DTO of a nested or a list of nested DTOs field, None for the other fields
+    """
+    if isinstance(field.type_, type) and issubclass(field.type_, BaseModel):
+        return field.type_
+    return None
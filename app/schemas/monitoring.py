@@ -0,0 +1,49 @@
+from typing import Dict, Optional
+
+from pydantic import BaseModel
+
+from app.db.pool import PoolMetrics
+
+
+class HistogramDTO(BaseModel):
+    buckets: Dict[str, int]
+    count: int
+    sum: float
+
+
+class PoolStatusDTO(BaseModel):
+    name: str
+    pool: str
+    size: Optional[int] = None
+    checked_out: int
+    overflow: Optional[int] = None
+    checkout_wait: HistogramDTO
+
+    @classmethod
+    def from_metrics(cls, metrics: PoolMetrics):
+        """
+        Convert the live metrics of an engine pool to a PoolStatusDTO instance.
+        Size and overflow are only reported by pools which queue connections.
+        """
+        pool = metrics.engine.pool
+        return cls(
+            name=metrics.name,
+            pool=type(pool).__name__,
+            size=pool.size() if hasattr(pool, "size") else None,
+            checked_out=metrics.checked_out,
+            overflow=pool.overflow() if hasattr(pool, "overflow") else None,
+            checkout_wait=HistogramDTO(**metrics.checkout_wait.snapshot()),
+        )
+
+
+class CacheStatsDTO(BaseModel):
+    name: str
+    size: int
+    maxsize: int
+    ttl: float
+    bytes: int
+    maxbytes: Optional[int] = None
+    hits: int
+    misses: int
+    evictions: int
+    expirations: int
@@ -3,6 +3,7 @@ from typing import List, Optional
 from pydantic import BaseModel
 
 from app.db.models import Organization
+from app.schemas.page import PageDTO
 
 
 class OrganizationDTO(BaseModel):
@@ -14,7 +15,7 @@ class OrganizationDTO(BaseModel):
         """
         Convert a DB Organization model instance to an OrganizationDTO instance.
         """
-        return cls(
+        return cls.construct(
             id=instance.id,
             name=instance.name,
         )
@@ -23,17 +24,20 @@ class OrganizationDTO(BaseModel):
 class OrganizationDetailsDTO(OrganizationDTO):
     from app.schemas.user import UserDTO
     users: Optional[List[UserDTO]] = []
+    users_next_cursor: Optional[int] = None
 
     @classmethod
-    def from_model(cls, instance: Organization):
-        from app.schemas.user import UserDTO
+    def from_model(cls, instance: Organization, users: Optional[PageDTO] = None):
         """
         Convert a DB Organization model instance to an OrganizationDetailsDTO instance.
+        Only the given first page of users is included, the rest can be retrieved
+        from the organization users endpoint starting at users_next_cursor.
         """
-        return cls(
+        return cls.construct(
             id=instance.id,
             name=instance.name,
-            users=[UserDTO.from_model(i) for i in instance.users],
+            users=users.items if users else [],
+            users_next_cursor=users.next_cursor if users else None,
         )
 
 
@@ -0,0 +1,23 @@
+from typing import Callable, Generic, List, Optional, Sequence, TypeVar
+
+from pydantic.generics import GenericModel
+
+T = TypeVar("T")
+
+
+class PageDTO(GenericModel, Generic[T]):
+    items: List[T] = []
+    next_cursor: Optional[int] = None
+
+    @classmethod
+    def from_models(cls, instances: Sequence, limit: int, converter: Callable):
+        """
+        Convert up to limit + 1 DB model instances, ordered by ID, to a PageDTO instance.
+        The extra instance is not returned, it only signals that there is a next page.
+        """
+        items = instances[:limit]
+        next_cursor = items[-1].id if len(instances) > limit else None
+        return cls.construct(
+            items=[converter(i) for i in items],
+            next_cursor=next_cursor,
+        )
@@ -0,0 +1,10 @@
+from pydantic import BaseModel
+
+
+class PermissionCheckDTO(BaseModel):
+    user_id: int
+    right_id: int
+
+
+class PermissionCheckResultDTO(PermissionCheckDTO):
+    allowed: bool
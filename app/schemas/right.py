@@ -18,7 +18,7 @@ class RightDTO(BaseModel):
         """
         Convert a DB Right model instance to a RightDTO instance.
         """
-        return cls(
+        return cls.construct(
             id=instance.id,
             name=instance.name,
             description=instance.description,
@@ -19,7 +19,7 @@ class RoleDTO(BaseModel):
         """
         Convert a DB Role model instance to a RoleDTO instance.
         """
-        return cls(
+        return cls.construct(
             id=instance.id,
             name=instance.name,
             description=instance.description,
@@ -36,7 +36,7 @@ class RoleDetailsDTO(RoleDTO):
         """
         Convert a DB Role model instance to a RoleDetailsDTO instance.
         """
-        return cls(
+        return cls.construct(
             id=instance.id,
             name=instance.name,
             description=instance.description,
@@ -0,0 +1,13 @@
+from typing import List
+
+from pydantic import BaseModel
+
+from app.schemas.right import RightDTO
+from app.schemas.role import RoleDTO
+from app.schemas.user import UserDTO
+
+
+class SearchResultDTO(BaseModel):
+    users: List[UserDTO] = []
+    roles: List[RoleDTO] = []
+    rights: List[RightDTO] = []
@@ -1,6 +1,6 @@
 from typing import Optional, List
 
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 
 from app.db.models import User
 from app.schemas.role import RoleDTO
@@ -18,8 +18,9 @@ class UserDTO(BaseModel):
     def from_model(cls, instance: User):
         """
         Convert a DB User model instance to a UserDetailsDTO instance.
+        Like every from_model classmethod, it does not validate the data, which comes from the DB.
         """
-        return cls(
+        return cls.construct(
             id=instance.id,
             email=instance.email,
             is_active=instance.is_active,
@@ -31,7 +32,8 @@ class UserDTO(BaseModel):
 
 class UserDetailsDTO(UserDTO):
     from app.schemas.organization import OrganizationDTO
-    organization: OrganizationDTO
+    # Not set when left out of a sparse fieldset
+    organization: Optional[OrganizationDTO] = None
     roles: Optional[List[RoleDTO]] = None
 
     @classmethod
@@ -40,7 +42,7 @@ class UserDetailsDTO(UserDTO):
         Convert a DB User model instance to a UserDetailsDTO instance.
         """
         from app.schemas.organization import OrganizationDTO
-        return cls(
+        return cls.construct(
             id=instance.id,
             email=instance.email,
             is_active=instance.is_active,
@@ -52,6 +54,15 @@ class UserDetailsDTO(UserDTO):
         )
 
 
+class UserFilterDTO(BaseModel):
+    organization_id: Optional[int] = None
+    is_active: Optional[bool] = None
+    is_admin: Optional[bool] = None
+    email: Optional[str] = Field(None, description="Prefix of the email")
+    name: Optional[str] = Field(None, description="Prefix of the first or last name")
+    role_id: Optional[int] = None
+
+
 class UserUpdateDTO(BaseModel):
     is_admin: Optional[bool] = False
     is_active: Optional[bool] = True
@@ -62,3 +73,13 @@ class UserUpdateDTO(BaseModel):
 
 class UserCreateDTO(UserUpdateDTO):
     email: EmailStr
+
+
+class UserImportErrorDTO(BaseModel):
+    line: int
+    error: str
+
+
+class UserImportResultDTO(BaseModel):
+    created: int = 0
+    errors: List[UserImportErrorDTO] = []
@@ -0,0 +1,54 @@
+from typing import List
+
+from serum import inject, dependency
+
+from app.cache import caches
+from app.db.pool import pool_metrics
+from app.metrics import Exposition, request_metrics
+from app.schemas.monitoring import PoolStatusDTO, CacheStatsDTO
+
+
+@inject
+@dependency
+class MonitoringService:
+
+    def get_pool_status(self) -> List[PoolStatusDTO]:
+        return [PoolStatusDTO.from_metrics(i) for i in pool_metrics]
+
+    def get_cache_stats(self) -> List[CacheStatsDTO]:
+        return [CacheStatsDTO(**i.stats()) for i in caches]
+
+    def get_metrics(self) -> str:
+        """
+        :return: the metrics of the requests, DB pools and caches of this process, in the Prometheus text format
+        """
+        exposition = Exposition()
+        # Copied at once, as requests may add routes meanwhile
+        routes = list(request_metrics.routes.items())
+        exposition.gauge("http_requests_in_flight", "Requests being served.", [({}, request_metrics.in_flight)])
+        exposition.counter("http_requests_total", "Responses by route, method and status code.", [
+            ({"route": route, "method": method, "status": status}, count)
+            for (route, method), metrics in routes for status, count in list(metrics.responses.items())
+        ])
+        exposition.histogram("http_request_duration_seconds", "Duration of the requests.", [
+            ({"route": route, "method": method}, metrics.duration) for (route, method), metrics in routes
+        ])
+        exposition.histogram("http_request_db_queries", "SQL statements executed by each request.", [
+            ({"route": route, "method": method}, metrics.queries) for (route, method), metrics in routes
+        ])
+        exposition.histogram("http_request_db_duration_seconds", "Time spent executing SQL statements by each request.", [
+            ({"route": route, "method": method}, metrics.db_duration) for (route, method), metrics in routes
+        ])
+
+        exposition.gauge("db_pool_checked_out", "Connections checked out of the pool.", [
+            ({"pool": i.name}, i.checked_out) for i in pool_metrics
+        ])
+        exposition.histogram("db_pool_checkout_wait_seconds", "Time waited for a connection on checkout.", [
+            ({"pool": i.name}, i.checkout_wait) for i in pool_metrics
+        ])
+
+        stats = [i.stats() for i in caches]
+        exposition.gauge("cache_entries", "Entries of the cache.", [({"cache": i["name"]}, i["size"]) for i in stats])
+        for name in ("hits", "misses", "evictions", "expirations"):
+            exposition.counter("cache_%s_total" % name, "Cache %s." % name, [({"cache": i["name"]}, i[name]) for i in stats])
+        return exposition.render()
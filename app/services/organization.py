@@ -1,12 +1,22 @@
-from typing import List, Optional, Any
+from typing import List, Optional, Any, Callable, Tuple
 
 from serum import inject, dependency
+from sqlalchemy.orm import Session
 
+from app.bus import invalidation_bus
+from app.cache import create_cache
 from app.config.exceptions import ValidationException
+from app.db.async_database import async_db_session
 from app.db.database import db_session
-from app.repositories.organization import OrganizationRepository
+from app.db.models import Organization
+from app.repositories.organization import OrganizationRepository, AsyncOrganizationRepository
 from app.schemas.organization import OrganizationDTO, OrganizationCreateDTO, OrganizationUpdateDTO, \
     OrganizationDetailsDTO
+from app.schemas.page import PageDTO
+from app.schemas.user import UserDTO
+from app.settings import settings
+
+organization_cache = create_cache("organization")
 
 
 @inject
@@ -14,30 +24,86 @@ from app.schemas.organization import OrganizationDTO, OrganizationCreateDTO, Org
 class OrganizationService:
     repository: OrganizationRepository
 
-    def get_all(self) -> List[OrganizationDTO]:
-        with db_session() as db:
-            orgs = self.repository.get_all(db)
-            return [OrganizationDTO.from_model(i) for i in orgs]
+    def get_all(self, after: Optional[int] = None,
+                limit: int = settings.PAGE_SIZE_DEFAULT) -> PageDTO[OrganizationDTO]:
+        with db_session(read_only=True) as db:
+            orgs = self.repository.get_all(db, after, limit + 1)
+            return PageDTO[OrganizationDTO].from_models(orgs, limit, OrganizationDTO.from_model)
 
     def get_by_id(self, id: int) -> Optional[OrganizationDTO]:
-        with db_session() as db:
+        org = organization_cache.get(id)
+        if org:
+            return org
+
+        with db_session(read_only=True) as db:
             org = self.repository.get_by_id(db, id)
             if org:
-                return OrganizationDTO.from_model(org)
+                org = OrganizationDTO.from_model(org)
+                organization_cache.set(id, org)
+                return org
+
+    def get_by_ids(self, ids: List[int]) -> List[OrganizationDTO]:
+        return organization_cache.get_many(ids, self._load_by_ids, lambda i: i.id)
+
+    def _load_by_ids(self, ids: List[int]) -> List[OrganizationDTO]:
+        with db_session(read_only=True) as db:
+            return [OrganizationDTO.from_model(i) for i in self.repository.get_by_ids(db, ids)]
 
     def get_by_name(self, name: str) -> Optional[OrganizationDTO]:
-        with db_session() as db:
+        with db_session(read_only=True) as db:
             org = self.repository.get_by_name(db, name)
             if org:
                 return OrganizationDTO.from_model(org)
 
+    def get_version(self, id: int) -> Optional[tuple]:
+        """
+        The details include the first page of the users, so does the version.
+        :return: a value which changes whenever the organization details change, None if it does not exist
+        """
+        with db_session(read_only=True) as db:
+            return self.repository.get_version(db, id, settings.PAGE_SIZE_DEFAULT + 1)
+
     def get_details(self, id: int) -> Optional[OrganizationDetailsDTO]:
-        with db_session() as db:
+        with db_session(read_only=True) as db:
+            org = self.repository.get_by_id(db, id)
+            if not org:
+                raise ValidationException("Organization %s does not exist" % id)
+
+            return self._to_details(db, org)
+
+    def get_details_if_modified(self, id: int, unchanged: Callable[[Optional[tuple]], Any]
+                                ) -> Tuple[Any, Optional[OrganizationDetailsDTO]]:
+        """
+        Reads the version of the organization, then its details unless the client copy is current, in a single unit
+        of work. This way both come from the same replica, and the details are never older than the version.
+        :param unchanged: called with the version, None if the organization does not exist, returns a value when the
+        client copy is current
+        :return: the value returned by unchanged, or None and the details
+        """
+        with db_session(read_only=True):
+            result = unchanged(self.get_version(id))
+            if result:
+                return result, None
+            return None, self.get_details(id)
+
+    def get_users(self, id: int, after: Optional[int] = None,
+                  limit: int = settings.PAGE_SIZE_DEFAULT) -> PageDTO[UserDTO]:
+        with db_session(read_only=True) as db:
             org = self.repository.get_by_id(db, id)
             if not org:
                 raise ValidationException("Organization %s does not exist" % id)
 
-            return OrganizationDetailsDTO.from_model(org)
+            users = self.repository.get_users(db, id, after, limit + 1)
+            return PageDTO[UserDTO].from_models(users, limit, UserDTO.from_model)
+
+    def _to_details(self, db: Session, org: Organization) -> OrganizationDetailsDTO:
+        """
+        Convert an organization to an OrganizationDetailsDTO including the first page of its users,
+        so the size of the details does not depend on the size of the organization.
+        """
+        limit = settings.PAGE_SIZE_DEFAULT
+        users = self.repository.get_users(db, org.id, None, limit + 1)
+        return OrganizationDetailsDTO.from_model(org, PageDTO[UserDTO].from_models(users, limit, UserDTO.from_model))
 
     def create(self, data: OrganizationCreateDTO) -> Optional[OrganizationDetailsDTO]:
         """
@@ -45,11 +111,11 @@ class OrganizationService:
         :param data: data required to create an organization
         :return: the new organization
         """
-        org = self.get_by_name(data.name)
-        if org:
-            raise ValidationException("Organization already exists with the name")
-
         with db_session() as db:
+            org = self.get_by_name(data.name)
+            if org:
+                raise ValidationException("Organization already exists with the name")
+
             return OrganizationDetailsDTO.from_model(self.repository.create(db, data))
 
     def update(self, id: int, data: OrganizationUpdateDTO) -> Optional[OrganizationDetailsDTO]:
@@ -60,21 +126,77 @@ class OrganizationService:
         :param data: new organization data
         :return: the updated organization
         """
-        org = self.get_by_id(id)
-        if not org:
-            raise ValidationException("Organization %s does not exist" % id)
+        with db_session() as db:
+            org = self.get_by_id(id)
+            if not org:
+                raise ValidationException("Organization %s does not exist" % id)
 
-        org_with_name = self.get_by_name(data.name)
-        if org_with_name and org_with_name.id != id:
-            raise ValidationException("Organization already exists with the name")
+            org_with_name = self.get_by_name(data.name)
+            if org_with_name and org_with_name.id != id:
+                raise ValidationException("Organization already exists with the name")
 
-        with db_session() as db:
-            return OrganizationDetailsDTO.from_model(self.repository.update(db, id, data))
+            result = self._to_details(db, self.repository.update(db, id, data))
+        organization_cache.invalidate(id)
+        invalidation_bus.publish("organization", id)
+        return result
 
     def delete(self, id: int) -> Any:
-        org = self.get_by_id(id)
-        if not org:
-            raise ValidationException("Organization %s does not exist" % id)
-
         with db_session() as db:
-            return self.repository.delete(db, id)
+            org = self.get_by_id(id)
+            if not org:
+                raise ValidationException("Organization %s does not exist" % id)
+
+            result = self.repository.delete(db, id)
+        organization_cache.invalidate(id)
+        invalidation_bus.publish("organization", id)
+        return result
+
+
+@inject
+@dependency
+class AsyncOrganizationService:
+    """
+    Reads of OrganizationService for the async DB mode.
+    """
+    repository: AsyncOrganizationRepository
+
+    async def get_all(self, after: Optional[int] = None,
+                      limit: int = settings.PAGE_SIZE_DEFAULT) -> PageDTO[OrganizationDTO]:
+        async with async_db_session() as db:
+            orgs = await self.repository.get_all(db, after, limit + 1)
+            return PageDTO[OrganizationDTO].from_models(orgs, limit, OrganizationDTO.from_model)
+
+    async def get_version(self, id: int) -> Optional[tuple]:
+        async with async_db_session() as db:
+            return await self.repository.get_version(db, id, settings.PAGE_SIZE_DEFAULT + 1)
+
+    async def get_details(self, id: int) -> Optional[OrganizationDetailsDTO]:
+        async with async_db_session() as db:
+            org = await self.repository.get_by_id(db, id)
+            if not org:
+                raise ValidationException("Organization %s does not exist" % id)
+
+            limit = settings.PAGE_SIZE_DEFAULT
+            users = await self.repository.get_users(db, id, None, limit + 1)
+            return OrganizationDetailsDTO.from_model(org, PageDTO[UserDTO].from_models(users, limit, UserDTO.from_model))
+
+    async def get_details_if_modified(self, id: int, unchanged: Callable[[Optional[tuple]], Any]
+                                      ) -> Tuple[Any, Optional[OrganizationDetailsDTO]]:
+        """
+        Same as OrganizationService.get_details_if_modified.
+        """
+        async with async_db_session():
+            result = unchanged(await self.get_version(id))
+            if result:
+                return result, None
+            return None, await self.get_details(id)
+
+    async def get_users(self, id: int, after: Optional[int] = None,
+                        limit: int = settings.PAGE_SIZE_DEFAULT) -> PageDTO[UserDTO]:
+        async with async_db_session() as db:
+            org = await self.repository.get_by_id(db, id)
+            if not org:
+                raise ValidationException("Organization %s does not exist" % id)
+
+            users = await self.repository.get_users(db, id, after, limit + 1)
+            return PageDTO[UserDTO].from_models(users, limit, UserDTO.from_model)
@@ -0,0 +1,231 @@
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from serum import inject, dependency
+
+from app.bus import invalidation_bus
+from app.db.database import db_session
+from app.repositories.permission import PermissionRepository
+from app.schemas.permission import PermissionCheckDTO, PermissionCheckResultDTO
+
+
+class PermissionIndex:
+    """
+    In-process index of the rights granted to each user through its roles.
+    Rights are mapped to bit positions, so the rights of a role or a user are a
+    single integer bitset and a check is a dictionary lookup plus a bit test.
+    The generation is incremented by every change, even while the index is not
+    loaded, so a load from rows read before a change can be detected and dropped.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.loaded = False
+        self.generation = 0
+        self._positions: Dict[int, int] = {}
+        self._role_masks: Dict[int, int] = {}
+        self._user_roles: Dict[int, Set[int]] = {}
+        self._role_users: Dict[int, Set[int]] = defaultdict(set)
+        self._user_masks: Dict[int, int] = {}
+
+    def load(self, user_roles: Iterable[Tuple[int, int]], role_rights: Iterable[Tuple[int, int]],
+             generation: Optional[int] = None) -> bool:
+        """
+        Rebuilds the whole index from the user_role and role_right rows.
+        :param generation: generation of the index when the rows were read, if they may be outdated
+        :return: False, and the index is left as it is, if it changed since the rows were read
+        """
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return False
+            self._clear()
+            for role_id, right_id in role_rights:
+                self._role_masks[role_id] = self._role_masks.get(role_id, 0) | self._bit(right_id)
+            for user_id, role_id in user_roles:
+                self._user_roles.setdefault(user_id, set()).add(role_id)
+                self._role_users[role_id].add(user_id)
+            for user_id in self._user_roles:
+                self._update_user_mask(user_id)
+            self.loaded = True
+            return True
+
+    def reset(self):
+        """
+        Empties the index, it will be rebuilt on the next check.
+        """
+        with self._lock:
+            self.generation += 1
+            self._clear()
+
+    def mark_changed(self):
+        """
+        Records a change which the index does not hold, as it is not loaded.
+        """
+        with self._lock:
+            self.generation += 1
+
+    def set_user_roles(self, user_id: int, role_ids: Iterable[int]):
+        with self._lock:
+            self.generation += 1
+            if not self.loaded:
+                return
+            for role_id in self._user_roles.pop(user_id, set()):
+                self._role_users[role_id].discard(user_id)
+            self._user_roles[user_id] = set(role_ids)
+            for role_id in self._user_roles[user_id]:
+                self._role_users[role_id].add(user_id)
+            self._update_user_mask(user_id)
+
+    def set_role_rights(self, role_id: int, right_ids: Iterable[int]):
+        with self._lock:
+            self.generation += 1
+            if not self.loaded:
+                return
+            mask = 0
+            for right_id in right_ids:
+                mask |= self._bit(right_id)
+            self._role_masks[role_id] = mask
+            for user_id in self._role_users[role_id]:
+                self._update_user_mask(user_id)
+
+    def remove_user(self, user_id: int):
+        self.set_user_roles(user_id, [])
+
+    def remove_role(self, role_id: int):
+        with self._lock:
+            self.generation += 1
+            if not self.loaded:
+                return
+            self._role_masks.pop(role_id, None)
+            for user_id in self._role_users.pop(role_id, set()):
+                self._user_roles[user_id].discard(role_id)
+                self._update_user_mask(user_id)
+
+    def check(self, checks: Iterable[Tuple[int, int]]) -> List[bool]:
+        """
+        :param checks: (user ID, right ID) pairs
+        :return: whether each user has the paired right
+        """
+        with self._lock:
+            result = []
+            for user_id, right_id in checks:
+                position = self._positions.get(right_id)
+                mask = self._user_masks.get(user_id, 0)
+                result.append(position is not None and bool(mask >> position & 1))
+            return result
+
+    def _clear(self):
+        self.loaded = False
+        self._positions.clear()
+        self._role_masks.clear()
+        self._user_roles.clear()
+        self._role_users.clear()
+        self._user_masks.clear()
+
+    def _bit(self, right_id: int) -> int:
+        position = self._positions.setdefault(right_id, len(self._positions))
+        return 1 << position
+
+    def _update_user_mask(self, user_id: int):
+        mask = 0
+        for role_id in self._user_roles.get(user_id, ()):
+            mask |= self._role_masks.get(role_id, 0)
+        if mask:
+            self._user_masks[user_id] = mask
+        else:
+            self._user_masks.pop(user_id, None)
+
+
+permission_index = PermissionIndex()
+
+# Loads of the index attempted by a check before it uses the rows it read without loading them
+LOAD_ATTEMPTS = 3
+
+
+@inject
+@dependency
+class PermissionService:
+    repository: PermissionRepository
+
+    def check(self, checks: List[PermissionCheckDTO]) -> List[PermissionCheckResultDTO]:
+        """
+        Checks whether each user has the paired right through any of its roles.
+        The permission index is built from the DB on the first check.
+        :param checks: list of user and right ID pairs
+        :return: the checks with their result
+        """
+        index = permission_index if permission_index.loaded else self.load()
+        allowed = index.check((i.user_id, i.right_id) for i in checks)
+        return [PermissionCheckResultDTO(user_id=i.user_id, right_id=i.right_id, allowed=j)
+                for i, j in zip(checks, allowed)]
+
+    def load(self) -> PermissionIndex:
+        """
+        Loads the permission index from the primary, as a replica may not have the latest changes yet.
+        A change made while the rows are read would be lost, so the load is retried if one was.
+        :return: the permission index, or when it changed on every attempt, an index of the rows
+        last read, only used by the current check
+        """
+        for _ in range(LOAD_ATTEMPTS):
+            generation = permission_index.generation
+            with db_session() as db:
+                user_roles = self.repository.get_user_roles(db)
+                role_rights = self.repository.get_role_rights(db)
+            if permission_index.load(user_roles, role_rights, generation):
+                return permission_index
+
+        index = PermissionIndex()
+        index.load(user_roles, role_rights)
+        return index
+
+    def set_user_roles(self, user_id: int, role_ids: List[int]):
+        permission_index.set_user_roles(user_id, role_ids)
+        invalidation_bus.publish("user_roles", user_id)
+
+    def set_role_rights(self, role_id: int, right_ids: List[int]):
+        permission_index.set_role_rights(role_id, right_ids)
+        invalidation_bus.publish("role_rights", role_id)
+
+    def remove_user(self, user_id: int):
+        permission_index.remove_user(user_id)
+        invalidation_bus.publish("user_roles", user_id)
+
+    def remove_role(self, role_id: int):
+        permission_index.remove_role(role_id)
+        invalidation_bus.publish("role_rights", role_id)
+
+    def reset(self):
+        permission_index.reset()
+        invalidation_bus.publish("permissions")
+
+    def refresh_user_roles(self, user_id: Optional[int]):
+        """
+        Invalidation bus handler, reloads the roles of a user changed by another worker.
+        The primary is read, as a replica may not have the change yet.
+        """
+        if user_id is None:
+            permission_index.reset()
+        elif permission_index.loaded:
+            with db_session() as db:
+                permission_index.set_user_roles(user_id, self.repository.get_role_ids(db, user_id))
+        else:
+            # A load in progress may have read the rows before the change
+            permission_index.mark_changed()
+
+    def refresh_role_rights(self, role_id: Optional[int]):
+        """
+        Invalidation bus handler, reloads the rights of a role changed by another worker.
+        """
+        if role_id is None:
+            permission_index.reset()
+        elif permission_index.loaded:
+            with db_session() as db:
+                permission_index.set_role_rights(role_id, self.repository.get_right_ids(db, role_id))
+        else:
+            permission_index.mark_changed()
+
+
+invalidation_bus.subscribe("user_roles", lambda i: PermissionService().refresh_user_roles(i))
+invalidation_bus.subscribe("role_rights", lambda i: PermissionService().refresh_role_rights(i))
+invalidation_bus.subscribe("permissions", lambda i: permission_index.reset())
@@ -1,56 +1,142 @@
-from typing import List, Optional, Any
+from collections import Counter
+from typing import List, Optional, Any, Callable, Tuple
 
 from serum import dependency, inject
+from sqlalchemy.exc import IntegrityError
 
+from app.bus import invalidation_bus
+from app.cache import create_cache, create_response_cache
 from app.config.exceptions import ValidationException
+from app.db.async_database import async_db_session
 from app.db.database import db_session
-from app.repositories.right import RightRepository
+from app.encoders import dumps
+from app.repositories.right import RightRepository, AsyncRightRepository
+from app.schemas.page import PageDTO
 from app.schemas.right import RightDTO, RightCreateDTO, RightUpdateDTO
+from app.services.permission import PermissionService
+from app.settings import settings
+
+right_cache = create_cache("right")
+right_details_cache = create_response_cache("right_details", "right")
 
 
 @inject
 @dependency
 class RightService:
     repository: RightRepository
+    permission_service: PermissionService
 
-    def get_all(self) -> List[RightDTO]:
-        with db_session() as db:
-            rights = self.repository.get_all(db)
-            return [RightDTO.from_model(i) for i in rights]
+    def get_all(self, after: Optional[int] = None,
+                limit: int = settings.PAGE_SIZE_DEFAULT) -> PageDTO[RightDTO]:
+        with db_session(read_only=True) as db:
+            rights = self.repository.get_all(db, after, limit + 1)
+            return PageDTO[RightDTO].from_models(rights, limit, RightDTO.from_model)
 
     def get_by_id(self, id: int) -> Optional[RightDTO]:
-        with db_session() as db:
-            user = self.repository.get_by_id(db, id)
-            if user:
-                return RightDTO.from_model(user)
+        right = right_cache.get(id)
+        if right:
+            return right
+
+        with db_session(read_only=True) as db:
+            right = self.repository.get_by_id(db, id)
+            if right:
+                right = RightDTO.from_model(right)
+                right_cache.set(id, right)
+                return right
+
+    def get_by_ids(self, ids: List[int]) -> List[RightDTO]:
+        return right_cache.get_many(ids, self._load_by_ids, lambda i: i.id)
+
+    def _load_by_ids(self, ids: List[int]) -> List[RightDTO]:
+        with db_session(read_only=True) as db:
+            return [RightDTO.from_model(i) for i in self.repository.get_by_ids(db, ids)]
 
     def get_by_name(self, name: str) -> Optional[RightDTO]:
-        with db_session() as db:
+        with db_session(read_only=True) as db:
             user = self.repository.get_by_name(db, name)
             if user:
                 return RightDTO.from_model(user)
 
+    def get_version(self, id: int) -> Optional[tuple]:
+        """
+        :return: a value which changes whenever the right details change, None if it does not exist
+        """
+        with db_session(read_only=True) as db:
+            return self.repository.get_version(db, id)
+
     def get_details(self, id: int) -> Optional[RightDTO]:
-        with db_session() as db:
+        with db_session(read_only=True) as db:
             right = self.repository.get_by_id(db, id)
             if not right:
                 raise ValidationException("Right %s does not exist" % id)
 
             return RightDTO.from_model(right)
 
+    def get_details_json(self, id: int, unchanged: Callable[[Optional[tuple]], Any]) -> Tuple[Any, Optional[bytes]]:
+        """
+        Returns the right details encoded to JSON, from the cache as long as the right is of the version they were built
+        from. The version is read first, then the details unless the client copy is current, in a single unit of work,
+        so the cached details are never older than the version they are cached under.
+        :param unchanged: called with the version, None if the right does not exist, returns a value when the client
+        copy is current
+        :return: the value returned by unchanged, or None and the encoded details
+        """
+        with db_session(read_only=True):
+            version = self.get_version(id)
+            result = unchanged(version)
+            if result:
+                return result, None
+            body = right_details_cache.get_body(id, version)
+            if body is None:
+                body = dumps(self.get_details(id))
+                right_details_cache.set_body(id, version, body)
+            return None, body
+
     def create(self, data: RightCreateDTO) -> Optional[RightDTO]:
         """
         Creates a new right if there is no other right with thew given name
         :param data: data required to create a right
         :return: the new right
         """
-        right = self.get_by_name(data.name)
-        if right:
-            raise ValidationException("Right already exists with the name")
-
         with db_session() as db:
+            right = self.get_by_name(data.name)
+            if right:
+                raise ValidationException("Right already exists with the name")
+
             return RightDTO.from_model(self.repository.create(db, data))
 
+    def create_batch(self, data: List[RightCreateDTO], upsert: bool = False) -> List[RightDTO]:
+        """
+        Creates the given rights in a single transaction, checking the names with a single query.
+        :param data: data required to create each right, names must be unique in the batch
+        :param upsert: whether the rights whose name already exists are updated, instead of failing the batch
+        :return: the created or updated rights, in the order of the data
+        """
+        names = [i.name for i in data]
+        duplicated = sorted(name for name, count in Counter(names).items() if count > 1)
+        if duplicated:
+            raise ValidationException("Rights are duplicated in the batch: %s" % ", ".join(duplicated))
+
+        try:
+            with db_session() as db:
+                existing = {i.name: i for i in self.repository.get_by_names(db, names)}
+                if existing and not upsert:
+                    raise ValidationException("Rights already exist with the names: %s" % ", ".join(sorted(existing)))
+
+                changed = self.repository.save_batch(db, data, existing, upsert)
+                rights = {i.name: i for i in self.repository.get_by_names(db, names)}
+                result = [RightDTO.from_model(rights[i]) for i in names]
+        except IntegrityError:
+            # Another request created some of the rights meanwhile, the batch is rolled back
+            with db_session(read_only=True) as db:
+                existing = sorted(i.name for i in self.repository.get_by_names(db, names))
+            raise ValidationException("Rights already exist with the names: %s" % ", ".join(existing))
+        for id in changed:
+            right_cache.invalidate(id)
+            right_details_cache.invalidate(id)
+            invalidation_bus.publish("right", id)
+        return result
+
     def update(self, id: int, data: RightUpdateDTO) -> Optional[RightDTO]:
         """
         Updates an existing right with the given data.
@@ -59,21 +145,74 @@ class RightService:
         :param data: new right data
         :return: the updated right
         """
-        right = self.get_by_id(id)
-        if not right:
-            raise ValidationException("Right %s does not exist" % id)
+        with db_session() as db:
+            right = self.get_by_id(id)
+            if not right:
+                raise ValidationException("Right %s does not exist" % id)
 
-        right_with_name = self.get_by_name(data.name)
-        if right_with_name and right_with_name.id != id:
-            raise ValidationException("Right already exists with the name")
+            right_with_name = self.get_by_name(data.name)
+            if right_with_name and right_with_name.id != id:
+                raise ValidationException("Right already exists with the name")
 
-        with db_session() as db:
-            return RightDTO.from_model(self.repository.update(db, id, data))
+            result = RightDTO.from_model(self.repository.update(db, id, data))
+        right_cache.invalidate(id)
+        right_details_cache.invalidate(id)
+        invalidation_bus.publish("right", id)
+        return result
 
     def delete(self, id: int) -> Any:
-        right = self.get_by_id(id)
-        if not right:
-            raise ValidationException("Right %s does not exist" % id)
-
         with db_session() as db:
-            return self.repository.delete(db, id)
+            right = self.get_by_id(id)
+            if not right:
+                raise ValidationException("Right %s does not exist" % id)
+
+            result = self.repository.delete(db, id)
+        right_cache.invalidate(id)
+        right_details_cache.invalidate(id)
+        invalidation_bus.publish("right", id)
+        # The right is dropped from every role, which is cheaper to rebuild than to patch
+        self.permission_service.reset()
+        return result
+
+
+@inject
+@dependency
+class AsyncRightService:
+    """
+    Reads of RightService for the async DB mode, sharing its caches.
+    """
+    repository: AsyncRightRepository
+
+    async def get_all(self, after: Optional[int] = None,
+                      limit: int = settings.PAGE_SIZE_DEFAULT) -> PageDTO[RightDTO]:
+        async with async_db_session() as db:
+            rights = await self.repository.get_all(db, after, limit + 1)
+            return PageDTO[RightDTO].from_models(rights, limit, RightDTO.from_model)
+
+    async def get_version(self, id: int) -> Optional[tuple]:
+        async with async_db_session() as db:
+            return await self.repository.get_version(db, id)
+
+    async def get_details(self, id: int) -> Optional[RightDTO]:
+        async with async_db_session() as db:
+            right = await self.repository.get_by_id(db, id)
+            if not right:
+                raise ValidationException("Right %s does not exist" % id)
+
+            return RightDTO.from_model(right)
+
+    async def get_details_json(self, id: int,
+                               unchanged: Callable[[Optional[tuple]], Any]) -> Tuple[Any, Optional[bytes]]:
+        """
+        Same as RightService.get_details_json.
+        """
+        async with async_db_session():
+            version = await self.get_version(id)
+            result = unchanged(version)
+            if result:
+                return result, None
+            body = right_details_cache.get_body(id, version)
+            if body is None:
+                body = dumps(await self.get_details(id))
+                right_details_cache.set_body(id, version, body)
+            return None, body
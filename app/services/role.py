@@ -1,12 +1,24 @@
-from typing import List, Optional, Any
+from collections import Counter
+from typing import List, Optional, Any, Callable, Tuple
 
 from serum import inject, dependency
+from sqlalchemy.exc import IntegrityError
 
+from app.bus import invalidation_bus
+from app.cache import create_cache, create_response_cache
 from app.config.exceptions import ValidationException
+from app.db.async_database import async_db_session
 from app.db.database import db_session
-from app.repositories.role import RoleRepository
+from app.encoders import dumps
+from app.repositories.role import RoleRepository, AsyncRoleRepository
+from app.schemas.page import PageDTO
 from app.schemas.role import RoleDTO, RoleDetailsDTO, RoleCreateDTO, RoleUpdateDTO
+from app.services.permission import PermissionService
 from app.services.right import RightService
+from app.settings import settings
+
+role_cache = create_cache("role")
+role_details_cache = create_response_cache("role_details", "role")
 
 
 @inject
@@ -14,44 +26,118 @@ from app.services.right import RightService
 class RoleService:
     repository: RoleRepository
     right_service: RightService
+    permission_service: PermissionService
 
-    def get_all(self) -> List[RoleDTO]:
-        with db_session() as db:
-            roles = self.repository.get_all(db)
-            return [RoleDTO.from_model(i) for i in roles]
+    def get_all(self, after: Optional[int] = None,
+                limit: int = settings.PAGE_SIZE_DEFAULT) -> PageDTO[RoleDTO]:
+        with db_session(read_only=True) as db:
+            roles = self.repository.get_all(db, after, limit + 1)
+            return PageDTO[RoleDTO].from_models(roles, limit, RoleDTO.from_model)
 
     def get_by_id(self, id: int) -> Optional[RoleDTO]:
-        with db_session() as db:
+        role = role_cache.get(id)
+        if role:
+            return role
+
+        with db_session(read_only=True) as db:
             role = self.repository.get_by_id(db, id)
             if role:
-                return RoleDTO.from_model(role)
+                role = RoleDTO.from_model(role)
+                role_cache.set(id, role)
+                return role
 
-    def get_by_name(self, name: str) -> Optional[RoleDetailsDTO]:
-        with db_session() as db:
+    def get_by_ids(self, ids: List[int]) -> List[RoleDTO]:
+        return role_cache.get_many(ids, self._load_by_ids, lambda i: i.id)
+
+    def _load_by_ids(self, ids: List[int]) -> List[RoleDTO]:
+        with db_session(read_only=True) as db:
+            return [RoleDTO.from_model(i) for i in self.repository.get_by_ids(db, ids)]
+
+    def get_by_name(self, name: str) -> Optional[RoleDTO]:
+        with db_session(read_only=True) as db:
             role = self.repository.get_by_name(db, name)
             if role:
-                return RoleDetailsDTO.from_model(role)
+                return RoleDTO.from_model(role)
+
+    def get_version(self, id: int) -> Optional[tuple]:
+        """
+        :return: a value which changes whenever the role details change, None if it does not exist
+        """
+        with db_session(read_only=True) as db:
+            return self.repository.get_version(db, id)
 
     def get_details(self, id: int) -> Optional[RoleDetailsDTO]:
-        with db_session() as db:
-            role = self.repository.get_by_id(db, id)
+        with db_session(read_only=True) as db:
+            role = self.repository.get_details(db, id)
             if not role:
                 raise ValidationException("Role %s does not exist" % id)
             return RoleDetailsDTO.from_model(role)
 
+    def get_details_json(self, id: int, unchanged: Callable[[Optional[tuple]], Any]) -> Tuple[Any, Optional[bytes]]:
+        """
+        Returns the role details encoded to JSON, from the cache as long as the role is of the version they were built
+        from. The version is read first, then the details unless the client copy is current, in a single unit of work,
+        so the cached details are never older than the version they are cached under.
+        :param unchanged: called with the version, None if the role does not exist, returns a value when the client
+        copy is current
+        :return: the value returned by unchanged, or None and the encoded details
+        """
+        with db_session(read_only=True):
+            version = self.get_version(id)
+            result = unchanged(version)
+            if result:
+                return result, None
+            body = role_details_cache.get_body(id, version)
+            if body is None:
+                body = dumps(self.get_details(id))
+                role_details_cache.set_body(id, version, body)
+            return None, body
+
     def create(self, data: RoleCreateDTO) -> Optional[RoleDetailsDTO]:
         """
         Creates a new role if there is no other role with thew given name
         :param data: data required to create a role
         :return: the new role
         """
-        role = self.get_by_name(data.name)
-        if role:
-            raise ValidationException("Role already exists with the name")
-
         with db_session() as db:
+            role = self.get_by_name(data.name)
+            if role:
+                raise ValidationException("Role already exists with the name")
+
             return RoleDetailsDTO.from_model(self.repository.create(db, data))
 
+    def create_batch(self, data: List[RoleCreateDTO], upsert: bool = False) -> List[RoleDTO]:
+        """
+        Creates the given roles in a single transaction, checking the names with a single query.
+        :param data: data required to create each role, names must be unique in the batch
+        :param upsert: whether the roles whose name already exists are updated, instead of failing the batch
+        :return: the created or updated roles, in the order of the data
+        """
+        names = [i.name for i in data]
+        duplicated = sorted(name for name, count in Counter(names).items() if count > 1)
+        if duplicated:
+            raise ValidationException("Roles are duplicated in the batch: %s" % ", ".join(duplicated))
+
+        try:
+            with db_session() as db:
+                existing = {i.name: i for i in self.repository.get_by_names(db, names)}
+                if existing and not upsert:
+                    raise ValidationException("Roles already exist with the names: %s" % ", ".join(sorted(existing)))
+
+                changed = self.repository.save_batch(db, data, existing, upsert)
+                roles = {i.name: i for i in self.repository.get_by_names(db, names)}
+                result = [RoleDTO.from_model(roles[i]) for i in names]
+        except IntegrityError:
+            # Another request created some of the roles meanwhile, the batch is rolled back
+            with db_session(read_only=True) as db:
+                existing = sorted(i.name for i in self.repository.get_by_names(db, names))
+            raise ValidationException("Roles already exist with the names: %s" % ", ".join(existing))
+        for id in changed:
+            role_cache.invalidate(id)
+            role_details_cache.invalidate(id)
+            invalidation_bus.publish("role", id)
+        return result
+
     def update(self, id: int, data: RoleUpdateDTO) -> Optional[RoleDetailsDTO]:
         """
         Updates an existing role with the given data.
@@ -60,24 +146,33 @@ class RoleService:
         :param data: new role data
         :return: the updated role
         """
-        role = self.get_by_id(id)
-        if not role:
-            raise ValidationException("Role %s does not exist" % id)
+        with db_session() as db:
+            role = self.get_by_id(id)
+            if not role:
+                raise ValidationException("Role %s does not exist" % id)
 
-        role_with_name = self.get_by_name(data.name)
-        if role_with_name and role_with_name.id != id:
-            raise ValidationException("Role already exists with the name")
+            role_with_name = self.get_by_name(data.name)
+            if role_with_name and role_with_name.id != id:
+                raise ValidationException("Role already exists with the name")
 
-        with db_session() as db:
-            return RoleDetailsDTO.from_model(self.repository.update(db, id, data))
+            result = RoleDetailsDTO.from_model(self.repository.update(db, id, data))
+        role_cache.invalidate(id)
+        role_details_cache.invalidate(id)
+        invalidation_bus.publish("role", id)
+        return result
 
     def delete(self, id: int) -> Any:
-        role = self.get_by_id(id)
-        if not role:
-            raise ValidationException("Role %s does not exist" % id)
-
         with db_session() as db:
-            return self.repository.delete(db, id)
+            role = self.get_by_id(id)
+            if not role:
+                raise ValidationException("Role %s does not exist" % id)
+
+            result = self.repository.delete(db, id)
+        role_cache.invalidate(id)
+        role_details_cache.invalidate(id)
+        invalidation_bus.publish("role", id)
+        self.permission_service.remove_role(id)
+        return result
 
     def add_rights(self, id: int, right_ids: List[int]) -> Optional[RoleDetailsDTO]:
         """
@@ -87,19 +182,21 @@ class RoleService:
         :param right_ids: list of right IDs to be removed
         :return: the updated role
         """
-        role = self.get_by_id(id)
-        if not role:
-            raise ValidationException("Role %s does not exist" % id)
+        with db_session() as db:
+            role = self.get_by_id(id)
+            if not role:
+                raise ValidationException("Role %s does not exist" % id)
 
-        rights = []
-        for right_id in right_ids:
-            right = self.right_service.get_by_id(right_id)
-            if not right:
-                raise ValidationException("Right %s does not exist" % right_id)
-            rights.append(right.id)
+            existing = {i.id for i in self.right_service.get_by_ids(right_ids)}
+            for right_id in right_ids:
+                if right_id not in existing:
+                    raise ValidationException("Right %s does not exist" % right_id)
 
-        with db_session() as db:
-            return RoleDetailsDTO.from_model(self.repository.add_rights(db, id, rights))
+            result = RoleDetailsDTO.from_model(self.repository.add_rights(db, id, right_ids))
+        # The other workers do not serve their cached details either, which are not of the new version
+        role_details_cache.invalidate(id)
+        self.permission_service.set_role_rights(id, [i.id for i in result.rights])
+        return result
 
     def remove_rights(self, id: int, right_ids: List[int]) -> Optional[RoleDetailsDTO]:
         """
@@ -109,16 +206,60 @@ class RoleService:
         :param right_ids: list of right IDs to be added
         :return: the updated role
         """
-        role = self.get_by_id(id)
-        if not role:
-            raise ValidationException("Role %s does not exist" % id)
+        with db_session() as db:
+            role = self.get_by_id(id)
+            if not role:
+                raise ValidationException("Role %s does not exist" % id)
 
-        rights = []
-        for right_id in right_ids:
-            right = self.right_service.get_by_id(right_id)
-            if not right:
-                raise ValidationException("Right %s does not exist" % right_id)
-            rights.append(right.id)
+            existing = {i.id for i in self.right_service.get_by_ids(right_ids)}
+            for right_id in right_ids:
+                if right_id not in existing:
+                    raise ValidationException("Right %s does not exist" % right_id)
 
-        with db_session() as db:
-            return RoleDetailsDTO.from_model(self.repository.remove_rights(db, id, rights))
+            result = RoleDetailsDTO.from_model(self.repository.remove_rights(db, id, right_ids))
+        # The other workers do not serve their cached details either, which are not of the new version
+        role_details_cache.invalidate(id)
+        self.permission_service.set_role_rights(id, [i.id for i in result.rights])
+        return result
+
+
+@inject
+@dependency
+class AsyncRoleService:
+    """
+    Reads of RoleService for the async DB mode, sharing its caches.
+    """
+    repository: AsyncRoleRepository
+
+    async def get_all(self, after: Optional[int] = None,
+                      limit: int = settings.PAGE_SIZE_DEFAULT) -> PageDTO[RoleDTO]:
+        async with async_db_session() as db:
+            roles = await self.repository.get_all(db, after, limit + 1)
+            return PageDTO[RoleDTO].from_models(roles, limit, RoleDTO.from_model)
+
+    async def get_version(self, id: int) -> Optional[tuple]:
+        async with async_db_session() as db:
+            return await self.repository.get_version(db, id)
+
+    async def get_details(self, id: int) -> Optional[RoleDetailsDTO]:
+        async with async_db_session() as db:
+            role = await self.repository.get_details(db, id)
+            if not role:
+                raise ValidationException("Role %s does not exist" % id)
+            return RoleDetailsDTO.from_model(role)
+
+    async def get_details_json(self, id: int,
+                               unchanged: Callable[[Optional[tuple]], Any]) -> Tuple[Any, Optional[bytes]]:
+        """
+        Same as RoleService.get_details_json.
+        """
+        async with async_db_session():
+            version = await self.get_version(id)
+            result = unchanged(version)
+            if result:
+                return result, None
+            body = role_details_cache.get_body(id, version)
+            if body is None:
+                body = dumps(await self.get_details(id))
+                role_details_cache.set_body(id, version, body)
+            return None, body
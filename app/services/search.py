@@ -0,0 +1,28 @@
+from serum import inject, dependency
+
+from app.db.database import db_session
+from app.repositories.search import SearchRepository
+from app.schemas.right import RightDTO
+from app.schemas.role import RoleDTO
+from app.schemas.search import SearchResultDTO
+from app.schemas.user import UserDTO
+from app.settings import settings
+
+
+@inject
+@dependency
+class SearchService:
+    repository: SearchRepository
+
+    def search(self, query: str, limit: int = settings.SEARCH_LIMIT_DEFAULT) -> SearchResultDTO:
+        """
+        Searches the users by first name, last name and email, and the roles and rights by name.
+        :param query: text contained in, or close to a word of, the searched fields
+        :param limit: maximum number of users, roles and rights each, best matches first
+        """
+        with db_session(read_only=True) as db:
+            return SearchResultDTO.construct(
+                users=[UserDTO.from_model(i) for i in self.repository.search_users(db, query, limit)],
+                roles=[RoleDTO.from_model(i) for i in self.repository.search_roles(db, query, limit)],
+                rights=[RightDTO.from_model(i) for i in self.repository.search_rights(db, query, limit)],
+            )
@@ -1,13 +1,26 @@
-from typing import List, Optional, Any
+import csv
+import io
+import json
+from functools import partial
+from itertools import islice
+from typing import List, Optional, Any, Callable, Iterator, Tuple, Union
 
+from pydantic import ValidationError
 from serum import dependency, inject
+from sqlalchemy.exc import IntegrityError
 
 from app.config.exceptions import ValidationException
-from app.db.database import db_session
+from app.db.database import db_session, streaming_session
 from app.repositories.user import UserRepository
-from app.schemas.user import UserDTO, UserCreateDTO, UserDetailsDTO, UserUpdateDTO
+from app.schemas.fields import parse_fields, from_model_fields
+from app.schemas.page import PageDTO
+from app.schemas.right import RightDTO
+from app.schemas.user import UserDTO, UserCreateDTO, UserDetailsDTO, UserUpdateDTO, UserImportResultDTO, \
+    UserImportErrorDTO, UserFilterDTO
 from app.services.organization import OrganizationService
+from app.services.permission import PermissionService
 from app.services.role import RoleService
+from app.settings import settings
 
 
 @inject
@@ -16,31 +29,113 @@ class UserService:
     repository: UserRepository
     role_service: RoleService
     org_service: OrganizationService
+    permission_service: PermissionService
 
-    def get_all(self) -> List[UserDTO]:
-        with db_session() as db:
-            record_list = self.repository.get_all(db)
-            return [UserDTO.from_model(i) for i in record_list]
+    def get_all(self, after: Optional[int] = None, limit: int = settings.PAGE_SIZE_DEFAULT,
+                filters: Optional[UserFilterDTO] = None, sort: str = "id",
+                fields: Optional[str] = None) -> PageDTO[UserDTO]:
+        """
+        :param after: ID of the last user of the previous page, whatever the sort key
+        :param filters: conditions the users must all meet
+        :param sort: id or email
+        :param fields: comma separated fields of the users to return, all of them by default
+        :return: a page of users
+        """
+        fields = parse_fields(fields, UserDTO)
+        converter = partial(from_model_fields, UserDTO, fields=fields) if fields else UserDTO.from_model
+        with db_session(read_only=True) as db:
+            record_list = self.repository.get_all(db, after, limit + 1, filters, sort, fields)
+            # Other sort keys are read from the cursor user: when it was deleted, no user comes after it
+            if not record_list and after is not None and sort != "id" and not self.repository.get_by_id(db, after):
+                raise ValidationException("User %s of the cursor does not exist" % after)
+            return PageDTO[UserDTO].from_models(record_list, limit, converter)
+
+    def export(self, format: str, organization_id: Optional[int] = None,
+               is_active: Optional[bool] = None) -> Iterator[str]:
+        """
+        Exports the users ordered by ID, optionally filtered by organization and active flag.
+        The rows are streamed from the DB and formatted one batch at a time, so the memory
+        used does not depend on the number of users.
+        :param format: ndjson, one JSON object per line, or csv with a header line
+        :return: the chunks of the export
+        """
+        fields = [i.key for i in self.repository.export_columns]
+        with streaming_session() as db:
+            rows = self.repository.iter_export(db, organization_id, is_active, settings.EXPORT_BATCH_SIZE)
+            if format == "csv":
+                yield self._to_csv([fields])
+            while True:
+                batch = list(islice(rows, settings.EXPORT_BATCH_SIZE))
+                if not batch:
+                    break
+                if format == "csv":
+                    yield self._to_csv(batch)
+                else:
+                    yield "".join(json.dumps(dict(zip(fields, i))) + "\n" for i in batch)
+
+    def _to_csv(self, rows: List) -> str:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        return buffer.getvalue()
 
     def get_by_id(self, id: int) -> Optional[UserDTO]:
-        with db_session() as db:
+        with db_session(read_only=True) as db:
             user = self.repository.get_by_id(db, id)
             if user:
                 return UserDTO.from_model(user)
 
     def get_by_email(self, email: str) -> Optional[UserDTO]:
-        with db_session() as db:
+        with db_session(read_only=True) as db:
             user = self.repository.get_by_email(db, email)
             if user:
                 return UserDTO.from_model(user)
 
-    def get_details(self, id: int) -> Optional[UserDetailsDTO]:
-        with db_session() as db:
-            user = self.repository.get_by_id(db, id)
+    def get_version(self, id: int) -> Optional[tuple]:
+        """
+        :return: a value which changes whenever the user details change, None if it does not exist
+        """
+        with db_session(read_only=True) as db:
+            return self.repository.get_version(db, id)
+
+    def get_details(self, id: int, fields: Optional[str] = None) -> Optional[UserDetailsDTO]:
+        """
+        :param fields: comma separated fields of the user details to return, like organization.name, all of them by default
+        """
+        fields = parse_fields(fields, UserDetailsDTO)
+        with db_session(read_only=True) as db:
+            user = self.repository.get_details(db, id, fields)
             if not user:
                 raise ValidationException("User %s does not exist" % id)
+            if fields:
+                return from_model_fields(UserDetailsDTO, user, fields)
             return UserDetailsDTO.from_model(user)
 
+    def get_details_if_modified(self, id: int, unchanged: Callable[[Optional[tuple]], Any],
+                                fields: Optional[str] = None) -> Tuple[Any, Optional[UserDetailsDTO]]:
+        """
+        Reads the version of the user, then its details unless the client copy is current, in a single unit of work.
+        This way both come from the same replica, and the details are never older than the version.
+        :param unchanged: called with the version, None if the user does not exist, returns a value when the client
+        copy is current
+        :param fields: comma separated fields of the user details to return, all of them by default
+        :return: the value returned by unchanged, or None and the details
+        """
+        with db_session(read_only=True):
+            result = unchanged(self.get_version(id))
+            if result:
+                return result, None
+            return None, self.get_details(id, fields)
+
+    def get_rights(self, id: int, after: Optional[int] = None,
+                   limit: int = settings.PAGE_SIZE_DEFAULT) -> PageDTO[RightDTO]:
+        with db_session(read_only=True) as db:
+            user = self.repository.get_by_id(db, id)
+            if not user:
+                raise ValidationException("User %s does not exist" % id)
+
+            rights = self.repository.get_rights(db, id, after, limit + 1)
+            return PageDTO[RightDTO].from_models(rights, limit, RightDTO.from_model)
+
     def create(self, data: UserCreateDTO) -> Optional[UserDetailsDTO]:
         """
         Creates a new user if there is no other user with thew given email
@@ -48,17 +143,106 @@ class UserService:
         :param data: data required to create a user
         :return: the new user
         """
-        user = self.get_by_email(data.email)
-        if user:
-            raise ValidationException("Email is not available")
+        with db_session() as db:
+            user = self.get_by_email(data.email)
+            if user:
+                raise ValidationException("Email is not available")
 
-        org = self.org_service.get_by_id(data.organization_id)
-        if not org:
-            raise ValidationException("Organization %s does not exist" % data.organization_id)
+            org = self.org_service.get_by_id(data.organization_id)
+            if not org:
+                raise ValidationException("Organization %s does not exist" % data.organization_id)
 
-        with db_session() as db:
             return UserDetailsDTO.from_model(self.repository.create(db, data))
 
+    def import_users(self, format: str, content: str) -> UserImportResultDTO:
+        """
+        Creates the users of an NDJSON or CSV import.
+        Users are validated and inserted in chunks, each in a single transaction: email
+        availability and organization existence are checked with one query per chunk.
+        Invalid users are reported with their line and do not prevent the others from being created.
+        :param format: ndjson, one JSON object per line, or csv with a header line
+        :param content: users to be created, with the fields of UserCreateDTO
+        :return: the number of users created and the errors
+        """
+        result = UserImportResultDTO()
+        emails = set()
+        chunk = []
+        for line, raw in self._parse_import(format, content):
+            try:
+                user = self._to_create_dto(raw)
+            except ValueError as exc:
+                result.errors.append(UserImportErrorDTO(line=line, error=self._import_error(exc)))
+                continue
+
+            if user.email in emails:
+                result.errors.append(UserImportErrorDTO(line=line, error="Email is already in the import"))
+                continue
+            emails.add(user.email)
+
+            chunk.append((line, user))
+            if len(chunk) == settings.IMPORT_CHUNK_SIZE:
+                self._import_chunk(chunk, result)
+                chunk = []
+        if chunk:
+            self._import_chunk(chunk, result)
+
+        result.errors.sort(key=lambda i: i.line)
+        return result
+
+    def _parse_import(self, format: str, content: str) -> Iterator[Tuple[int, Union[str, dict]]]:
+        """
+        :return: the line and the raw content of each user
+        """
+        if format == "csv":
+            reader = csv.DictReader(io.StringIO(content))
+            for row in reader:
+                # Empty cells are missing values
+                yield reader.line_num, {k: v for k, v in row.items() if v != ""}
+        else:
+            for line, text in enumerate(content.splitlines(), 1):
+                if text.strip():
+                    yield line, text
+
+    def _to_create_dto(self, raw: Union[str, dict]) -> UserCreateDTO:
+        data = json.loads(raw) if isinstance(raw, str) else raw
+        if not isinstance(data, dict):
+            raise ValueError("A user must be an object")
+        # The cells of a CSV row beyond the header are under the None key
+        if None in data:
+            raise ValueError("Too many values")
+        return UserCreateDTO(**data)
+
+    def _import_error(self, exc: ValueError) -> str:
+        if isinstance(exc, ValidationError):
+            return "; ".join("%s: %s" % (".".join(str(i) for i in error["loc"]), error["msg"]) for error in exc.errors())
+        return str(exc)
+
+    def _import_chunk(self, chunk: List[Tuple[int, UserCreateDTO]], result: UserImportResultDTO):
+        errors = []
+        valid = []
+        try:
+            with db_session() as db:
+                existing = self.repository.get_existing_emails(db, [user.email for _, user in chunk])
+                org_ids = {i.id for i in self.org_service.get_by_ids(list({user.organization_id for _, user in chunk}))}
+
+                for line, user in chunk:
+                    if user.email in existing:
+                        errors.append(UserImportErrorDTO(line=line, error="Email is not available"))
+                    elif user.organization_id not in org_ids:
+                        errors.append(UserImportErrorDTO(
+                            line=line, error="Organization %s does not exist" % user.organization_id))
+                    else:
+                        valid.append((line, user))
+
+                self.repository.bulk_create(db, [user for _, user in valid])
+        except IntegrityError as exc:
+            # Another request created one of the users meanwhile, the whole chunk is rolled back
+            errors.extend(UserImportErrorDTO(line=line, error="Not created: %s" % exc.orig) for line, _ in valid)
+            valid = []
+
+        result.created += len(valid)
+        result.errors.extend(errors)
+
     def update(self, id: int, data: UserUpdateDTO) -> Optional[UserDetailsDTO]:
         """
         Updates an existing user with the given data.
@@ -68,24 +252,26 @@ class UserService:
         :param data: new user data
         :return: the updated user
         """
-        user = self.get_by_id(id)
-        if not user:
-            raise ValidationException("User %s does not exist" % id)
+        with db_session() as db:
+            user = self.get_by_id(id)
+            if not user:
+                raise ValidationException("User %s does not exist" % id)
 
-        org = self.org_service.get_by_id(data.organization_id)
-        if not org:
-            raise ValidationException("Organization %s does not exist" % data.organization_id)
+            org = self.org_service.get_by_id(data.organization_id)
+            if not org:
+                raise ValidationException("Organization %s does not exist" % data.organization_id)
 
-        with db_session() as db:
             return UserDetailsDTO.from_model(self.repository.update(db, id, data))
 
     def delete(self, id: int) -> Any:
-        user = self.get_by_id(id)
-        if not user:
-            raise ValidationException("User %s does not exist" % id)
-
         with db_session() as db:
-            return self.repository.delete(db, id)
+            user = self.get_by_id(id)
+            if not user:
+                raise ValidationException("User %s does not exist" % id)
+
+            result = self.repository.delete(db, id)
+        self.permission_service.remove_user(id)
+        return result
 
     def add_roles(self, id: int, role_ids: List[int]) -> Optional[UserDetailsDTO]:
         """
@@ -95,20 +281,19 @@ class UserService:
         :param role_ids: List of role IDs to be added
         :return: The updated user
         """
-        user = self.get_by_id(id)
-        if not user:
-            raise ValidationException("User %s does not exist" % id)
-
-        roles = []
-        for role_id in role_ids:
-            role = self.role_service.get_by_id(role_id)
-            if not role:
-                raise ValidationException("Role %s does not exist" % role_id)
+        with db_session() as db:
+            user = self.get_by_id(id)
+            if not user:
+                raise ValidationException("User %s does not exist" % id)
 
-            roles.append(role.id)
+            existing = {i.id for i in self.role_service.get_by_ids(role_ids)}
+            for role_id in role_ids:
+                if role_id not in existing:
+                    raise ValidationException("Role %s does not exist" % role_id)
 
-        with db_session() as db:
-            return UserDetailsDTO.from_model(self.repository.add_roles(db, id, roles))
+            result = UserDetailsDTO.from_model(self.repository.add_roles(db, id, role_ids))
+        self.permission_service.set_user_roles(id, [i.id for i in result.roles])
+        return result
 
     def remove_roles(self, id: int, role_ids: List[int]) -> Optional[UserDetailsDTO]:
         """
@@ -118,17 +303,16 @@ class UserService:
         :param role_ids: List of role IDs to be removed
         :return: The updated user
         """
-        user = self.get_by_id(id)
-        if not user:
-            raise ValidationException("User %s does not exist" % id)
-
-        roles = []
-        for role_id in role_ids:
-            role = self.role_service.get_by_id(role_id)
-            if not role:
-                raise ValidationException("Role %s does not exist" % role_id)
+        with db_session() as db:
+            user = self.get_by_id(id)
+            if not user:
+                raise ValidationException("User %s does not exist" % id)
 
-            roles.append(role.id)
+            existing = {i.id for i in self.role_service.get_by_ids(role_ids)}
+            for role_id in role_ids:
+                if role_id not in existing:
+                    raise ValidationException("Role %s does not exist" % role_id)
 
-        with db_session() as db:
-            return UserDetailsDTO.from_model(self.repository.remove_roles(db, id, roles))
+            result = UserDetailsDTO.from_model(self.repository.remove_roles(db, id, role_ids))
+        self.permission_service.set_user_roles(id, [i.id for i in result.roles])
+        return result
@@ -1,4 +1,5 @@
-from typing import Any, Dict, Optional
+import os
+from typing import Any, Dict, List, Optional
 
 from pydantic import BaseSettings, PostgresDsn, validator
 
@@ -11,13 +12,51 @@ class Settings(BaseSettings):
     DB_PASSWORD: str
     DB_NAME: str
     SQLALCHEMY_DATABASE_URI: Optional[str] = None
+    # Connection pool, the size, overflow and timeout only apply to pools which queue connections
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 30
+    DB_POOL_RECYCLE: int = -1
+    DB_POOL_PRE_PING: bool = False
+    # Read replicas used by the read-only service methods, and how one is picked for each unit of work
+    SQLALCHEMY_REPLICA_URIS: List[str] = []
+    DB_REPLICA_SELECTION: str = "round_robin"
+    PAGE_SIZE_DEFAULT: int = 100
+    PAGE_SIZE_MAX: int = 1000
+    # Users, roles and rights returned by the search, each
+    SEARCH_LIMIT_DEFAULT: int = 20
+    SEARCH_LIMIT_MAX: int = 100
+    # Rows fetched from the DB, and sent to the client, at once by the exports
+    EXPORT_BATCH_SIZE: int = 1000
+    # Users validated and inserted in a single transaction by the bulk import
+    IMPORT_CHUNK_SIZE: int = 1000
+    # Number of threads running the (blocking) route handlers, None for the asyncio default
+    THREADPOOL_SIZE: Optional[int] = None
+    # Serve the reads of the rights, roles and organizations on the event loop, through an asyncio DB driver
+    # (asyncpg or aiosqlite), rather than with the blocking engine in the threadpool
+    DB_ASYNC: bool = False
+    # Entity cache of organizations, roles and rights, per cache and in seconds. 0 disables it
+    CACHE_MAX_SIZE: int = 1024
+    CACHE_TTL: float = 60
+    # Total size of the encoded role and right details kept by each response cache, 0 disables them
+    RESPONSE_CACHE_MAX_BYTES: int = 16 * 1024 * 1024
+    # Response compression, by preference: br (requires Brotli) and gzip. Smaller responses are not compressed
+    COMPRESSION_ENCODINGS: List[str] = ["br", "gzip"]
+    COMPRESSION_MINIMUM_SIZE: int = 1024
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 5
+    # Broadcast of the entity changes to the other workers: auto, postgres, socket or local (none)
+    INVALIDATION_BUS: str = "auto"
+    INVALIDATION_BUS_CHANNEL: str = "entity_changed"
+    INVALIDATION_BUS_SOCKET_DIR: str = "/tmp/fastapi-user-app-bus"
 
     @validator("SQLALCHEMY_DATABASE_URI", pre=True)
     def assemble_db_connection(cls, v: Optional[str], values: Dict[str, Any]) -> Any:
         if isinstance(v, str):
             return v
         if values.get("DB_SCHEME") == "sqlite":
-            return values.get("DB_SCHEME") + ":///./" + values.get('DB_NAME')
+            # Relative to the working directory, unless the name is an absolute path
+            return values.get("DB_SCHEME") + ":///" + os.path.join(".", values.get('DB_NAME'))
         else:
             return PostgresDsn.build(
                 scheme=values.get("DB_SCHEME"),
@@ -28,6 +67,24 @@ class Settings(BaseSettings):
                 path=f"/{values.get('DB_NAME') or ''}",
             )
 
+    @validator("DB_REPLICA_SELECTION")
+    def check_replica_selection(cls, v: str) -> str:
+        if v not in ("round_robin", "least_connections"):
+            raise ValueError("must be round_robin or least_connections")
+        return v
+
+    @validator("COMPRESSION_ENCODINGS")
+    def check_compression_encodings(cls, v: List[str]) -> List[str]:
+        if any(i not in ("br", "gzip") for i in v):
+            raise ValueError("must be br or gzip")
+        return v
+
+    @validator("INVALIDATION_BUS")
+    def check_invalidation_bus(cls, v: str) -> str:
+        if v not in ("auto", "postgres", "socket", "local"):
+            raise ValueError("must be auto, postgres, socket or local")
+        return v
+
     class Config:
         case_sensitive = True
 
@@ -0,0 +1,13 @@
+import pytest
+
+from app.cache import caches
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    """
+    Entity IDs are reused across tests, so no test may see the cached entities of another one.
+    """
+    yield
+    for cache in caches:
+        cache.clear()
@@ -3,9 +3,12 @@ from typing import Generator
 import pytest
 from fastapi.testclient import TestClient
 
+from app.cache import caches
 from app.db import models
 from app.db.database import SessionLocal, engine
 from app.main import app
+from app.services.permission import permission_index
+from app.tests.utils.utils import assert_queries
 
 reverse = app.router.url_path_for
 
@@ -23,3 +26,15 @@ def db_session():
     yield session
     session.close()
     models.Base.metadata.drop_all(bind=engine)
+    permission_index.reset()
+
+
+@pytest.fixture(scope="function")
+def query_budget():
+    """
+    Empties the caches, so the queries they would save are counted, and provides
+    assert_queries: with query_budget(2): client.get(...)
+    """
+    for i in caches:
+        i.clear()
+    return assert_queries
@@ -0,0 +1,143 @@
+from typing import Generator
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette import status
+
+from app.db.queries import record_queries
+from app.main import app
+from app.settings import settings
+from app.tests.integration.conftest import reverse
+from app.tests.utils.utils import save_random_organization, save_random_right, save_random_role, save_random_user, \
+    assert_queries
+
+
+@pytest.fixture(scope="module")
+def async_client() -> Generator:
+    """
+    Client of the application in the async DB mode, connected by the startup hook.
+    """
+    settings.DB_ASYNC = True
+    try:
+        with TestClient(app) as c:
+            yield c
+    finally:
+        settings.DB_ASYNC = False
+
+
+class TestAsyncReadsIntegration:
+
+    def test_get_all_rights(self, async_client: TestClient, db_session):
+        rights = [save_random_right() for _ in range(3)]
+
+        # Nothing goes through the blocking engine
+        with assert_queries(0), record_queries() as stats:
+            response = async_client.get(reverse("right-get-all"), params={"limit": 2})
+        result = response.json()
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [i['id'] for i in result['items']] == sorted(i.id for i in rights)[:2]
+        assert result['next_cursor'] == result['items'][-1]['id']
+        assert result['items'][0]['created_date_time'] is not None
+        assert stats.count == 1
+
+        response = async_client.get(reverse("right-get-all"), params={"after": result['next_cursor']})
+
+        assert [i['id'] for i in response.json()['items']] == sorted(i.id for i in rights)[2:]
+
+    def test_get_right_details(self, async_client: TestClient, db_session):
+        right = save_random_right()
+
+        url = reverse("right-get-details", id=right.id)
+        with record_queries() as stats:
+            response = async_client.get(url)
+        result = response.json()
+
+        assert response.status_code == status.HTTP_200_OK
+        assert result['name'] == right.name
+        assert result['description'] == right.description
+        # version + right
+        assert stats.count == 2
+
+        response = async_client.get(url, headers={"If-None-Match": response.headers['etag']})
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    def test_get_right_details_does_not_exist(self, async_client: TestClient, db_session):
+        response = async_client.get(reverse("right-get-details", id=-1))
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.json() == "Right -1 does not exist"
+
+    def test_get_role_details(self, async_client: TestClient, db_session):
+        rights = [save_random_right(), save_random_right()]
+        role = save_random_role(rights=rights)
+        save_random_role()
+
+        response = async_client.get(reverse("role-get-details", id=role.id))
+        result = response.json()
+
+        assert response.status_code == status.HTTP_200_OK
+        assert result['name'] == role.name
+        assert sorted(i['id'] for i in result['rights']) == sorted(i.id for i in rights)
+        assert len(async_client.get(reverse("role-get-all")).json()['items']) == 2
+
+    def test_get_role_details_same_etag_as_blocking(self, async_client: TestClient, db_session, monkeypatch):
+        role = save_random_role(rights=[save_random_right()])
+
+        url = reverse("role-get-details", id=role.id)
+        etag = async_client.get(url).headers['etag']
+        monkeypatch.setattr(settings, "DB_ASYNC", False)
+        response = async_client.get(url, headers={"If-None-Match": etag})
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    def test_get_role_details_does_not_exist(self, async_client: TestClient, db_session):
+        response = async_client.get(reverse("role-get-details", id=-1))
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.json() == "Role -1 does not exist"
+
+    def test_get_organization_details(self, async_client: TestClient, db_session):
+        org = save_random_organization()
+        users = [save_random_user(organization=org) for _ in range(2)]
+        save_random_user(organization=save_random_organization())
+
+        url = reverse("organization-get-details", id=org.id)
+        response = async_client.get(url)
+        result = response.json()
+
+        assert response.status_code == status.HTTP_200_OK
+        assert result['name'] == org.name
+        assert [i['id'] for i in result['users']] == sorted(i.id for i in users)
+        assert result['users'][0]['is_active'] is True
+        assert result['users_next_cursor'] is None
+
+        save_random_user(organization=org)
+        response = async_client.get(url, headers={"If-None-Match": response.headers['etag']})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.json()['users']) == 3
+
+    def test_get_organizations(self, async_client: TestClient, db_session):
+        org = save_random_organization()
+        save_random_organization()
+        users = [save_random_user(organization=org) for _ in range(3)]
+
+        response = async_client.get(reverse("organization-get-all"))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.json()['items']) == 2
+
+        response = async_client.get(reverse("organization-get-users", id=org.id), params={"limit": 2})
+        result = response.json()
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [i['id'] for i in result['items']] == sorted(i.id for i in users)[:2]
+        assert result['next_cursor'] == result['items'][-1]['id']
+
+    def test_get_organization_users_does_not_exist(self, async_client: TestClient, db_session):
+        response = async_client.get(reverse("organization-get-users", id=-1))
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.json() == "Organization -1 does not exist"
@@ -0,0 +1,63 @@
+from fastapi.testclient import TestClient
+from starlette import status
+
+from app.metrics import request_metrics
+from app.settings import settings
+from app.tests.integration.conftest import reverse
+from app.tests.utils.utils import save_random_organization
+
+
+class TestMonitoringIntegration:
+
+    def test_pool_status(self, client: TestClient, db_session):
+        org1 = save_random_organization()
+        client.get(reverse("organization-get-details", id=org1.id))
+
+        url = reverse("monitoring-pool")
+        response = client.get(url)
+        result = response.json()
+
+        assert response.status_code == status.HTTP_200_OK
+        assert result[0]['name'] == "primary"
+        assert result[0]['pool'] is not None
+        assert result[0]['checked_out'] >= 0
+        wait = result[0]['checkout_wait']
+        assert wait['count'] > 0
+        assert wait['buckets']['inf'] == wait['count']
+        assert wait['sum'] >= 0
+
+    def test_cache_stats(self, client: TestClient, db_session):
+        org1 = save_random_organization()
+        user = {"email": "user@example.com", "first_name": "First", "last_name": "Last", "organization_id": org1.id}
+        client.post(reverse("user-create"), json=user)
+        client.post(reverse("user-create"), json=dict(user, email="other@example.com"))
+
+        url = reverse("monitoring-cache")
+        response = client.get(url)
+        result = {i['name']: i for i in response.json()}
+
+        assert response.status_code == status.HTTP_200_OK
+        assert set(result) == {"organization", "role", "right", "role_details", "right_details"}
+        assert result["organization"]['hits'] >= 1
+        assert result["organization"]['misses'] >= 1
+        assert result["organization"]['size'] == 1
+        assert result["role_details"]['bytes'] == 0
+        assert result["role_details"]['maxbytes'] == settings.RESPONSE_CACHE_MAX_BYTES
+
+    def test_metrics(self, client: TestClient, db_session, monkeypatch):
+        monkeypatch.setattr(request_metrics, "routes", {})
+        org1 = save_random_organization()
+        client.get(reverse("organization-get-details", id=org1.id))
+
+        response = client.get(reverse("metrics"))
+        lines = response.text.splitlines()
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        labels = '{route="organization-get-details",method="GET"'
+        assert 'http_requests_total%s,status="200"} 1' % labels in lines
+        assert 'http_request_duration_seconds_count%s} 1' % labels in lines
+        assert 'http_request_db_queries_bucket%s,le="0"} 0' % labels in lines
+        assert 'http_request_db_queries_count%s} 1' % labels in lines
+        assert any(i.startswith('db_pool_checked_out{pool="primary"} ') for i in lines)
+        assert any(i.startswith('cache_misses_total{cache="organization"} ') for i in lines)
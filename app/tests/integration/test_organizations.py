@@ -3,8 +3,9 @@ from starlette import status
 
 from app.db.models import Organization
 from app.schemas.organization import OrganizationCreateDTO, OrganizationUpdateDTO
+from app.settings import settings
 from app.tests.integration.conftest import reverse
-from app.tests.utils.utils import save_random_organization
+from app.tests.utils.utils import save_random_organization, save_random_user
 
 
 class TestOrganizationOrganization:
@@ -18,8 +19,9 @@ class TestOrganizationOrganization:
         result = response.json()
 
         assert response.status_code == status.HTTP_200_OK
-        assert len(result) == 2
-        for element in result:
+        assert len(result['items']) == 2
+        assert result['next_cursor'] is None
+        for element in result['items']:
             assert element['id'] is not None
             assert element['name'] is not None
 
@@ -34,12 +36,67 @@ class TestOrganizationOrganization:
         assert result['id'] == org1.id
         assert result['name'] == org1.name
 
+    def test_get_details_users_first_page(self, client: TestClient, db_session, monkeypatch):
+        monkeypatch.setattr(settings, "PAGE_SIZE_DEFAULT", 2)
+        org1 = save_random_organization()
+        users = sorted([save_random_user(organization=org1) for _ in range(3)], key=lambda i: i.id)
+
+        url = reverse("organization-get-details", id=org1.id)
+        response = client.get(url)
+        result = response.json()
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [i['id'] for i in result['users']] == [users[0].id, users[1].id]
+        assert result['users_next_cursor'] == users[1].id
+
+    def test_get_users(self, client: TestClient, db_session):
+        org1 = save_random_organization()
+        org2 = save_random_organization()
+        users = sorted([save_random_user(organization=org1) for _ in range(3)], key=lambda i: i.id)
+        save_random_user(organization=org2)
+
+        url = reverse("organization-get-users", id=org1.id)
+        response = client.get(url, params={"limit": 2, "after": users[0].id})
+        result = response.json()
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [i['id'] for i in result['items']] == [users[1].id, users[2].id]
+        assert result['next_cursor'] is None
+
+    def test_get_users_does_not_exist(self, client: TestClient, db_session):
+        url = reverse("organization-get-users", id=1)
+        response = client.get(url)
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
     def test_get_details_does_not_exist(self, client: TestClient, db_session):
         url = reverse("organization-get-details", id=1)
         response = client.get(url)
 
         assert response.status_code == status.HTTP_400_BAD_REQUEST
 
+    def test_get_details_not_modified(self, client: TestClient, db_session):
+        org1 = save_random_organization()
+
+        url = reverse("organization-get-details", id=org1.id)
+        etag = client.get(url).headers['etag']
+        response = client.get(url, headers={"If-None-Match": etag})
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+        save_random_user(organization=org1)
+        response = client.get(url, headers={"If-None-Match": etag})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.json()['users']) == 1
+        etag = response.headers['etag']
+
+        client.put(reverse("organization-update", id=org1.id), json={"name": "name"})
+        response = client.get(url, headers={"If-None-Match": etag})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()['name'] == "name"
+
     def test_delete(self, client: TestClient, db_session):
         org1 = save_random_organization()
 
@@ -0,0 +1,51 @@
+from fastapi.testclient import TestClient
+from starlette import status
+
+from app.tests.integration.conftest import reverse
+from app.tests.utils.utils import save_random_user, save_random_organization, save_random_role, save_random_right
+
+
+class TestPermissionIntegration:
+
+    def test_check(self, client: TestClient, db_session):
+        right1 = save_random_right()
+        right2 = save_random_right()
+        role1 = save_random_role(rights=[right1])
+        org1 = save_random_organization()
+        user1 = save_random_user(organization=org1, roles=[role1])
+        user2 = save_random_user(organization=org1)
+
+        url = reverse("permission-check")
+        checks = [{"user_id": user1.id, "right_id": right1.id},
+                  {"user_id": user1.id, "right_id": right2.id},
+                  {"user_id": user2.id, "right_id": right1.id}]
+        response = client.post(url, json=checks)
+        result = response.json()
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [i['allowed'] for i in result] == [True, False, False]
+        assert [(i['user_id'], i['right_id']) for i in result] == [(i['user_id'], i['right_id']) for i in checks]
+
+    def test_check_after_assignments(self, client: TestClient, db_session):
+        right1 = save_random_right()
+        right2 = save_random_right()
+        role1 = save_random_role(rights=[right1])
+        org1 = save_random_organization()
+        user1 = save_random_user(organization=org1)
+
+        url = reverse("permission-check")
+        checks = [{"user_id": user1.id, "right_id": right1.id},
+                  {"user_id": user1.id, "right_id": right2.id}]
+        assert [i['allowed'] for i in client.post(url, json=checks).json()] == [False, False]
+
+        client.put(reverse("user-add-roles", id=user1.id), json=[role1.id])
+        assert [i['allowed'] for i in client.post(url, json=checks).json()] == [True, False]
+
+        client.put(reverse("role-add-rights", id=role1.id), json=[right2.id])
+        assert [i['allowed'] for i in client.post(url, json=checks).json()] == [True, True]
+
+        client.delete(reverse("role-remove-rights", id=role1.id), json=[right1.id])
+        assert [i['allowed'] for i in client.post(url, json=checks).json()] == [False, True]
+
+        client.delete(reverse("user-remove-roles", id=user1.id), json=[role1.id])
+        assert [i['allowed'] for i in client.post(url, json=checks).json()] == [False, False]
@@ -0,0 +1,124 @@
+import json
+from typing import Callable, Dict, List, NamedTuple, Tuple
+
+import pytest
+from fastapi.routing import APIRoute
+from fastapi.testclient import TestClient
+from requests import Response
+from starlette import status
+
+from app.db.models import Organization, Right, Role, User
+from app.main import app
+from app.tests.integration.conftest import reverse
+from app.tests.utils.utils import save_random_organization, save_random_right, save_random_role, save_random_user
+
+
+class Dataset(NamedTuple):
+    organizations: List[Organization]
+    users: List[User]
+    roles: List[Role]
+    rights: List[Right]
+
+
+def save_dataset() -> Dataset:
+    """
+    Several rows of each entity, and of each relationship, so that a query per row exceeds the budgets.
+    """
+    rights = [save_random_right() for _ in range(3)]
+    roles = [save_random_role(rights=rights[:2]), save_random_role(rights=rights[1:]), save_random_role()]
+    organizations = [save_random_organization() for _ in range(2)] + [save_random_organization()]
+    users = [save_random_user(organization=organizations[i % 2], roles=roles[:2]) for i in range(3)]
+    return Dataset(organizations, users, roles, rights)
+
+
+def new_user(data: Dataset, email: str) -> Dict:
+    return {"email": email, "first_name": "First", "last_name": "Last", "organization_id": data.organizations[0].id}
+
+
+# Requests sent to each route, and their query budget, with the statements it covers
+BUDGETS: Dict[str, Tuple[int, Callable[[TestClient, Dataset], Response]]] = {
+    "home": (0, lambda client, data: client.get(reverse("home"), allow_redirects=False)),
+    # users page
+    "user-get-all": (1, lambda client, data: client.get(reverse("user-get-all"))),
+    # a single batch of users
+    "user-export": (1, lambda client, data: client.get(reverse("user-export"))),
+    # version + user joined with its organization + roles
+    "user-get-details": (3, lambda client, data: client.get(reverse("user-get-details", id=data.users[0].id))),
+    # user + rights page
+    "user-get-rights": (2, lambda client, data: client.get(reverse("user-get-rights", id=data.users[0].id))),
+    # user, loaded twice + its role assignments and their roles + two executemany deleting the assignments, as
+    # secondary rows and as association objects + user, whatever the number of roles
+    "user-delete": (7, lambda client, data: client.delete(reverse("user-delete", id=data.users[0].id))),
+    "user-create": (5, lambda client, data: client.post(reverse("user-create"), json=new_user(data, "new@example.com"))),
+    # existing emails + organizations + a single insert of the chunk
+    "user-bulk-import": (3, lambda client, data: client.post(reverse("user-bulk-import"), data="".join(
+        json.dumps(new_user(data, "new%s@example.com" % i)) + "\n" for i in range(3)))),
+    "user-update": (6, lambda client, data: client.put(reverse("user-update", id=data.users[0].id), json={
+        "first_name": "Updated", "organization_id": data.organizations[1].id})),
+    # user + roles + already assigned ones + insert + version + updated user with its roles
+    "user-add-roles": (7, lambda client, data: client.put(
+        reverse("user-add-roles", id=data.users[0].id), json=[i.id for i in data.roles])),
+    "user-remove-roles": (6, lambda client, data: client.delete(
+        reverse("user-remove-roles", id=data.users[0].id), json=[i.id for i in data.roles[:2]])),
+    "organization-get-all": (1, lambda client, data: client.get(reverse("organization-get-all"))),
+    # version + users version + organization + users page
+    "organization-get-details": (4, lambda client, data: client.get(
+        reverse("organization-get-details", id=data.organizations[0].id))),
+    "organization-get-users": (2, lambda client, data: client.get(
+        reverse("organization-get-users", id=data.organizations[0].id))),
+    "organization-delete": (4, lambda client, data: client.delete(
+        reverse("organization-delete", id=data.organizations[2].id))),
+    "organization-create": (2, lambda client, data: client.post(reverse("organization-create"), json={"name": "New"})),
+    "organization-update": (5, lambda client, data: client.put(
+        reverse("organization-update", id=data.organizations[0].id), json={"name": "Updated"})),
+    "role-get-all": (1, lambda client, data: client.get(reverse("role-get-all"))),
+    # version + role + rights
+    "role-get-details": (3, lambda client, data: client.get(reverse("role-get-details", id=data.roles[0].id))),
+    # role, loaded twice + its right and user assignments, with their rights and users + two executemany deleting the
+    # assignments of each table, as secondary rows and as association objects + role, whatever the number of rows
+    "role-delete": (11, lambda client, data: client.delete(reverse("role-delete", id=data.roles[0].id))),
+    "role-create": (4, lambda client, data: client.post(reverse("role-create"), json={"name": "New"})),
+    "role-create-batch": (3, lambda client, data: client.post(reverse("role-create-batch"), json=[
+        {"name": "New %s" % i} for i in range(3)])),
+    "role-update": (6, lambda client, data: client.put(reverse("role-update", id=data.roles[0].id), json={
+        "name": "Updated", "description": "Updated"})),
+    "role-add-rights": (7, lambda client, data: client.put(
+        reverse("role-add-rights", id=data.roles[2].id), json=[i.id for i in data.rights])),
+    "role-remove-rights": (6, lambda client, data: client.delete(
+        reverse("role-remove-rights", id=data.roles[0].id), json=[i.id for i in data.rights[:2]])),
+    "right-get-all": (1, lambda client, data: client.get(reverse("right-get-all"))),
+    "right-get-details": (2, lambda client, data: client.get(reverse("right-get-details", id=data.rights[0].id))),
+    "right-delete": (7, lambda client, data: client.delete(reverse("right-delete", id=data.rights[0].id))),
+    "right-create": (2, lambda client, data: client.post(reverse("right-create"), json={"name": "New"})),
+    "right-create-batch": (3, lambda client, data: client.post(reverse("right-create-batch"), json=[
+        {"name": "New %s" % i} for i in range(3)])),
+    "right-update": (4, lambda client, data: client.put(reverse("right-update", id=data.rights[0].id), json={
+        "name": "Updated", "description": "Updated"})),
+    # index of the rights of each user, built from all the assignments
+    "permission-check": (2, lambda client, data: client.post(reverse("permission-check"), json=[
+        {"user_id": i.id, "right_id": j.id} for i in data.users for j in data.rights])),
+    # users + roles + rights
+    "search": (3, lambda client, data: client.get(reverse("search"), params={"q": "First"})),
+    # in-memory metrics
+    "monitoring-pool": (0, lambda client, data: client.get(reverse("monitoring-pool"))),
+    "monitoring-cache": (0, lambda client, data: client.get(reverse("monitoring-cache"))),
+    "metrics": (0, lambda client, data: client.get(reverse("metrics"))),
+}
+
+
+class TestQueryBudgets:
+
+    def test_every_route_has_a_budget(self):
+        routes = {i.name for i in app.routes if isinstance(i, APIRoute)}
+
+        assert routes == set(BUDGETS)
+
+    @pytest.mark.parametrize("route", sorted(BUDGETS))
+    def test_budget(self, client: TestClient, db_session, query_budget, route):
+        budget, request = BUDGETS[route]
+        data = save_dataset()
+
+        with query_budget(budget):
+            response = request(client, data)
+
+        assert response.status_code in (status.HTTP_200_OK, status.HTTP_307_TEMPORARY_REDIRECT), response.text
@@ -2,9 +2,10 @@ from fastapi.testclient import TestClient
 from starlette import status
 
 from app.db.models import Right
+from app.repositories.right import RightRepository
 from app.schemas.right import RightCreateDTO, RightUpdateDTO
 from app.tests.integration.conftest import reverse
-from app.tests.utils.utils import save_random_right
+from app.tests.utils.utils import save_random_right, count_queries
 
 
 class TestRightIntegration:
@@ -18,8 +19,9 @@ class TestRightIntegration:
         result = response.json()
 
         assert response.status_code == status.HTTP_200_OK
-        assert len(result) == 2
-        for element in result:
+        assert len(result['items']) == 2
+        assert result['next_cursor'] is None
+        for element in result['items']:
             assert element['id'] is not None
             assert element['name'] is not None
             assert element['description'] is not None
@@ -38,12 +40,43 @@ class TestRightIntegration:
         assert result['description'] == right1.description
         assert result['created_date_time'] is not None
 
+    def test_get_details_cached(self, client: TestClient, db_session):
+        right1 = save_random_right()
+
+        url = reverse("right-get-details", id=right1.id)
+        body = client.get(url).content
+        with count_queries() as statements:
+            response = client.get(url)
+
+        assert response.content == body
+        # version only
+        assert len(statements) == 1
+
+        client.put(reverse("right-update", id=right1.id), json={"name": "name", "description": "description"})
+
+        assert client.get(url).json()['name'] == "name"
+
     def test_get_details_does_not_exist(self, client: TestClient, db_session):
         url = reverse("right-get-details", id=1)
         response = client.get(url)
 
         assert response.status_code == status.HTTP_400_BAD_REQUEST
 
+    def test_get_details_not_modified(self, client: TestClient, db_session):
+        right1 = save_random_right()
+
+        url = reverse("right-get-details", id=right1.id)
+        etag = client.get(url).headers['etag']
+        response = client.get(url, headers={"If-None-Match": etag})
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+        client.put(reverse("right-update", id=right1.id), json={"name": "name", "description": "description"})
+        response = client.get(url, headers={"If-None-Match": etag})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()['name'] == "name"
+
     def test_delete(self, client: TestClient, db_session):
         right1 = save_random_right()
 
@@ -87,6 +120,73 @@ class TestRightIntegration:
 
         assert response.status_code == status.HTTP_400_BAD_REQUEST
 
+    def test_create_batch(self, client: TestClient, db_session):
+        data = [{"name": "right%s" % i, "description": "description"} for i in range(10)]
+
+        url = reverse("right-create-batch")
+        with count_queries() as statements:
+            response = client.post(url, json=data)
+        result = response.json()
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [i['name'] for i in result] == [i['name'] for i in data]
+        assert all(i['id'] is not None for i in result)
+        # name check + insert + created rights, whatever the number of rights
+        assert len(statements) == 3
+        assert db_session.query(Right).count() == 10
+
+    def test_create_batch_name_exists(self, client: TestClient, db_session):
+        right1 = save_random_right()
+
+        url = reverse("right-create-batch")
+        response = client.post(url, json=[{"name": "new"}, {"name": right1.name}])
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert right1.name in response.json()
+        assert db_session.query(Right).count() == 1
+
+    def test_create_batch_duplicated(self, client: TestClient, db_session):
+        url = reverse("right-create-batch")
+        response = client.post(url, json=[{"name": "new"}, {"name": "new"}])
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_create_batch_upsert(self, client: TestClient, db_session):
+        right1 = save_random_right()
+        right2 = save_random_right()
+
+        url = reverse("right-create-batch")
+        data = [{"name": right1.name, "description": "updated"},
+                {"name": right2.name, "description": right2.description},
+                {"name": "new", "description": "new"}]
+        response = client.post(url, params={"upsert": True}, json=data)
+        result = response.json()
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [i['id'] for i in result[:2]] == [right1.id, right2.id]
+        assert result[0]['description'] == "updated"
+        assert result[0]['modified_date_time'] is not None
+        assert result[1]['modified_date_time'] is None
+        assert result[2]['name'] == "new"
+
+        response = client.get(reverse("right-get-details", id=right1.id))
+        assert response.json()['description'] == "updated"
+
+    def test_create_batch_name_created_meanwhile(self, client: TestClient, db_session, mocker):
+        right1 = save_random_right(description="original")
+        # Created by another request after the names were checked
+        get_by_names = RightRepository.get_by_names
+        mocker.patch.object(RightRepository, 'get_by_names', autospec=True,
+                            side_effect=[[], get_by_names(RightRepository(), db_session, [right1.name, "new"])])
+
+        response = client.post(reverse("right-create-batch"), json=[
+            {"name": right1.name, "description": "updated"}, {"name": "new"}])
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.json() == "Rights already exist with the names: %s" % right1.name
+        assert db_session.query(Right.description).filter(Right.id == right1.id).scalar() == "original"
+        assert db_session.query(Right).filter(Right.name == "new").count() == 0
+
     def test_update(self, client: TestClient, db_session):
         right = save_random_right()
 
@@ -4,7 +4,7 @@ from starlette import status
 from app.db.models import Role
 from app.schemas.role import RoleCreateDTO, RoleUpdateDTO
 from app.tests.integration.conftest import reverse
-from app.tests.utils.utils import save_random_role, save_random_right
+from app.tests.utils.utils import save_random_role, save_random_right, count_queries
 
 
 class TestRoleIntegration:
@@ -18,8 +18,9 @@ class TestRoleIntegration:
         result = response.json()
 
         assert response.status_code == status.HTTP_200_OK
-        assert len(result) == 2
-        for element in result:
+        assert len(result['items']) == 2
+        assert result['next_cursor'] is None
+        for element in result['items']:
             assert element['id'] is not None
             assert element['name'] is not None
             assert element['description'] is not None
@@ -38,12 +39,90 @@ class TestRoleIntegration:
         assert result['description'] == role1.description
         assert result['created_date_time'] is not None
 
+    def test_get_details_query_count(self, client: TestClient, db_session):
+        role1 = save_random_role(rights=[save_random_right(), save_random_right()])
+
+        url = reverse("role-get-details", id=role1.id)
+        with count_queries() as statements:
+            response = client.get(url)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.json()['rights']) == 2
+        # version + role + rights
+        assert len(statements) == 3
+
+    def test_get_details_cached(self, client: TestClient, db_session):
+        role1 = save_random_role(rights=[save_random_right()])
+
+        url = reverse("role-get-details", id=role1.id)
+        body = client.get(url).content
+        with count_queries() as statements:
+            response = client.get(url)
+
+        assert response.content == body
+        # version only
+        assert len(statements) == 1
+
+        client.put(reverse("role-update", id=role1.id), json={"name": "name", "description": "description"})
+
+        assert client.get(url).json()['name'] == "name"
+
     def test_get_details_does_not_exist(self, client: TestClient, db_session):
         url = reverse("role-get-details", id=1)
         response = client.get(url)
 
         assert response.status_code == status.HTTP_400_BAD_REQUEST
 
+    def test_get_details_not_modified(self, client: TestClient, db_session):
+        right1 = save_random_right()
+        role1 = save_random_role(rights=[right1])
+
+        url = reverse("role-get-details", id=role1.id)
+        etag = client.get(url).headers['etag']
+        with count_queries() as statements:
+            response = client.get(url, headers={"If-None-Match": etag})
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response.headers['etag'] == etag
+        # version only
+        assert len(statements) == 1
+
+        client.put(reverse("right-update", id=right1.id), json={"name": "name", "description": "description"})
+        response = client.get(url, headers={"If-None-Match": etag})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers['etag'] != etag
+        assert response.json()['rights'][0]['name'] == "name"
+
+    def test_get_details_modified_by_rights(self, client: TestClient, db_session):
+        role1 = save_random_role()
+        right1 = save_random_right()
+
+        url = reverse("role-get-details", id=role1.id)
+        etag = client.get(url).headers['etag']
+        client.put(reverse("role-add-rights", id=role1.id), json=[right1.id])
+        response = client.get(url, headers={"If-None-Match": etag})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.json()['rights']) == 1
+
+    def test_create_batch(self, client: TestClient, db_session):
+        role1 = save_random_role()
+
+        url = reverse("role-create-batch")
+        data = [{"name": role1.name, "description": "updated"}, {"name": "new", "description": "new"}]
+        response = client.post(url, json=data)
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+        response = client.post(url, params={"upsert": True}, json=data)
+        result = response.json()
+
+        assert response.status_code == status.HTTP_200_OK
+        assert result[0]['id'] == role1.id
+        assert result[0]['description'] == "updated"
+        assert result[1]['name'] == "new"
+
     def test_delete(self, client: TestClient, db_session):
         role1 = save_random_role()
 
@@ -0,0 +1,93 @@
+import sqlite3
+
+from fastapi.testclient import TestClient
+from sqlalchemy import Column, Integer, MetaData, String, Table, create_engine
+from starlette import status
+
+from app.db.models import User
+from app.db.search import add_search_indexes
+from app.tests.integration.conftest import reverse
+from app.tests.utils.utils import save_random_organization, save_random_role, save_random_right
+
+
+def save_user(db_session, first_name: str, last_name: str, email: str) -> User:
+    user = User(first_name=first_name, last_name=last_name, email=email, organization=save_random_organization())
+    db_session.add(user)
+    db_session.commit()
+    return user
+
+
+class TestSearchIntegration:
+
+    def test_search(self, client: TestClient, db_session):
+        user1 = save_user(db_session, "John", "Smith", "john@example.com")
+        user2 = save_user(db_session, "Bob", "Jones", "bob@smithsonian.org")
+        save_user(db_session, "Jane", "Doe", "jane@example.com")
+        role1 = save_random_role(name="user-admin")
+        right1 = save_random_right(name="admin-read")
+
+        response = client.get(reverse("search"), params={"q": "smith"})
+        result = response.json()
+
+        assert response.status_code == status.HTTP_200_OK
+        assert sorted(i["id"] for i in result["users"]) == sorted([user1.id, user2.id])
+        assert result["roles"] == []
+        assert result["rights"] == []
+
+        result = client.get(reverse("search"), params={"q": "ADMIN"}).json()
+
+        assert result["users"] == []
+        assert [i["id"] for i in result["roles"]] == [role1.id]
+        assert [i["id"] for i in result["rights"]] == [right1.id]
+
+    def test_search_ranks_and_limits(self, client: TestClient, db_session):
+        user1 = save_user(db_session, "John", "Smith", "john@example.com")
+        save_user(db_session, "Jane", "Doe", "jane@example.com")
+
+        result = client.get(reverse("search"), params={"q": "smitt"}).json()
+
+        assert [i["id"] for i in result["users"]] == [user1.id]
+
+        result = client.get(reverse("search"), params={"q": "example", "limit": 1}).json()
+
+        assert len(result["users"]) == 1
+
+    def test_search_follows_updates(self, client: TestClient, db_session):
+        user1 = save_user(db_session, "John", "Smith", "john@example.com")
+
+        data = {"first_name": "Johnny", "last_name": "Walker", "organization_id": user1.organization_id}
+        assert client.put(reverse("user-update", id=user1.id), json=data).status_code == status.HTTP_200_OK
+
+        assert client.get(reverse("search"), params={"q": "smith"}).json()["users"] == []
+        assert [i["id"] for i in client.get(reverse("search"), params={"q": "walker"}).json()["users"]] == [user1.id]
+
+        client.delete(reverse("user-delete", id=user1.id))
+
+        assert client.get(reverse("search"), params={"q": "walker"}).json()["users"] == []
+
+    def test_search_query_too_short(self, client: TestClient, db_session):
+        response = client.get(reverse("search"), params={"q": "ab"})
+
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    def test_search_without_trigram_tokenizer(self, client: TestClient, db_session, monkeypatch):
+        monkeypatch.setattr(sqlite3, "sqlite_version_info", (3, 31, 1))
+        user1 = save_user(db_session, "John", "Smith", "john@example.com")
+        user2 = save_user(db_session, "Bob", "Jones", "bob@smithsonian.org")
+
+        result = client.get(reverse("search"), params={"q": "SMITH"}).json()
+
+        assert [i["id"] for i in result["users"]] == sorted([user1.id, user2.id])
+        # No typo tolerance
+        assert client.get(reverse("search"), params={"q": "smitt"}).json()["users"] == []
+
+    def test_full_text_table_requires_trigram_tokenizer(self, monkeypatch):
+        monkeypatch.setattr(sqlite3, "sqlite_version_info", (3, 31, 1))
+        metadata = MetaData()
+        add_search_indexes(Table("item", metadata, Column("id", Integer, primary_key=True), Column("name", String)),
+                           ["name"])
+        engine = create_engine("sqlite://")
+
+        metadata.create_all(bind=engine)
+
+        assert engine.table_names() == ["item"]
@@ -1,10 +1,18 @@
+import csv
+import io
+import json
+
 from fastapi.testclient import TestClient
+from sqlalchemy import event
 from starlette import status
 
+from app.db.database import engine
 from app.db.models import User
 from app.schemas.user import UserCreateDTO, UserUpdateDTO
+from app.settings import settings
 from app.tests.integration.conftest import reverse
-from app.tests.utils.utils import save_random_user, save_random_organization, save_random_role
+from app.tests.utils.utils import save_random_user, save_random_organization, save_random_role, save_random_right, \
+    count_queries
 
 
 class TestUserIntegration:
@@ -19,8 +27,9 @@ class TestUserIntegration:
         result = response.json()
 
         assert response.status_code == status.HTTP_200_OK
-        assert len(result) == 2
-        for element in result:
+        assert len(result['items']) == 2
+        assert result['next_cursor'] is None
+        for element in result['items']:
             assert element['id'] is not None
             assert element['email'] is not None
             assert element['first_name'] is not None
@@ -28,6 +37,128 @@ class TestUserIntegration:
             assert element['is_admin'] is not None
             assert element['is_active'] is not None
 
+    def test_get_all_compressed(self, client: TestClient, db_session):
+        org1 = save_random_organization()
+        for _ in range(20):
+            save_random_user(organization=org1)
+
+        url = reverse("user-get-all")
+        response = client.get(url, headers={"Accept-Encoding": "gzip"})
+
+        assert response.headers['content-encoding'] == "gzip"
+        assert len(response.json()['items']) == 20
+
+        response = client.get(url, headers={"Accept-Encoding": "identity"})
+
+        assert 'content-encoding' not in response.headers
+        assert len(response.json()['items']) == 20
+
+    def test_get_all_paginated(self, client: TestClient, db_session):
+        org1 = save_random_organization()
+        users = sorted([save_random_user(organization=org1) for _ in range(3)], key=lambda i: i.id)
+
+        url = reverse("user-get-all")
+        response = client.get(url, params={"limit": 2})
+        result = response.json()
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [i['id'] for i in result['items']] == [users[0].id, users[1].id]
+        assert result['next_cursor'] == users[1].id
+
+        response = client.get(url, params={"limit": 2, "after": result['next_cursor']})
+        result = response.json()
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [i['id'] for i in result['items']] == [users[2].id]
+        assert result['next_cursor'] is None
+
+    def test_get_all_sorted_by_email(self, client: TestClient, db_session):
+        org1 = save_random_organization()
+        users = sorted([save_random_user(organization=org1) for _ in range(5)], key=lambda i: i.email)
+
+        url = reverse("user-get-all")
+        emails = []
+        after = None
+        while True:
+            params = {"sort": "email", "limit": 2}
+            if after is not None:
+                params["after"] = after
+            result = client.get(url, params=params).json()
+            emails.extend(i['email'] for i in result['items'])
+            after = result['next_cursor']
+            if after is None:
+                break
+
+        assert emails == [i.email for i in users]
+
+    def test_get_all_sorted_by_email_after_deleted_user(self, client: TestClient, db_session):
+        org1 = save_random_organization()
+        users = sorted([save_random_user(organization=org1) for _ in range(3)], key=lambda i: i.email)
+        url = reverse("user-get-all")
+
+        response = client.get(url, params={"sort": "email", "after": users[-1].id})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()['items'] == []
+
+        client.delete(reverse("user-delete", id=users[0].id))
+        response = client.get(url, params={"sort": "email", "after": users[0].id})
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_get_all_filtered(self, client: TestClient, db_session):
+        org1 = save_random_organization()
+        org2 = save_random_organization()
+        role1 = save_random_role()
+        user1 = save_random_user(organization=org1, roles=[role1])
+        user2 = save_random_user(organization=org1, is_admin=True)
+        user3 = save_random_user(organization=org2, roles=[role1])
+
+        url = reverse("user-get-all")
+
+        def ids(**params):
+            return [i['id'] for i in client.get(url, params=params).json()['items']]
+
+        assert ids(organization_id=org1.id) == sorted([user1.id, user2.id])
+        assert ids(is_admin=True) == [user2.id]
+        assert ids(is_active=False) == []
+        assert ids(role_id=role1.id) == sorted([user1.id, user3.id])
+        assert ids(role_id=role1.id, organization_id=org2.id) == [user3.id]
+        assert ids(email=user1.email[:10]) == [user1.id]
+        assert ids(email=user1.email[:10].upper()) == []
+        assert ids(email="%") == []
+        assert ids(name="First") == sorted([user1.id, user2.id, user3.id])
+        assert ids(name="Last") == sorted([user1.id, user2.id, user3.id])
+        assert ids(name="Other") == []
+
+    def test_get_all_fields(self, client: TestClient, db_session):
+        org1 = save_random_organization()
+        user1 = save_random_user(organization=org1)
+
+        with count_queries() as statements:
+            response = client.get(reverse("user-get-all"), params={"fields": "email"})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()['items'] == [{"id": user1.id, "email": user1.email}]
+        assert len(statements) == 1
+        assert "first_name" not in statements[0]
+
+    def test_get_all_unknown_field(self, client: TestClient, db_session):
+        response = client.get(reverse("user-get-all"), params={"fields": "id,organization"})
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_get_all_invalid_sort(self, client: TestClient, db_session):
+        response = client.get(reverse("user-get-all"), params={"sort": "first_name"})
+
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    def test_get_all_limit_too_large(self, client: TestClient, db_session):
+        url = reverse("user-get-all")
+        response = client.get(url, params={"limit": settings.PAGE_SIZE_MAX + 1})
+
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
     def test_get_details(self, client: TestClient, db_session):
         org = save_random_organization()
         user1 = save_random_user(organization=org)
@@ -45,12 +176,223 @@ class TestUserIntegration:
         assert result['is_active'] == user1.is_active
         assert result['organization']['id'] == user1.organization.id
 
+    def test_get_details_query_count(self, client: TestClient, db_session):
+        org = save_random_organization()
+        user1 = save_random_user(organization=org, roles=[save_random_role(), save_random_role()])
+
+        url = reverse("user-get-details", id=user1.id)
+        with count_queries() as statements:
+            response = client.get(url)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.json()['roles']) == 2
+        # version + user joined with its organization + roles
+        assert len(statements) == 3
+
+    def test_get_details_fields(self, client: TestClient, db_session):
+        org = save_random_organization()
+        user1 = save_random_user(organization=org, roles=[save_random_role()])
+
+        url = reverse("user-get-details", id=user1.id)
+        with count_queries() as statements:
+            response = client.get(url, params={"fields": "email,organization.name"})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json() == {"id": user1.id, "email": user1.email,
+                                   "organization": {"id": org.id, "name": org.name}}
+        # version + user joined with its organization, the roles are not loaded
+        assert len(statements) == 2
+
+        response = client.get(url, params={"fields": "roles"})
+
+        assert [i['id'] for i in response.json()['roles']] == [user1.roles[0].id]
+        assert 'organization' not in response.json()
+
+    def test_get_details_fields_etag(self, client: TestClient, db_session):
+        user1 = save_random_user(organization=save_random_organization())
+
+        url = reverse("user-get-details", id=user1.id)
+        etag = client.get(url, params={"fields": "email"}).headers['etag']
+
+        assert client.get(url, params={"fields": "email"}, headers={"If-None-Match": etag}).status_code == \
+            status.HTTP_304_NOT_MODIFIED
+        assert client.get(url, headers={"If-None-Match": etag}).status_code == status.HTTP_200_OK
+
     def test_get_details_does_not_exist(self, client: TestClient, db_session):
         url = reverse("user-get-details", id=1)
         response = client.get(url)
 
         assert response.status_code == status.HTTP_400_BAD_REQUEST
 
+    def test_get_details_not_modified(self, client: TestClient, db_session):
+        org1 = save_random_organization()
+        role1 = save_random_role()
+        user1 = save_random_user(organization=org1, roles=[role1])
+
+        url = reverse("user-get-details", id=user1.id)
+        etag = client.get(url).headers['etag']
+        response = client.get(url, headers={"If-None-Match": 'W/"other", ' + etag})
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+        client.put(reverse("role-update", id=role1.id), json={"name": "name", "description": "description"})
+        response = client.get(url, headers={"If-None-Match": etag})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()['roles'][0]['name'] == "name"
+        etag = response.headers['etag']
+
+        client.put(reverse("organization-update", id=org1.id), json={"name": "name"})
+        response = client.get(url, headers={"If-None-Match": etag})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()['organization']['name'] == "name"
+        etag = response.headers['etag']
+
+        client.delete(reverse("user-remove-roles", id=user1.id), json=[role1.id])
+        response = client.get(url, headers={"If-None-Match": etag})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()['roles'] == []
+
+    def test_export_ndjson(self, client: TestClient, db_session, monkeypatch):
+        monkeypatch.setattr(settings, "EXPORT_BATCH_SIZE", 2)
+        org1 = save_random_organization()
+        users = sorted([save_random_user(organization=org1) for _ in range(3)], key=lambda i: i.id)
+
+        response = client.get(reverse("user-export"))
+        result = [json.loads(i) for i in response.text.splitlines()]
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers['content-type'] == "application/x-ndjson"
+        assert [i['id'] for i in result] == [i.id for i in users]
+        assert result[0]['email'] == users[0].email
+        assert result[0]['organization_id'] == org1.id
+
+    def test_export_csv_filtered(self, client: TestClient, db_session):
+        org1 = save_random_organization()
+        org2 = save_random_organization()
+        user1 = save_random_user(organization=org1)
+        save_random_user(organization=org2)
+
+        response = client.get(reverse("user-export"), params={"format": "csv", "organization_id": org1.id,
+                                                              "is_active": True})
+        result = list(csv.DictReader(io.StringIO(response.text)))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers['content-type'].startswith("text/csv")
+        assert [int(i['id']) for i in result] == [user1.id]
+        assert result[0]['email'] == user1.email
+
+        response = client.get(reverse("user-export"), params={"format": "csv", "is_active": False})
+        assert response.text.splitlines() == ["id,email,first_name,last_name,is_active,is_admin,organization_id"]
+
+    def test_export_invalid_format(self, client: TestClient, db_session):
+        response = client.get(reverse("user-export"), params={"format": "xml"})
+
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    def test_bulk_import_ndjson(self, client: TestClient, db_session, monkeypatch):
+        monkeypatch.setattr(settings, "IMPORT_CHUNK_SIZE", 2)
+        org1 = save_random_organization()
+        user1 = save_random_user(organization=org1)
+
+        content = "\n".join([
+            json.dumps({"email": "a@example.com", "first_name": "A", "organization_id": org1.id}),
+            json.dumps({"email": "not an email", "organization_id": org1.id}),
+            json.dumps({"email": user1.email, "organization_id": org1.id}),
+            "{",
+            json.dumps({"email": "b@example.com", "organization_id": org1.id + 1}),
+            "",
+            json.dumps({"email": "a@example.com", "organization_id": org1.id}),
+            json.dumps({"email": "c@example.com", "is_active": False, "organization_id": org1.id}),
+        ])
+        with count_queries() as statements:
+            response = client.post(reverse("user-bulk-import"), data=content)
+        result = response.json()
+
+        assert response.status_code == status.HTTP_200_OK
+        assert result['created'] == 2
+        assert [i['line'] for i in result['errors']] == [2, 3, 4, 5, 7]
+        assert result['errors'][0]['error'].startswith("email:")
+        assert result['errors'][1]['error'] == "Email is not available"
+        assert result['errors'][3]['error'] == "Organization %s does not exist" % (org1.id + 1)
+        assert result['errors'][4]['error'] == "Email is already in the import"
+        # emails + organizations + insert for each of the 2 chunks, whatever the number of users
+        assert len(statements) == 6
+
+        users = {i.email: i for i in db_session.query(User).filter(User.email.in_(["a@example.com", "c@example.com"]))}
+        assert users["a@example.com"].first_name == "A"
+        assert users["a@example.com"].organization_id == org1.id
+        assert users["c@example.com"].is_active is False
+
+    def test_bulk_import_csv(self, client: TestClient, db_session):
+        org1 = save_random_organization()
+
+        content = "email,first_name,last_name,is_admin,organization_id\n" \
+                  "a@example.com,A,,true,%s\n" \
+                  "b@example.com,B,Last,false,\n" % org1.id
+        response = client.post(reverse("user-bulk-import"), params={"format": "csv"}, data=content)
+        result = response.json()
+
+        assert response.status_code == status.HTTP_200_OK
+        assert result['created'] == 1
+        assert result['errors'] == [{"line": 3, "error": "Organization None does not exist"}]
+
+        user = db_session.query(User).filter(User.email == "a@example.com").one()
+        assert user.is_admin is True
+        assert user.last_name is None
+
+    def test_bulk_import_csv_too_many_values(self, client: TestClient, db_session):
+        org1 = save_random_organization()
+
+        content = "email,organization_id\n" \
+                  "bad@example.com,%s,extra\n" \
+                  "good@example.com,%s\n" % (org1.id, org1.id)
+        response = client.post(reverse("user-bulk-import"), params={"format": "csv"}, data=content)
+        result = response.json()
+
+        assert response.status_code == status.HTTP_200_OK
+        assert result['created'] == 1
+        assert result['errors'] == [{"line": 2, "error": "Too many values"}]
+        assert db_session.query(User).filter(User.email == "good@example.com").count() == 1
+
+    def test_bulk_import_not_utf8(self, client: TestClient, db_session):
+        response = client.post(reverse("user-bulk-import"), data="é".encode("latin-1"))
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_get_rights(self, client: TestClient, db_session):
+        rights = sorted([save_random_right() for _ in range(3)], key=lambda i: i.id)
+        role1 = save_random_role(rights=[rights[0], rights[1]])
+        role2 = save_random_role(rights=[rights[1], rights[2]])
+        save_random_role(rights=[save_random_right()])
+        org = save_random_organization()
+        user1 = save_random_user(organization=org, roles=[role1, role2])
+
+        url = reverse("user-get-rights", id=user1.id)
+        with count_queries() as statements:
+            response = client.get(url, params={"limit": 2})
+        result = response.json()
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [i['id'] for i in result['items']] == [rights[0].id, rights[1].id]
+        assert result['next_cursor'] == rights[1].id
+        # user + rights
+        assert len(statements) == 2
+
+        response = client.get(url, params={"after": result['next_cursor']})
+        result = response.json()
+
+        assert [i['id'] for i in result['items']] == [rights[2].id]
+        assert result['next_cursor'] is None
+
+    def test_get_rights_does_not_exist(self, client: TestClient, db_session):
+        url = reverse("user-get-rights", id=1)
+        response = client.get(url)
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
     def test_delete(self, client: TestClient, db_session):
         org = save_random_organization()
         user1 = save_random_user(organization=org)
@@ -99,6 +441,29 @@ class TestUserIntegration:
         assert result.is_admin == data.is_admin
         assert result.organization.id == data.organization_id
 
+    def test_create_single_unit_of_work(self, client: TestClient, db_session):
+        org = save_random_organization()
+        data = UserCreateDTO(email="test@test.com", organization_id=org.id)
+        checkouts, commits = [], []
+
+        def on_checkout(*args):
+            checkouts.append(args)
+
+        def on_commit(*args):
+            commits.append(args)
+
+        event.listen(engine.pool, "checkout", on_checkout)
+        event.listen(engine, "commit", on_commit)
+        try:
+            response = client.post(reverse("user-create"), data=data.json())
+        finally:
+            event.remove(engine.pool, "checkout", on_checkout)
+            event.remove(engine, "commit", on_commit)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert len(checkouts) == 1
+        assert len(commits) == 1
+
     def test_create_email_exists(self, client: TestClient, db_session):
         org = save_random_organization()
         user1 = save_random_user(organization=org)
@@ -180,6 +545,22 @@ class TestUserIntegration:
         assert len(result.roles) == 1
         assert result.roles[0].id == role1.id
 
+    def test_add_roles_bulk(self, client: TestClient, db_session):
+        org1 = save_random_organization()
+        assigned = save_random_role()
+        user1 = save_random_user(organization=org1, roles=[assigned])
+        roles = [save_random_role() for _ in range(10)]
+
+        url = reverse("user-add-roles", id=user1.id)
+        with count_queries() as statements:
+            response = client.put(url, json=[assigned.id] + [i.id for i in roles])
+        result = response.json()
+
+        assert response.status_code == status.HTTP_200_OK
+        assert sorted(i['id'] for i in result['roles']) == sorted([assigned.id] + [i.id for i in roles])
+        # user + role existence check + assigned roles + insert + version + details, whatever the number of roles
+        assert len(statements) == 7
+
     def test_add_roles_role_does_not_exist(self, client: TestClient, db_session):
         org1 = save_random_organization()
         user1 = save_random_user(organization=org1)
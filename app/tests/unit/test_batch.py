@@ -0,0 +1,55 @@
+from datetime import datetime
+from unittest import mock
+
+from sqlalchemy.dialects import postgresql
+
+from app.db.models import Right
+from app.repositories.batch import save_by_name
+
+
+class TestSaveByName:
+
+    def test_postgres_upsert_returns_updated(self):
+        db = mock.Mock()
+        db.get_bind.return_value.dialect.name = "postgresql"
+        # An inserted right, without modification time, and an updated one
+        db.execute.return_value = [(1, None), (2, datetime.utcnow())]
+        rows = [{"name": "new", "description": None}, {"name": "existing", "description": "updated"}]
+
+        updated = save_by_name(db, Right, rows, {}, upsert=True)
+
+        assert updated == [2]
+        statement = str(db.execute.call_args[0][0].compile(dialect=postgresql.dialect()))
+        assert "ON CONFLICT (name) DO UPDATE" in statement
+        assert statement.endswith('RETURNING "right".id, "right".modified_date_time')
+
+    def test_postgres_insert_without_upsert(self):
+        db = mock.Mock()
+        db.get_bind.return_value.dialect.name = "postgresql"
+        rows = [{"name": "new", "description": None}, {"name": "other", "description": "other"}]
+
+        updated = save_by_name(db, Right, rows, {}, upsert=False)
+
+        assert updated == []
+        statement, parameters = db.execute.call_args[0]
+        assert "ON CONFLICT" not in str(statement.compile(dialect=postgresql.dialect()))
+        assert parameters == rows
+
+    def test_other_dbs_return_changed(self):
+        db = mock.Mock()
+        db.get_bind.return_value.dialect.name = "sqlite"
+        existing = {"same": Right(id=1, name="same", description="same"),
+                    "changed": Right(id=2, name="changed", description="old")}
+        rows = [{"name": "new", "description": None}, {"name": "same", "description": "same"},
+                {"name": "changed", "description": "updated"}]
+
+        updated = save_by_name(db, Right, rows, existing, upsert=True)
+
+        assert updated == [2]
+        assert db.execute.call_count == 2
+
+    def test_no_rows(self):
+        db = mock.Mock()
+
+        assert save_by_name(db, Right, [], {}, upsert=True) == []
+        assert db.execute.called is False
@@ -0,0 +1,276 @@
+import socket
+import time
+from collections import namedtuple
+from unittest import mock
+
+import pytest
+
+from app.bus import InvalidationBus, PostgresTransport, SocketTransport, Transport
+
+Notify = namedtuple("Notify", "pid channel payload")
+
+
+def wait_for(condition, timeout: float = 5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+class FakeConnection:
+    """
+    psycopg2 connection receiving the notifications given to notify(), or failing on poll().
+    """
+
+    def __init__(self, error: Exception = None):
+        self.error = error
+        self.autocommit = False
+        self.statements = []
+        self.notifies = []
+        self.pending = []
+        self.closed = False
+
+    def cursor(self):
+        return mock.Mock(execute=self.statements.append)
+
+    def notify(self, payload: str):
+        self.pending.append(Notify(1, "entity_changed", payload))
+
+    def poll(self):
+        if self.error is not None:
+            raise self.error
+        self.notifies.extend(self.pending)
+        self.pending = []
+
+    def close(self):
+        self.closed = True
+
+
+def fake_select(readable, writable, exceptional, timeout):
+    conn = readable[0]
+    if conn.pending or conn.error is not None:
+        return readable, [], []
+    time.sleep(0.01)
+    return [], [], []
+
+
+class TestInvalidationBus:
+
+    def setup(self):
+        self.bus = InvalidationBus()
+        self.handler = mock.Mock()
+        self.bus.subscribe("role", self.handler)
+
+    def test_receive(self):
+        other = InvalidationBus()
+
+        self.bus.receive(other.encode("role", 5))
+        self.bus.receive(other.encode("right", 6))
+
+        self.handler.assert_called_once_with(5)
+
+    def test_receive_own_message(self):
+        self.bus.receive(self.bus.encode("role", 5))
+
+        assert self.handler.called is False
+
+    def test_receive_without_id(self):
+        self.bus.receive(InvalidationBus().encode("role", None))
+
+        self.handler.assert_called_once_with(None)
+
+    def test_reset(self):
+        failing = mock.Mock(side_effect=Exception)
+        self.bus.subscribe("right", failing)
+
+        self.bus.reset()
+
+        failing.assert_called_once_with(None)
+        self.handler.assert_called_once_with(None)
+
+    def test_publish_without_transport(self):
+        self.bus.publish("role", 5)
+
+        assert self.handler.called is False
+
+    def test_socket_transport(self, tmp_path):
+        other = InvalidationBus()
+        other_handler = mock.Mock()
+        other.subscribe("role", other_handler)
+
+        self.bus.start(SocketTransport(str(tmp_path)))
+        other.start(SocketTransport(str(tmp_path)))
+        try:
+            self.bus.publish("role", 5)
+            other.publish("role", 6)
+
+            assert wait_for(lambda: other_handler.called and self.handler.called)
+            other_handler.assert_called_once_with(5)
+            self.handler.assert_called_once_with(6)
+        finally:
+            self.bus.stop()
+            other.stop()
+
+        assert list(tmp_path.iterdir()) == []
+
+    def test_transport_is_abstract(self):
+        with pytest.raises(TypeError):
+            Transport()
+
+
+class TestSocketTransport:
+
+    def setup(self):
+        self.receive = mock.Mock()
+        self.reset = mock.Mock()
+
+    def bind_peer(self, tmp_path) -> socket.socket:
+        """
+        Socket of a process which does not read its messages.
+        """
+        peer = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        peer.bind(str(tmp_path / "peer.sock"))
+        peer.setblocking(False)
+        return peer
+
+    def fill(self, transport: SocketTransport, peer: socket.socket) -> int:
+        """
+        Sends messages until the queue of the peer is full.
+        :return: number of messages queued
+        """
+        count = 0
+        while not transport._missed:
+            transport.send("sender:role:%s" % count)
+            count += 1
+        return count - 1
+
+    def drain(self, peer: socket.socket):
+        try:
+            while True:
+                peer.recv(4096)
+        except BlockingIOError:
+            pass
+
+    def test_send_to_full_queue(self, tmp_path):
+        peer = self.bind_peer(tmp_path)
+        transport = SocketTransport(str(tmp_path))
+        transport.start(self.receive, self.reset)
+        try:
+            start = time.monotonic()
+            assert self.fill(transport, peer) > 0
+            # The sends did not wait for the peer
+            assert time.monotonic() - start < 1
+
+            self.drain(peer)
+            transport.send("sender:role:1")
+            transport.send("sender:role:2")
+
+            assert peer.recv(4096) == SocketTransport.RESET
+            assert peer.recv(4096) == b"sender:role:2"
+            assert transport._missed == set()
+        finally:
+            transport.stop()
+            peer.close()
+
+    def test_reset_sent_without_new_message(self, tmp_path):
+        peer = self.bind_peer(tmp_path)
+        transport = SocketTransport(str(tmp_path))
+        transport.start(self.receive, self.reset)
+        try:
+            self.fill(transport, peer)
+            self.drain(peer)
+
+            # The listener thread sends it
+            assert wait_for(lambda: not transport._missed)
+            assert peer.recv(4096) == SocketTransport.RESET
+        finally:
+            transport.stop()
+            peer.close()
+
+    def test_receive_reset(self, tmp_path):
+        transport = SocketTransport(str(tmp_path))
+        transport.start(self.receive, self.reset)
+        sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            sender.sendto(SocketTransport.RESET, transport.path)
+
+            assert wait_for(lambda: self.reset.called)
+            assert self.receive.called is False
+        finally:
+            sender.close()
+            transport.stop()
+
+    def test_send_to_closed_socket(self, tmp_path):
+        peer = self.bind_peer(tmp_path)
+        peer.close()
+        transport = SocketTransport(str(tmp_path))
+        transport.start(self.receive, self.reset)
+        try:
+            transport.send("sender:role:1")
+
+            assert not (tmp_path / "peer.sock").exists()
+            assert transport._missed == set()
+        finally:
+            transport.stop()
+
+
+class TestPostgresTransport:
+
+    def setup(self):
+        self.engine = mock.MagicMock()
+        self.engine.dialect.create_connect_args.return_value = (["dsn"], {})
+        self.transport = PostgresTransport(self.engine, "entity_changed")
+        self.receive = mock.Mock()
+        self.reset = mock.Mock()
+
+    def test_send(self):
+        conn = self.engine.connect.return_value.__enter__.return_value
+
+        self.transport.send("message")
+
+        execute = conn.execution_options.return_value.execute
+        assert str(execute.call_args[0][0]) == "SELECT pg_notify(:channel, :message)"
+        assert execute.call_args[1] == {"channel": "entity_changed", "message": "message"}
+        conn.execution_options.assert_called_once_with(autocommit=True)
+
+    def test_listen(self, mocker):
+        mocker.patch("app.bus.select.select", fake_select)
+        conn = FakeConnection()
+        self.engine.dialect.connect.return_value = conn
+
+        self.transport.start(self.receive, self.reset)
+        try:
+            assert wait_for(lambda: self.reset.called)
+            conn.notify("first")
+            conn.notify("second")
+
+            assert wait_for(lambda: self.receive.call_count == 2)
+        finally:
+            self.transport.stop()
+
+        self.engine.dialect.connect.assert_called_once_with("dsn")
+        assert conn.autocommit is True
+        assert conn.statements == ['LISTEN "entity_changed"']
+        assert self.receive.call_args_list == [mock.call("first"), mock.call("second")]
+        self.reset.assert_called_once_with()
+        assert conn.closed is True
+
+    def test_listen_reconnects(self, mocker):
+        mocker.patch("app.bus.select.select", fake_select)
+        mocker.patch("app.bus.LISTEN_RETRY_DELAY", 0.01)
+        lost, conn = FakeConnection(error=Exception("connection lost")), FakeConnection()
+        self.engine.dialect.connect.side_effect = [Exception("connection refused"), lost, conn]
+
+        self.transport.start(self.receive, self.reset)
+        try:
+            assert wait_for(lambda: self.reset.call_count == 2)
+            conn.notify("message")
+
+            assert wait_for(lambda: self.receive.called)
+        finally:
+            self.transport.stop()
+
+        # Listening again on each new connection, which may have missed messages
+        assert lost.statements == conn.statements == ['LISTEN "entity_changed"']
+        assert lost.closed is True
+        self.receive.assert_called_once_with("message")
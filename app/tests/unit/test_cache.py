@@ -0,0 +1,125 @@
+from app.cache import TTLCache, ResponseCache
+
+
+class FakeTimer:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestTTLCache:
+
+    def setup(self):
+        self.timer = FakeTimer()
+        self.cache = TTLCache("test", maxsize=2, ttl=10, timer=self.timer)
+
+    def test_get(self):
+        self.cache.set(1, "one")
+
+        assert self.cache.get(1) == "one"
+        assert self.cache.get(2) is None
+        assert self.cache.stats()["hits"] == 1
+        assert self.cache.stats()["misses"] == 1
+
+    def test_expiration(self):
+        self.cache.set(1, "one")
+        self.timer.now = 10
+
+        assert self.cache.get(1) is None
+        assert self.cache.stats()["expirations"] == 1
+        assert self.cache.stats()["size"] == 0
+
+    def test_least_recently_used_is_evicted(self):
+        self.cache.set(1, "one")
+        self.cache.set(2, "two")
+        self.cache.get(1)
+        self.cache.set(3, "three")
+
+        assert self.cache.get(2) is None
+        assert self.cache.get(1) == "one"
+        assert self.cache.get(3) == "three"
+        assert self.cache.stats()["evictions"] == 1
+
+    def test_invalidate(self):
+        self.cache.set(1, "one")
+        self.cache.invalidate(1)
+
+        assert self.cache.get(1) is None
+
+    def test_on_changed(self):
+        self.cache.set(1, "one")
+        self.cache.set(2, "two")
+
+        self.cache.on_changed(1)
+        assert self.cache.get(1) is None
+        assert self.cache.get(2) == "two"
+
+        self.cache.on_changed(None)
+        assert self.cache.get(2) is None
+
+    def test_disabled(self):
+        cache = TTLCache("test", maxsize=0, ttl=10)
+        cache.set(1, "one")
+
+        assert cache.get(1) is None
+
+    def test_get_many_loads_missing_keys_once(self):
+        loaded = []
+
+        def load(keys):
+            loaded.append(keys)
+            return [(i, str(i)) for i in keys if i != 4]
+
+        self.cache.maxsize = 10
+        self.cache.set(1, (1, "1"))
+        result = self.cache.get_many([1, 2, 3, 4], load, lambda i: i[0])
+
+        assert result == [(1, "1"), (2, "2"), (3, "3")]
+        assert loaded == [[2, 3, 4]]
+        assert self.cache.get(2) == (2, "2")
+
+
+class TestResponseCache:
+
+    def setup(self):
+        self.cache = ResponseCache("test", maxsize=10, ttl=10, maxbytes=10)
+
+    def test_get_body_of_version(self):
+        self.cache.set_body(1, (1,), b"one")
+
+        assert self.cache.get_body(1, (1,)) == b"one"
+        assert self.cache.get_body(1, (2,)) is None
+        assert self.cache.get_body(1, (1,)) is None
+        assert self.cache.stats()["expirations"] == 1
+        assert self.cache.stats()["bytes"] == 0
+
+    def test_bounded_by_bytes(self):
+        self.cache.set_body(1, (1,), b"1234")
+        self.cache.set_body(2, (1,), b"1234")
+        self.cache.get_body(1, (1,))
+        self.cache.set_body(3, (1,), b"1234")
+
+        assert self.cache.get_body(2, (1,)) is None
+        assert self.cache.get_body(1, (1,)) == b"1234"
+        assert self.cache.stats()["bytes"] == 8
+        assert self.cache.stats()["evictions"] == 1
+
+        self.cache.set_body(1, (2,), b"12")
+        assert self.cache.stats()["bytes"] == 6
+
+    def test_body_larger_than_cache(self):
+        self.cache.set_body(1, (1,), b"1234")
+        self.cache.set_body(2, (1,), b"12345678901")
+
+        assert self.cache.get_body(2, (1,)) is None
+        assert self.cache.get_body(1, (1,)) == b"1234"
+        assert self.cache.stats()["evictions"] == 0
+
+    def test_clear(self):
+        self.cache.set_body(1, (1,), b"1234")
+        self.cache.clear()
+
+        assert self.cache.stats()["bytes"] == 0
@@ -0,0 +1,118 @@
+import asyncio
+import gzip
+import zlib
+
+import brotli
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import Response, StreamingResponse
+from starlette.testclient import TestClient
+
+from app.compression import CompressionMiddleware, negotiate_encoding
+
+BODY = b"x" * 2000
+
+
+def create_client(**options) -> TestClient:
+    app = Starlette()
+    app.add_middleware(CompressionMiddleware, minimum_size=1000, **options)
+
+    @app.route("/large")
+    def large(request):
+        return Response(BODY, media_type="text/plain")
+
+    @app.route("/small")
+    def small(request):
+        return Response(b"x" * 999, media_type="text/plain")
+
+    @app.route("/encoded")
+    def encoded(request):
+        return Response(gzip.compress(BODY), headers={"Content-Encoding": "gzip"})
+
+    @app.route("/stream")
+    def stream(request):
+        return StreamingResponse(iter([b"first,", b"second"]), media_type="text/plain")
+
+    return TestClient(app)
+
+
+def get(client: TestClient, path: str, accept_encoding: str):
+    # Not decoded by the client, to check the body as sent
+    return client.get(path, headers={"Accept-Encoding": accept_encoding}, stream=True)
+
+
+@pytest.mark.parametrize("accept_encoding, expected", [
+    ("gzip, deflate, br", "br"),
+    ("gzip", "gzip"),
+    ("br;q=0.5, gzip", "gzip"),
+    ("br;q=0, gzip;q=0.1", "gzip"),
+    ("*", "br"),
+    ("*, br;q=0", "gzip"),
+    ("identity", None),
+    ("", None),
+    ("gzip;q=x", None),
+])
+def test_negotiate_encoding(accept_encoding, expected):
+    assert negotiate_encoding(accept_encoding, ["br", "gzip"]) == expected
+
+
+class TestCompressionMiddleware:
+
+    def test_gzip(self):
+        response = get(create_client(), "/large", "gzip")
+        body = response.raw.read(decode_content=False)
+
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.headers["vary"] == "Accept-Encoding"
+        assert int(response.headers["content-length"]) == len(body)
+        assert gzip.decompress(body) == BODY
+
+    def test_brotli(self):
+        response = get(create_client(brotli_quality=11), "/large", "gzip, br")
+
+        assert response.headers["content-encoding"] == "br"
+        assert brotli.decompress(response.raw.read(decode_content=False)) == BODY
+
+    def test_encodings(self):
+        response = get(create_client(encodings=["gzip"]), "/large", "br")
+
+        assert "content-encoding" not in response.headers
+        assert response.raw.read(decode_content=False) == BODY
+
+    def test_small_response_not_compressed(self):
+        response = get(create_client(), "/small", "gzip")
+
+        assert "content-encoding" not in response.headers
+        assert response.raw.read(decode_content=False) == b"x" * 999
+
+    def test_encoded_response_not_compressed_again(self):
+        response = get(create_client(), "/encoded", "br")
+
+        assert response.headers["content-encoding"] == "gzip"
+        assert gzip.decompress(response.raw.read(decode_content=False)) == BODY
+
+    def test_streaming_response(self):
+        response = get(create_client(), "/stream", "gzip")
+
+        assert response.headers["content-encoding"] == "gzip"
+        assert "content-length" not in response.headers
+        assert zlib.decompress(response.raw.read(decode_content=False), 16 + zlib.MAX_WBITS) == b"first,second"
+
+    def test_streaming_chunks_are_flushed(self):
+        messages = []
+
+        async def app(scope, receive, send):
+            await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/plain")]})
+            await send({"type": "http.response.body", "body": b"first,", "more_body": True})
+            await send({"type": "http.response.body", "body": b"second"})
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {"type": "http", "headers": [(b"accept-encoding", b"gzip")]}
+        asyncio.get_event_loop().run_until_complete(CompressionMiddleware(app)(scope, None, send))
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+        # The first chunk is sent whole, without waiting for the end of the stream
+        assert decompressor.decompress(messages[1]["body"]) == b"first,"
+        assert decompressor.decompress(messages[2]["body"]) == b"second"
@@ -0,0 +1,17 @@
+from app.routers.conditional import etag_matches, make_etag
+
+
+class TestConditional:
+
+    def test_make_etag(self):
+        assert make_etag((1, 2)) == make_etag((1, 2))
+        assert make_etag((1, 2)) != make_etag((1, 3))
+        assert make_etag((1, 2)).startswith('W/"')
+
+    def test_etag_matches(self):
+        assert etag_matches('W/"a"', 'W/"a"') is True
+        assert etag_matches('"a"', 'W/"a"') is True
+        assert etag_matches('W/"b", W/"a"', 'W/"a"') is True
+        assert etag_matches('*', 'W/"a"') is True
+        assert etag_matches('W/"b"', 'W/"a"') is False
+        assert etag_matches(None, 'W/"a"') is False
@@ -0,0 +1,62 @@
+import pytest
+
+from app.db import database
+from app.db.database import db_session, create_db_engine, engine
+from app.settings import settings
+
+
+@pytest.fixture
+def replicas(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "pool_metrics", [])
+    replicas = [create_db_engine("sqlite:///%s" % (tmp_path / ("replica%s.sqlite" % i)), "replica-%s" % i)
+                for i in range(2)]
+    monkeypatch.setattr(database, "replica_engines", replicas)
+    yield replicas
+    for i in replicas:
+        i.dispose()
+
+
+class TestDbSession:
+
+    def test_nested_blocks_share_the_session(self):
+        with db_session() as outer:
+            with db_session(read_only=True) as inner:
+                assert inner is outer
+
+    def test_read_only_without_replicas(self):
+        with db_session(read_only=True) as db:
+            assert db.bind is engine
+
+    def test_read_only_round_robin(self, replicas, monkeypatch):
+        monkeypatch.setattr(settings, "DB_REPLICA_SELECTION", "round_robin")
+
+        binds = []
+        for _ in range(4):
+            with db_session(read_only=True) as db:
+                binds.append(db.bind)
+
+        assert set(binds) == set(replicas)
+        assert binds[0] is binds[2] and binds[1] is binds[3]
+
+    def test_read_only_least_connections(self, replicas, monkeypatch):
+        monkeypatch.setattr(settings, "DB_REPLICA_SELECTION", "least_connections")
+
+        with replicas[0].connect():
+            with db_session(read_only=True) as db:
+                assert db.bind is replicas[1]
+
+        with replicas[1].connect():
+            with db_session(read_only=True) as db:
+                assert db.bind is replicas[0]
+
+    def test_read_nested_in_write_stays_on_primary(self, replicas):
+        with db_session() as outer:
+            with db_session(read_only=True) as inner:
+                assert inner is outer
+                assert inner.bind is engine
+
+    def test_write_nested_in_read_only(self, replicas):
+        with db_session(read_only=True):
+            with pytest.raises(RuntimeError):
+                with db_session():
+                    pass
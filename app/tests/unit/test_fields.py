@@ -0,0 +1,44 @@
+import pytest
+
+from app.config.exceptions import ValidationException
+from app.schemas.fields import parse_fields, from_model_fields
+from app.schemas.user import UserDetailsDTO
+from app.tests.utils.utils import create_random_user, create_random_organization, create_random_role
+
+
+class TestFields:
+
+    def test_parse_fields(self):
+        fields = parse_fields("email, organization.name,roles", UserDetailsDTO)
+
+        assert fields == {"id": True, "email": True, "organization": {"id": True, "name": True}, "roles": True}
+
+    def test_parse_fields_all(self):
+        assert parse_fields(None, UserDetailsDTO) is None
+        assert parse_fields("", UserDetailsDTO) is None
+
+    def test_parse_fields_whole_nested_field_wins(self):
+        assert parse_fields("roles.name,roles", UserDetailsDTO) == {"id": True, "roles": True}
+        assert parse_fields("roles,roles.name", UserDetailsDTO) == {"id": True, "roles": True}
+
+    @pytest.mark.parametrize("value", ["password", "email.domain", "organization.users", "organization.name.x"])
+    def test_parse_fields_unknown(self, value):
+        with pytest.raises(ValidationException):
+            parse_fields(value, UserDetailsDTO)
+
+    def test_from_model_fields(self):
+        org = create_random_organization()
+        org.id = 2
+        role = create_random_role()
+        role.id = 3
+        user = create_random_user(organization=org, roles=[role])
+        user.id = 1
+
+        result = from_model_fields(UserDetailsDTO, user, {"id": True, "organization": {"id": True}, "roles": True})
+
+        assert result.dict(exclude_unset=True) == {
+            "id": 1,
+            "organization": {"id": 2},
+            "roles": [{"id": 3, "name": role.name, "description": role.description,
+                       "created_date_time": role.created_date_time, "modified_date_time": None}],
+        }
@@ -0,0 +1,34 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from app.main import configure_threadpool
+from app.settings import settings
+
+
+def run_startup_hook(hook) -> asyncio.AbstractEventLoop:
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(hook())
+    return loop
+
+
+def test_configure_threadpool(monkeypatch):
+    monkeypatch.setattr(settings, "THREADPOOL_SIZE", 3)
+
+    loop = run_startup_hook(configure_threadpool)
+    try:
+        executor = loop._default_executor
+        assert isinstance(executor, ThreadPoolExecutor)
+        assert executor._max_workers == 3
+    finally:
+        loop.close()
+
+
+def test_configure_threadpool_default(monkeypatch):
+    monkeypatch.setattr(settings, "THREADPOOL_SIZE", None)
+
+    loop = run_startup_hook(configure_threadpool)
+    try:
+        # asyncio creates its default executor on first use
+        assert loop._default_executor is None
+    finally:
+        loop.close()
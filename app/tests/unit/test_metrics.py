@@ -0,0 +1,152 @@
+import contextvars
+import threading
+
+import pytest
+from sqlalchemy.exc import DBAPIError
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.testclient import TestClient
+
+from app.db.database import engine
+from app.db.queries import record_queries
+from app.metrics import Exposition, Histogram, MetricsMiddleware, RequestMetrics
+
+
+class TestHistogram:
+
+    def test_observe(self):
+        histogram = Histogram([1, 0.1, 10])
+
+        for value in [0.05, 0.1, 0.5, 20]:
+            histogram.observe(value)
+
+        result = histogram.snapshot()
+
+        assert result['buckets'] == {'0.1': 2, '1': 3, '10': 3, 'inf': 4}
+        assert result['count'] == 4
+        assert result['sum'] == 20.65
+
+    def test_empty(self):
+        result = Histogram([1]).snapshot()
+
+        assert result['buckets'] == {'1': 0, 'inf': 0}
+        assert result['count'] == 0
+        assert result['sum'] == 0
+
+
+def create_client(metrics: RequestMetrics) -> TestClient:
+    app = Starlette()
+    app.add_middleware(MetricsMiddleware, routes=app.routes, metrics=metrics)
+
+    @app.route("/items", name="item-get-all")
+    def items(request):
+        engine.execute("SELECT 1")
+        engine.execute("SELECT 2")
+        return PlainTextResponse("items")
+
+    @app.route("/error", name="error")
+    def error(request):
+        raise RuntimeError("error")
+
+    return TestClient(app, raise_server_exceptions=False)
+
+
+class TestMetricsMiddleware:
+
+    def test_route(self):
+        metrics = RequestMetrics()
+        client = create_client(metrics)
+
+        client.get("/items")
+        client.get("/items")
+
+        route = metrics.routes[("item-get-all", "GET")]
+        assert route.responses == {200: 2}
+        assert route.duration.snapshot()['count'] == 2
+        assert route.queries.snapshot()['sum'] == 4
+        assert route.db_duration.snapshot()['sum'] > 0
+        assert metrics.in_flight == 0
+
+    def test_unmatched(self):
+        metrics = RequestMetrics()
+
+        create_client(metrics).get("/unknown")
+
+        assert metrics.routes[("unmatched", "GET")].responses == {404: 1}
+
+    def test_error(self):
+        metrics = RequestMetrics()
+
+        create_client(metrics).get("/error")
+
+        assert metrics.routes[("error", "GET")].responses == {500: 1}
+        assert metrics.in_flight == 0
+
+
+class TestRecordQueries:
+
+    def test_outside_of_the_block(self):
+        with record_queries() as stats:
+            pass
+        engine.execute("SELECT 1")
+
+        assert stats.count == 0
+
+    def test_thread_with_a_copy_of_the_context(self):
+        with record_queries() as stats:
+            context = contextvars.copy_context()
+            thread = threading.Thread(target=context.run, args=(engine.execute, "SELECT 1"))
+            thread.start()
+            thread.join()
+
+        assert stats.count == 1
+        assert stats.duration > 0
+
+    def test_nested_block(self):
+        with record_queries() as stats:
+            engine.execute("SELECT 1")
+            with record_queries() as nested:
+                engine.execute("SELECT 1")
+                engine.execute("SELECT 1")
+
+                assert stats.count == 1
+
+        assert nested.count == 2
+        assert stats.count == 3
+        assert stats.duration > nested.duration
+
+    def test_failed_statement(self):
+        with record_queries() as stats:
+            with pytest.raises(DBAPIError):
+                engine.execute("SELECT * FROM missing")
+            engine.execute("SELECT 1")
+
+        assert stats.count == 1
+
+
+class TestExposition:
+
+    def test_render(self):
+        histogram = Histogram([0.1, 1])
+        histogram.observe(0.5)
+        exposition = Exposition()
+
+        exposition.gauge("in_flight", "In flight.", [({}, 2)])
+        exposition.counter("requests_total", "Requests.", [({"route": "a\"b\\c\n"}, 3)])
+        exposition.histogram("duration_seconds", "Duration.", [({"route": "a"}, histogram)])
+
+        assert exposition.render().splitlines() == [
+            '# HELP in_flight In flight.',
+            '# TYPE in_flight gauge',
+            'in_flight 2',
+            '# HELP requests_total Requests.',
+            '# TYPE requests_total counter',
+            'requests_total{route="a\\"b\\\\c\\n"} 3',
+            '# HELP duration_seconds Duration.',
+            '# TYPE duration_seconds histogram',
+            'duration_seconds_bucket{route="a",le="0.1"} 0',
+            'duration_seconds_bucket{route="a",le="1"} 1',
+            'duration_seconds_bucket{route="a",le="+Inf"} 1',
+            'duration_seconds_sum{route="a"} 0.5',
+            'duration_seconds_count{route="a"} 1',
+        ]
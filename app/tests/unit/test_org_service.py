@@ -1,10 +1,13 @@
+from unittest import mock
+
 import pytest
 
 from app.config.exceptions import ValidationException
 from app.repositories.organization import OrganizationRepository
 from app.schemas.organization import OrganizationCreateDTO, OrganizationUpdateDTO
 from app.services.organization import OrganizationService
-from app.tests.utils.utils import create_random_organization
+from app.settings import settings
+from app.tests.utils.utils import create_random_organization, create_random_user
 
 
 class TestOrganizationService:
@@ -22,7 +25,8 @@ class TestOrganizationService:
 
         assert mocked_get_all.called is True
         assert result
-        assert len(result) == 2
+        assert len(result.items) == 2
+        assert result.next_cursor is None
 
     def test_get_by_id_exits(self, mocker):
         org1 = create_random_organization()
@@ -45,14 +49,66 @@ class TestOrganizationService:
 
     def test_get_details_exits(self, mocker):
         org1 = create_random_organization()
+        users = [create_random_user(organization=org1) for _ in range(settings.PAGE_SIZE_DEFAULT + 1)]
 
         mocked_get_all = mocker.patch.object(OrganizationRepository, 'get_by_id', return_value=org1)
+        mocked_get_users = mocker.patch.object(OrganizationRepository, 'get_users', return_value=users)
 
         result = self.service.get_details(org1.id)
 
         assert mocked_get_all.called is True
+        mocked_get_users.assert_called_with(mock.ANY, org1.id, None, settings.PAGE_SIZE_DEFAULT + 1)
         assert result
         assert result.id == org1.id
+        assert len(result.users) == settings.PAGE_SIZE_DEFAULT
+        assert result.users_next_cursor == users[settings.PAGE_SIZE_DEFAULT - 1].id
+
+    def test_get_users(self, mocker):
+        org1 = create_random_organization()
+        user1 = create_random_user(organization=org1)
+
+        mocked_get_by_id = mocker.patch.object(OrganizationRepository, 'get_by_id', return_value=org1)
+        mocked_get_users = mocker.patch.object(OrganizationRepository, 'get_users', return_value=[user1])
+
+        result = self.service.get_users(org1.id, after=5, limit=10)
+
+        assert mocked_get_by_id.called is True
+        mocked_get_users.assert_called_with(mock.ANY, org1.id, 5, 11)
+        assert [i.id for i in result.items] == [user1.id]
+        assert result.next_cursor is None
+
+    def test_get_users_does_not_exist(self, mocker):
+        mocked_get_by_id = mocker.patch.object(OrganizationRepository, 'get_by_id', return_value=None)
+        mocked_get_users = mocker.patch.object(OrganizationRepository, 'get_users')
+
+        with pytest.raises(ValidationException):
+            self.service.get_users(1)
+
+        assert mocked_get_by_id.called is True
+        assert mocked_get_users.called is False
+
+    def test_get_details_if_modified(self, mocker):
+        org1 = create_random_organization()
+        mocked_get_version = mocker.patch.object(OrganizationRepository, 'get_version', return_value=(org1.id, 1))
+        mocked_get_by_id = mocker.patch.object(OrganizationRepository, 'get_by_id', return_value=org1)
+        mocker.patch.object(OrganizationRepository, 'get_users', return_value=[])
+
+        result, details = self.service.get_details_if_modified(org1.id, lambda version: None)
+
+        assert result is None
+        assert details.id == org1.id
+        # Both are read in the same session
+        assert mocked_get_version.call_args[0][0] is mocked_get_by_id.call_args[0][0]
+
+    def test_get_details_if_modified_unchanged(self, mocker):
+        mocker.patch.object(OrganizationRepository, 'get_version', return_value=(1, 1))
+        mocked_get_by_id = mocker.patch.object(OrganizationRepository, 'get_by_id')
+
+        result, details = self.service.get_details_if_modified(1, lambda version: "unchanged")
+
+        assert result == "unchanged"
+        assert details is None
+        assert mocked_get_by_id.called is False
 
     def test_get_details_does_not_exist(self, mocker):
         mocked_get_all = mocker.patch.object(OrganizationRepository, 'get_by_id', return_value=None)
@@ -97,6 +153,7 @@ class TestOrganizationService:
         mocked_get_all = mocker.patch.object(OrganizationService, 'get_by_id', return_value=org1)
         mocked_get_by_name = mocker.patch.object(OrganizationService, 'get_by_name', return_value=org1)
         mocked_update = mocker.patch.object(OrganizationRepository, 'update', return_value=org1)
+        mocker.patch.object(OrganizationRepository, 'get_users', return_value=[])
 
         data = OrganizationUpdateDTO(name="Name")
 
@@ -0,0 +1,127 @@
+from app.repositories.permission import PermissionRepository
+from app.schemas.permission import PermissionCheckDTO
+from app.services.permission import LOAD_ATTEMPTS, PermissionIndex, PermissionService, permission_index
+
+
+class TestPermissionIndex:
+
+    def setup(self):
+        self.index = PermissionIndex()
+        # user 1 has role 10 (rights 100, 101), user 2 has roles 10 and 11 (right 102)
+        self.index.load(user_roles=[(1, 10), (2, 10), (2, 11)],
+                        role_rights=[(10, 100), (10, 101), (11, 102)])
+
+    def test_check(self):
+        result = self.index.check([(1, 100), (1, 101), (1, 102), (2, 102), (3, 100), (1, 999)])
+
+        assert result == [True, True, False, True, False, False]
+
+    def test_set_user_roles(self):
+        self.index.set_user_roles(1, [11])
+
+        assert self.index.check([(1, 100), (1, 102)]) == [False, True]
+
+    def test_set_role_rights(self):
+        self.index.set_role_rights(10, [100, 103])
+
+        assert self.index.check([(1, 100), (1, 101), (1, 103), (2, 103), (2, 102)]) == [True, False, True, True, True]
+
+    def test_remove_user(self):
+        self.index.remove_user(2)
+
+        assert self.index.check([(2, 100), (2, 102), (1, 100)]) == [False, False, True]
+
+    def test_remove_role(self):
+        self.index.remove_role(10)
+
+        assert self.index.check([(1, 100), (2, 100), (2, 102)]) == [False, False, True]
+
+    def test_updates_before_load_are_ignored(self):
+        self.index.reset()
+        self.index.set_user_roles(1, [10])
+
+        assert self.index.loaded is False
+        assert self.index.check([(1, 100)]) == [False]
+
+    def test_load_after_a_change(self):
+        generation = self.index.generation
+        self.index.reset()
+        self.index.set_user_roles(1, [11])
+
+        assert self.index.load(user_roles=[(1, 10)], role_rights=[(10, 100)], generation=generation) is False
+        assert self.index.loaded is False
+
+
+class TestPermissionService:
+
+    def setup(self):
+        self.service = PermissionService()
+        permission_index.reset()
+
+    def teardown(self):
+        permission_index.reset()
+
+    def test_check_loads_the_index_once(self, mocker):
+        mocked_get_user_roles = mocker.patch.object(PermissionRepository, 'get_user_roles', return_value=[(1, 10)])
+        mocked_get_role_rights = mocker.patch.object(PermissionRepository, 'get_role_rights', return_value=[(10, 100)])
+
+        checks = [PermissionCheckDTO(user_id=1, right_id=100), PermissionCheckDTO(user_id=1, right_id=101)]
+        self.service.check(checks)
+        result = self.service.check(checks)
+
+        assert mocked_get_user_roles.call_count == 1
+        assert mocked_get_role_rights.call_count == 1
+        assert [(i.user_id, i.right_id, i.allowed) for i in result] == [(1, 100, True), (1, 101, False)]
+
+    def test_check_reloads_after_a_change_during_the_load(self, mocker):
+        # The roles of user 1 change from 10 to 11 once the rows are read, before the index is loaded
+        def get_user_roles(db):
+            if mocked_get_user_roles.call_count == 1:
+                self.service.set_user_roles(1, [11])
+                return [(1, 10)]
+            return [(1, 11)]
+
+        mocked_get_user_roles = mocker.patch.object(PermissionRepository, 'get_user_roles', side_effect=get_user_roles)
+        mocker.patch.object(PermissionRepository, 'get_role_rights', return_value=[(10, 100), (11, 101)])
+
+        result = self.service.check([PermissionCheckDTO(user_id=1, right_id=100), PermissionCheckDTO(user_id=1, right_id=101)])
+
+        assert mocked_get_user_roles.call_count == 2
+        assert [i.allowed for i in result] == [False, True]
+        assert permission_index.loaded is True
+        assert permission_index.check([(1, 100), (1, 101)]) == [False, True]
+
+    def test_check_without_loading_when_always_changed(self, mocker):
+        def get_user_roles(db):
+            permission_index.mark_changed()
+            return [(1, 10)]
+
+        mocked_get_user_roles = mocker.patch.object(PermissionRepository, 'get_user_roles', side_effect=get_user_roles)
+        mocker.patch.object(PermissionRepository, 'get_role_rights', return_value=[(10, 100)])
+
+        result = self.service.check([PermissionCheckDTO(user_id=1, right_id=100)])
+
+        assert mocked_get_user_roles.call_count == LOAD_ATTEMPTS
+        assert result[0].allowed is True
+        assert permission_index.loaded is False
+
+    def test_refresh_user_roles(self, mocker):
+        mocker.patch.object(PermissionRepository, 'get_user_roles', return_value=[(1, 10)])
+        mocker.patch.object(PermissionRepository, 'get_role_rights', return_value=[(10, 100), (11, 101)])
+        mocked_get_role_ids = mocker.patch.object(PermissionRepository, 'get_role_ids', return_value=[11])
+        self.service.load()
+
+        self.service.refresh_user_roles(1)
+
+        mocked_get_role_ids.assert_called_once_with(mocker.ANY, 1)
+        assert permission_index.check([(1, 100), (1, 101)]) == [False, True]
+
+    def test_refresh_role_rights_not_loaded(self, mocker):
+        mocked_get_right_ids = mocker.patch.object(PermissionRepository, 'get_right_ids')
+
+        generation = permission_index.generation
+
+        self.service.refresh_role_rights(10)
+
+        assert mocked_get_right_ids.called is False
+        assert permission_index.generation == generation + 1
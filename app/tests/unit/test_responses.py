@@ -0,0 +1,36 @@
+import json
+from datetime import datetime
+
+import pytest
+
+from app.routers.responses import DTOResponse
+from app.schemas.page import PageDTO
+from app.schemas.role import RoleDetailsDTO
+from app.schemas.user import UserDTO
+from app.tests.utils.utils import create_random_right, create_random_role
+
+
+class TestDTOResponse:
+
+    @pytest.fixture(params=["orjson", "json"])
+    def encoder(self, request, mocker):
+        if request.param == "json":
+            mocker.patch("app.encoders.orjson", None)
+
+    def test_render(self, encoder):
+        right = create_random_right()
+        right.id = 2
+        role = create_random_role(rights=[right])
+        role.id = 1
+        role.created_date_time = datetime(2020, 10, 1, 12, 30, 15, 250)
+
+        result = json.loads(DTOResponse(RoleDetailsDTO.from_model(role)).body)
+
+        assert result["created_date_time"] == "2020-10-01T12:30:15.000250"
+        assert result["rights"][0]["id"] == 2
+        assert result["rights"][0]["name"] == right.name
+
+    def test_render_set_fields_only(self, encoder):
+        page = PageDTO[UserDTO].construct(items=[UserDTO.construct(_fields_set={"id"}, id=1)], next_cursor=None)
+
+        assert json.loads(DTOResponse(page).body) == {"items": [{"id": 1}], "next_cursor": None}
@@ -1,9 +1,11 @@
+from unittest import mock
+
 import pytest
 
 from app.config.exceptions import ValidationException
 from app.repositories.right import RightRepository
 from app.schemas.right import RightCreateDTO, RightUpdateDTO
-from app.services.right import RightService
+from app.services.right import RightService, right_cache, right_details_cache
 from app.tests.utils.utils import create_random_right
 
 
@@ -22,7 +24,8 @@ class TestRightService:
 
         assert mocked_get_all.called is True
         assert result
-        assert len(result) == 2
+        assert len(result.items) == 2
+        assert result.next_cursor is None
 
     def test_get_by_id_exits(self, mocker):
         right1 = create_random_right()
@@ -35,6 +38,42 @@ class TestRightService:
         assert result
         assert result.id == right1.id
 
+    def test_get_by_id_cached(self, mocker):
+        right1 = create_random_right()
+
+        mocked_get_by_id = mocker.patch.object(RightRepository, 'get_by_id', return_value=right1)
+
+        self.service.get_by_id(right1.id)
+        result = self.service.get_by_id(right1.id)
+
+        assert mocked_get_by_id.call_count == 1
+        assert result.id == right1.id
+
+    def test_get_by_ids_cached(self, mocker):
+        right1 = create_random_right()
+        right2 = create_random_right()
+
+        mocker.patch.object(RightRepository, 'get_by_id', return_value=right1)
+        mocked_get_by_ids = mocker.patch.object(RightRepository, 'get_by_ids', return_value=[right2])
+
+        self.service.get_by_id(right1.id)
+        result = self.service.get_by_ids([right1.id, right2.id])
+
+        mocked_get_by_ids.assert_called_once_with(mock.ANY, [right2.id])
+        assert [i.id for i in result] == [right1.id, right2.id]
+
+    def test_update_invalidates_cache(self, mocker):
+        right1 = create_random_right()
+
+        mocked_get_by_id = mocker.patch.object(RightRepository, 'get_by_id', return_value=right1)
+        mocker.patch.object(RightRepository, 'get_by_name', return_value=None)
+        mocker.patch.object(RightRepository, 'update', return_value=right1)
+
+        self.service.update(right1.id, RightUpdateDTO(name="Name"))
+        self.service.get_by_id(right1.id)
+
+        assert mocked_get_by_id.call_count == 2
+
     def test_get_by_id_does_not_exist(self, mocker):
         mocked_get_all = mocker.patch.object(RightRepository, 'get_by_id', return_value=None)
 
@@ -54,6 +93,33 @@ class TestRightService:
         assert result
         assert result.id == right1.id
 
+    def test_get_details_json(self, mocker):
+        right1 = create_random_right()
+        mocked_get_version = mocker.patch.object(RightRepository, 'get_version', return_value=(right1.id, 1))
+        mocked_get = mocker.patch.object(RightRepository, 'get_by_id', return_value=right1)
+        mocked_set_body = mocker.patch.object(right_details_cache, 'set_body')
+        mocker.patch.object(right_details_cache, 'get_body', return_value=None)
+
+        result, body = self.service.get_details_json(right1.id, lambda version: None)
+
+        assert result is None
+        assert b'"id":%d' % right1.id in body
+        # Cached under the version read in the same session as the details
+        assert mocked_get_version.call_args[0][0] is mocked_get.call_args[0][0]
+        mocked_set_body.assert_called_once_with(right1.id, (right1.id, 1), body)
+
+    def test_get_details_json_unchanged(self, mocker):
+        mocker.patch.object(RightRepository, 'get_version', return_value=(1, 1))
+        mocked_get = mocker.patch.object(RightRepository, 'get_by_id')
+        mocked_get_body = mocker.patch.object(right_details_cache, 'get_body')
+
+        result, body = self.service.get_details_json(1, lambda version: "unchanged")
+
+        assert result == "unchanged"
+        assert body is None
+        assert mocked_get.called is False
+        assert mocked_get_body.called is False
+
     def test_get_details_does_not_exist(self, mocker):
         mocked_get_all = mocker.patch.object(RightRepository, 'get_by_id', return_value=None)
 
@@ -91,6 +157,50 @@ class TestRightService:
         assert mocked_get_all.called is True
         assert mocked_create.called is False
 
+    def test_create_batch_upsert_invalidates_cache(self, mocker):
+        right1 = create_random_right()
+        updated = create_random_right(name=right1.name, description="updated")
+        updated.id = right1.id
+
+        mocker.patch.object(RightRepository, 'get_by_id', return_value=right1)
+        mocker.patch.object(RightRepository, 'get_by_names', side_effect=[[right1], [updated]])
+        mocked_save_batch = mocker.patch.object(RightRepository, 'save_batch', return_value=[right1.id])
+        mocked_publish = mocker.patch("app.services.right.invalidation_bus.publish")
+        self.service.get_by_id(right1.id)
+
+        result = self.service.create_batch([RightCreateDTO(name=right1.name, description="updated")], upsert=True)
+
+        assert mocked_save_batch.called is True
+        assert result[0].description == "updated"
+        assert right_cache.get(right1.id) is None
+        mocked_publish.assert_called_once_with("right", right1.id)
+
+    def test_create_batch_upsert_unchanged(self, mocker):
+        right1 = create_random_right()
+
+        mocker.patch.object(RightRepository, 'get_by_id', return_value=right1)
+        mocker.patch.object(RightRepository, 'get_by_names', return_value=[right1])
+        # Updated by another request between the read of the existing rights and the upsert
+        mocker.patch.object(RightRepository, 'save_batch', return_value=[])
+        mocked_publish = mocker.patch("app.services.right.invalidation_bus.publish")
+        self.service.get_by_id(right1.id)
+
+        self.service.create_batch([RightCreateDTO(name=right1.name, description="updated")], upsert=True)
+
+        assert right_cache.get(right1.id) is not None
+        assert mocked_publish.called is False
+
+    def test_create_batch_name_exists(self, mocker):
+        right1 = create_random_right()
+
+        mocker.patch.object(RightRepository, 'get_by_names', return_value=[right1])
+        mocked_save_batch = mocker.patch.object(RightRepository, 'save_batch')
+
+        with pytest.raises(ValidationException):
+            self.service.create_batch([RightCreateDTO(name=right1.name)])
+
+        assert mocked_save_batch.called is False
+
     def test_update(self, mocker):
         right1 = create_random_right()
 
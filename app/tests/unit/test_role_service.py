@@ -1,13 +1,14 @@
 from unittest import mock
-from unittest.mock import call
 
 import pytest
+from sqlalchemy.exc import IntegrityError
 
 from app.config.exceptions import ValidationException
 from app.repositories.role import RoleRepository
 from app.schemas.role import RoleCreateDTO, RoleUpdateDTO
+from app.services.permission import PermissionService
 from app.services.right import RightService
-from app.services.role import RoleService
+from app.services.role import RoleService, role_cache, role_details_cache
 from app.tests.utils.utils import create_random_role, create_random_right
 
 
@@ -26,7 +27,8 @@ class TestRoleService:
 
         assert mocked_get_all.called is True
         assert result
-        assert len(result) == 2
+        assert len(result.items) == 2
+        assert result.next_cursor is None
 
     def test_get_by_id_exits(self, mocker):
         role1 = create_random_role()
@@ -50,7 +52,7 @@ class TestRoleService:
     def test_get_details_exits(self, mocker):
         role1 = create_random_role()
 
-        mocked_get_all = mocker.patch.object(RoleRepository, 'get_by_id', return_value=role1)
+        mocked_get_all = mocker.patch.object(RoleRepository, 'get_details', return_value=role1)
 
         result = self.service.get_details(role1.id)
 
@@ -58,8 +60,35 @@ class TestRoleService:
         assert result
         assert result.id == role1.id
 
+    def test_get_details_json(self, mocker):
+        role1 = create_random_role()
+        mocked_get_version = mocker.patch.object(RoleRepository, 'get_version', return_value=(role1.id, 1))
+        mocked_get = mocker.patch.object(RoleRepository, 'get_details', return_value=role1)
+        mocked_set_body = mocker.patch.object(role_details_cache, 'set_body')
+        mocker.patch.object(role_details_cache, 'get_body', return_value=None)
+
+        result, body = self.service.get_details_json(role1.id, lambda version: None)
+
+        assert result is None
+        assert b'"id":%d' % role1.id in body
+        # Cached under the version read in the same session as the details
+        assert mocked_get_version.call_args[0][0] is mocked_get.call_args[0][0]
+        mocked_set_body.assert_called_once_with(role1.id, (role1.id, 1), body)
+
+    def test_get_details_json_unchanged(self, mocker):
+        mocker.patch.object(RoleRepository, 'get_version', return_value=(1, 1))
+        mocked_get = mocker.patch.object(RoleRepository, 'get_details')
+        mocked_get_body = mocker.patch.object(role_details_cache, 'get_body')
+
+        result, body = self.service.get_details_json(1, lambda version: "unchanged")
+
+        assert result == "unchanged"
+        assert body is None
+        assert mocked_get.called is False
+        assert mocked_get_body.called is False
+
     def test_get_details_does_not_exist(self, mocker):
-        mocked_get_all = mocker.patch.object(RoleRepository, 'get_by_id', return_value=None)
+        mocked_get_all = mocker.patch.object(RoleRepository, 'get_details', return_value=None)
 
         with pytest.raises(ValidationException):
             self.service.get_details(1)
@@ -81,6 +110,38 @@ class TestRoleService:
         assert result
         assert result.id == role1.id
 
+    def test_create_batch_upsert_invalidates_updated(self, mocker):
+        role1, role2 = create_random_role(), create_random_role()
+        updated = [create_random_role(name=i.name, description="updated") for i in (role1, role2)]
+        for role, model in zip((role1, role2), updated):
+            model.id = role.id
+
+        mocker.patch.object(RoleRepository, 'get_by_id', side_effect=[role1, role2])
+        mocker.patch.object(RoleRepository, 'get_by_names', side_effect=[[role1, role2], updated])
+        # role2 was given the same description by another request meanwhile, so the upsert left it unchanged
+        mocked_save_batch = mocker.patch.object(RoleRepository, 'save_batch', return_value=[role1.id])
+        mocked_publish = mocker.patch("app.services.role.invalidation_bus.publish")
+        self.service.get_by_id(role1.id)
+        self.service.get_by_id(role2.id)
+
+        result = self.service.create_batch([RoleCreateDTO(name=i.name, description="updated") for i in (role1, role2)],
+                                           upsert=True)
+
+        assert mocked_save_batch.called is True
+        assert [i.description for i in result] == ["updated", "updated"]
+        assert role_cache.get(role1.id) is None
+        assert role_cache.get(role2.id) is not None
+        mocked_publish.assert_called_once_with("role", role1.id)
+
+    def test_create_batch_name_created_meanwhile(self, mocker):
+        role1 = create_random_role()
+
+        mocker.patch.object(RoleRepository, 'get_by_names', side_effect=[[], [role1]])
+        mocker.patch.object(RoleRepository, 'save_batch', side_effect=IntegrityError("INSERT", {}, Exception()))
+
+        with pytest.raises(ValidationException, match="Roles already exist with the names: %s" % role1.name):
+            self.service.create_batch([RoleCreateDTO(name=role1.name)])
+
     def test_create_name_already_exists(self, mocker):
         role1 = create_random_role()
 
@@ -174,18 +235,17 @@ class TestRoleService:
         right2 = create_random_right()
 
         mocked_get_role = mocker.patch.object(RoleService, 'get_by_id', return_value=role1)
-        mocked_get_rights = mocker.patch.object(RightService, 'get_by_id', side_effect=[right1, right2])
+        mocked_get_rights = mocker.patch.object(RightService, 'get_by_ids', return_value=[right1, right2])
         mocked_add_rights = mocker.patch.object(RoleRepository, 'add_rights', return_value=role1)
+        mocked_set_role_rights = mocker.patch.object(PermissionService, 'set_role_rights')
 
         result = self.service.add_rights(role1.id, [right1.id, right2.id])
 
         assert mocked_get_role.called is True
         assert mocked_get_rights.called is True
-        mocked_get_rights.assert_has_calls([
-            call(right1.id),
-            call(right2.id)
-        ])
+        mocked_get_rights.assert_called_once_with([right1.id, right2.id])
         mocked_add_rights.assert_called_with(mock.ANY, role1.id, [right1.id, right2.id])
+        mocked_set_role_rights.assert_called_once_with(role1.id, [i.id for i in role1.rights])
         assert result
 
     def test_add_rights_role_does_not_exist(self, mocker):
@@ -194,7 +254,7 @@ class TestRoleService:
         right2 = create_random_right()
 
         mocked_get_role = mocker.patch.object(RoleService, 'get_by_id', return_value=None)
-        mocked_get_rights = mocker.patch.object(RightService, 'get_by_id', side_effect=[right1, right2])
+        mocked_get_rights = mocker.patch.object(RightService, 'get_by_ids', return_value=[right1, right2])
         mocked_add_rights = mocker.patch.object(RoleRepository, 'add_rights', return_value=role1)
 
         with pytest.raises(ValidationException):
@@ -210,7 +270,7 @@ class TestRoleService:
         right2 = create_random_right()
 
         mocked_get_role = mocker.patch.object(RoleService, 'get_by_id', return_value=role1)
-        mocked_get_rights = mocker.patch.object(RightService, 'get_by_id', side_effect=[right1, None])
+        mocked_get_rights = mocker.patch.object(RightService, 'get_by_ids', return_value=[right1])
         mocked_add_rights = mocker.patch.object(RoleRepository, 'add_rights', return_value=role1)
 
         with pytest.raises(ValidationException):
@@ -226,17 +286,14 @@ class TestRoleService:
         right2 = create_random_right()
 
         mocked_get_role = mocker.patch.object(RoleService, 'get_by_id', return_value=role1)
-        mocked_get_rights = mocker.patch.object(RightService, 'get_by_id', side_effect=[right1, right2])
+        mocked_get_rights = mocker.patch.object(RightService, 'get_by_ids', return_value=[right1, right2])
         mocked_remove_rights = mocker.patch.object(RoleRepository, 'remove_rights', return_value=role1)
 
         result = self.service.remove_rights(role1.id, [right1.id, right2.id])
 
         assert mocked_get_role.called is True
         assert mocked_get_rights.called is True
-        mocked_get_rights.assert_has_calls([
-            call(right1.id),
-            call(right2.id)
-        ])
+        mocked_get_rights.assert_called_once_with([right1.id, right2.id])
         mocked_remove_rights.assert_called_with(mock.ANY, role1.id, [right1.id, right2.id])
         assert result
 
@@ -246,7 +303,7 @@ class TestRoleService:
         right2 = create_random_right()
 
         mocked_get_role = mocker.patch.object(RoleService, 'get_by_id', return_value=None)
-        mocked_get_rights = mocker.patch.object(RightService, 'get_by_id', side_effect=[right1, right2])
+        mocked_get_rights = mocker.patch.object(RightService, 'get_by_ids', return_value=[right1, right2])
         mocked_remove_rights = mocker.patch.object(RoleRepository, 'remove_rights', return_value=role1)
 
         with pytest.raises(ValidationException):
@@ -262,7 +319,7 @@ class TestRoleService:
         right2 = create_random_right()
 
         mocked_get_role = mocker.patch.object(RoleService, 'get_by_id', return_value=role1)
-        mocked_get_rights = mocker.patch.object(RightService, 'get_by_id', side_effect=[right1, None])
+        mocked_get_rights = mocker.patch.object(RightService, 'get_by_ids', return_value=[right1])
         mocked_remove_rights = mocker.patch.object(RoleRepository, 'remove_rights', return_value=role1)
 
         with pytest.raises(ValidationException):
@@ -0,0 +1,24 @@
+from app.repositories.search import SearchRepository
+from app.services.search import SearchService
+from app.tests.utils.utils import create_random_user, create_random_role, create_random_right
+
+
+class TestSearchService:
+
+    def setup(self):
+        self.service = SearchService()
+
+    def test_search(self, mocker):
+        user1 = create_random_user()
+        role1 = create_random_role()
+        right1 = create_random_right()
+        mocked_users = mocker.patch.object(SearchRepository, 'search_users', return_value=[user1])
+        mocker.patch.object(SearchRepository, 'search_roles', return_value=[role1])
+        mocker.patch.object(SearchRepository, 'search_rights', return_value=[right1])
+
+        result = self.service.search("smith", 5)
+
+        assert mocked_users.call_args[0][1:] == ("smith", 5)
+        assert [i.email for i in result.users] == [user1.email]
+        assert [i.name for i in result.roles] == [role1.name]
+        assert [i.name for i in result.rights] == [right1.name]
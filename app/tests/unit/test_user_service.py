@@ -1,15 +1,19 @@
+import json
 from unittest import mock
-from unittest.mock import call
 
 import pytest
+from sqlalchemy.exc import IntegrityError
 
 from app.config.exceptions import ValidationException
 from app.repositories.user import UserRepository
 from app.schemas.user import UserCreateDTO, UserUpdateDTO
 from app.services.organization import OrganizationService
+from app.services.permission import PermissionService
 from app.services.role import RoleService
 from app.services.user import UserService
-from app.tests.utils.utils import create_random_user, create_random_organization, create_random_role
+from app.settings import settings
+from app.tests.utils.utils import create_random_user, create_random_organization, create_random_role, \
+    create_random_right
 
 
 class TestUserService:
@@ -28,7 +32,68 @@ class TestUserService:
 
         assert mocked_get_all.called is True
         assert result
-        assert len(result) == 2
+        assert len(result.items) == 2
+        assert result.next_cursor is None
+
+    def test_export(self, mocker):
+        mocker.patch.object(settings, 'EXPORT_BATCH_SIZE', 2)
+        rows = [(i, "user%s@example.com" % i, "First", "Last", True, False, 1) for i in range(1, 4)]
+        mocked_iter_export = mocker.patch.object(UserRepository, 'iter_export', return_value=iter(rows))
+
+        chunks = list(self.service.export("ndjson", organization_id=1))
+
+        mocked_iter_export.assert_called_once_with(mock.ANY, 1, None, 2)
+        assert len(chunks) == 2
+        assert json.loads("".join(chunks).splitlines()[2]) == {
+            "id": 3, "email": "user3@example.com", "first_name": "First", "last_name": "Last",
+            "is_active": True, "is_admin": False, "organization_id": 1,
+        }
+
+    def test_export_csv(self, mocker):
+        rows = [(1, "user1@example.com", "First", "Last", True, False, 1)]
+        mocker.patch.object(UserRepository, 'iter_export', return_value=iter(rows))
+
+        result = "".join(self.service.export("csv")).splitlines()
+
+        assert result == ["id,email,first_name,last_name,is_active,is_admin,organization_id",
+                          "1,user1@example.com,First,Last,True,False,1"]
+
+    def test_import_users(self, mocker):
+        org = create_random_organization()
+        mocked_get_existing_emails = mocker.patch.object(UserRepository, 'get_existing_emails', return_value=set())
+        mocker.patch.object(OrganizationService, 'get_by_ids', return_value=[org])
+        mocked_bulk_create = mocker.patch.object(UserRepository, 'bulk_create')
+
+        content = '{"email": "a@example.com", "organization_id": %s}\n[]' % org.id
+        result = self.service.import_users("ndjson", content)
+
+        mocked_get_existing_emails.assert_called_once_with(mock.ANY, ["a@example.com"])
+        assert [i.email for i in mocked_bulk_create.call_args[0][1]] == ["a@example.com"]
+        assert result.created == 1
+        assert [(i.line, i.error) for i in result.errors] == [(2, "A user must be an object")]
+
+    def test_import_users_chunk_rolled_back(self, mocker):
+        org = create_random_organization()
+        mocker.patch.object(UserRepository, 'get_existing_emails', return_value=set())
+        mocker.patch.object(OrganizationService, 'get_by_ids', return_value=[org])
+        mocker.patch.object(UserRepository, 'bulk_create', side_effect=IntegrityError("INSERT", {}, Exception("unique")))
+
+        result = self.service.import_users("csv", "email,organization_id\na@example.com,%s\n" % org.id)
+
+        assert result.created == 0
+        assert [(i.line, i.error) for i in result.errors] == [(2, "Not created: unique")]
+
+    def test_get_all_next_cursor(self, mocker):
+        org = create_random_organization()
+        users = [create_random_user(organization=org) for _ in range(3)]
+
+        mocked_get_all = mocker.patch.object(UserRepository, 'get_all', return_value=users)
+
+        result = self.service.get_all(after=10, limit=2)
+
+        mocked_get_all.assert_called_with(mock.ANY, 10, 3, None, "id", None)
+        assert [i.id for i in result.items] == [users[0].id, users[1].id]
+        assert result.next_cursor == users[1].id
 
     def test_get_by_id_exits(self, mocker):
         org = create_random_organization()
@@ -54,7 +119,7 @@ class TestUserService:
         org = create_random_organization()
         user1 = create_random_user(organization=org)
 
-        mocked_get_all = mocker.patch.object(UserRepository, 'get_by_id', return_value=user1)
+        mocked_get_all = mocker.patch.object(UserRepository, 'get_details', return_value=user1)
 
         result = self.service.get_details(user1.id)
 
@@ -63,13 +128,62 @@ class TestUserService:
         assert result.id == user1.id
 
     def test_get_details_does_not_exist(self, mocker):
-        mocked_get_all = mocker.patch.object(UserRepository, 'get_by_id', return_value=None)
+        mocked_get_all = mocker.patch.object(UserRepository, 'get_details', return_value=None)
 
         with pytest.raises(ValidationException):
             self.service.get_details(1)
 
         assert mocked_get_all.called is True
 
+    def test_get_details_if_modified(self, mocker):
+        user1 = create_random_user(organization=create_random_organization())
+        mocked_get_version = mocker.patch.object(UserRepository, 'get_version', return_value=(user1.id, 1))
+        mocked_get_details = mocker.patch.object(UserRepository, 'get_details', return_value=user1)
+        unchanged = mock.Mock(return_value=None)
+
+        result, details = self.service.get_details_if_modified(user1.id, unchanged)
+
+        unchanged.assert_called_once_with((user1.id, 1))
+        assert result is None
+        assert details.id == user1.id
+        # Both are read in the same session
+        assert mocked_get_version.call_args[0][0] is mocked_get_details.call_args[0][0]
+
+    def test_get_details_if_modified_unchanged(self, mocker):
+        mocker.patch.object(UserRepository, 'get_version', return_value=(1, 1))
+        mocked_get_details = mocker.patch.object(UserRepository, 'get_details')
+
+        result, details = self.service.get_details_if_modified(1, lambda version: "unchanged")
+
+        assert result == "unchanged"
+        assert details is None
+        assert mocked_get_details.called is False
+
+    def test_get_rights(self, mocker):
+        org = create_random_organization()
+        user1 = create_random_user(organization=org)
+        right1 = create_random_right()
+
+        mocked_get_by_id = mocker.patch.object(UserRepository, 'get_by_id', return_value=user1)
+        mocked_get_rights = mocker.patch.object(UserRepository, 'get_rights', return_value=[right1])
+
+        result = self.service.get_rights(user1.id, after=3, limit=5)
+
+        assert mocked_get_by_id.called is True
+        mocked_get_rights.assert_called_with(mock.ANY, user1.id, 3, 6)
+        assert [i.id for i in result.items] == [right1.id]
+        assert result.next_cursor is None
+
+    def test_get_rights_does_not_exist(self, mocker):
+        mocked_get_by_id = mocker.patch.object(UserRepository, 'get_by_id', return_value=None)
+        mocked_get_rights = mocker.patch.object(UserRepository, 'get_rights')
+
+        with pytest.raises(ValidationException):
+            self.service.get_rights(1)
+
+        assert mocked_get_by_id.called is True
+        assert mocked_get_rights.called is False
+
     def test_create(self, mocker):
         org = create_random_organization()
         user1 = create_random_user(organization=org)
@@ -203,18 +317,17 @@ class TestUserService:
         role2 = create_random_role()
 
         mocked_get_user = mocker.patch.object(UserService, 'get_by_id', return_value=user1)
-        mocked_get_rights = mocker.patch.object(RoleService, 'get_by_id', side_effect=[role1, role2])
+        mocked_get_rights = mocker.patch.object(RoleService, 'get_by_ids', return_value=[role1, role2])
         mocked_add_roles = mocker.patch.object(UserRepository, 'add_roles', return_value=user1)
+        mocked_set_user_roles = mocker.patch.object(PermissionService, 'set_user_roles')
 
         result = self.service.add_roles(user1.id, [role1.id, role2.id])
 
         assert mocked_get_user.called is True
         assert mocked_get_rights.called is True
-        mocked_get_rights.assert_has_calls([
-            call(role1.id),
-            call(role2.id)
-        ])
+        mocked_get_rights.assert_called_once_with([role1.id, role2.id])
         mocked_add_roles.assert_called_with(mock.ANY, user1.id, [role1.id, role2.id])
+        mocked_set_user_roles.assert_called_once_with(user1.id, [i.id for i in user1.roles])
         assert result
 
     def test_add_roles_user_does_not_exist(self, mocker):
@@ -224,7 +337,7 @@ class TestUserService:
         role2 = create_random_role()
 
         mocked_get_role = mocker.patch.object(UserService, 'get_by_id', return_value=None)
-        mocked_get_rights = mocker.patch.object(RoleService, 'get_by_id', side_effect=[role1, role2])
+        mocked_get_rights = mocker.patch.object(RoleService, 'get_by_ids', return_value=[role1, role2])
         mocked_add_roles = mocker.patch.object(UserRepository, 'add_roles', return_value=user1)
 
         with pytest.raises(ValidationException):
@@ -241,7 +354,7 @@ class TestUserService:
         role2 = create_random_role()
 
         mocked_get_role = mocker.patch.object(UserService, 'get_by_id', return_value=user1)
-        mocked_get_rights = mocker.patch.object(RoleService, 'get_by_id', side_effect=[role1, None])
+        mocked_get_rights = mocker.patch.object(RoleService, 'get_by_ids', return_value=[role1])
         mocked_add_roles = mocker.patch.object(UserRepository, 'add_roles', return_value=user1)
 
         with pytest.raises(ValidationException):
@@ -258,17 +371,14 @@ class TestUserService:
         role2 = create_random_role()
 
         mocked_get_role = mocker.patch.object(UserService, 'get_by_id', return_value=user1)
-        mocked_get_rights = mocker.patch.object(RoleService, 'get_by_id', side_effect=[role1, role2])
+        mocked_get_rights = mocker.patch.object(RoleService, 'get_by_ids', return_value=[role1, role2])
         mocked_remove_roles = mocker.patch.object(UserRepository, 'remove_roles', return_value=user1)
 
         result = self.service.remove_roles(user1.id, [role1.id, role2.id])
 
         assert mocked_get_role.called is True
         assert mocked_get_rights.called is True
-        mocked_get_rights.assert_has_calls([
-            call(role1.id),
-            call(role2.id)
-        ])
+        mocked_get_rights.assert_called_once_with([role1.id, role2.id])
         mocked_remove_roles.assert_called_with(mock.ANY, user1.id, [role1.id, role2.id])
         assert result
 
@@ -279,7 +389,7 @@ class TestUserService:
         role2 = create_random_role()
 
         mocked_get_role = mocker.patch.object(UserService, 'get_by_id', return_value=None)
-        mocked_get_rights = mocker.patch.object(RoleService, 'get_by_id', side_effect=[role1, role2])
+        mocked_get_rights = mocker.patch.object(RoleService, 'get_by_ids', return_value=[role1, role2])
         mocked_remove_roles = mocker.patch.object(UserRepository, 'remove_roles', return_value=role1)
 
         with pytest.raises(ValidationException):
@@ -296,7 +406,7 @@ class TestUserService:
         role2 = create_random_role()
 
         mocked_get_role = mocker.patch.object(UserService, 'get_by_id', return_value=user1)
-        mocked_get_rights = mocker.patch.object(RoleService, 'get_by_id', side_effect=[role1, None])
+        mocked_get_rights = mocker.patch.object(RoleService, 'get_by_ids', return_value=[role1])
         mocked_remove_roles = mocker.patch.object(UserRepository, 'remove_roles', return_value=role1)
 
         with pytest.raises(ValidationException):
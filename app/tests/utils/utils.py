@@ -1,14 +1,50 @@
 import random
 import string
-from typing import List, Optional
+from contextlib import contextmanager
+from typing import Generator, List, Optional
 
-from app.db.database import db_session
+from sqlalchemy import event
+
+from app.db.database import db_session, engine
 from app.db.models import Organization, Role, User, Right
 from app.main import app
 
 reverse = app.router.url_path_for
 
 
+@contextmanager
+def count_queries() -> Generator[List[str], None, None]:
+    """
+    Context manager which records every SQL statement sent to the DB
+    while the nested block runs.
+    :return: the list of executed statements
+    """
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+@contextmanager
+def assert_queries(expected: int) -> Generator[List[str], None, None]:
+    """
+    Context manager which fails if the nested block does not send exactly the
+    expected number of SQL statements to the DB, like an extra query per row.
+    :param expected: the query budget of the block
+    :return: the list of executed statements
+    """
+    with count_queries() as statements:
+        yield statements
+    assert len(statements) == expected, "%s queries instead of %s:\n%s" % (
+        len(statements), expected, "\n".join(statements))
+
+
 def random_lower_string() -> str:
     return "".join(random.choices(string.ascii_lowercase, k=32))
 
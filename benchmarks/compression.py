@@ -0,0 +1,83 @@
+"""
+Benchmark of the response compression: CPU time against bytes on the wire, for each
+encoding and level, on payloads shaped like the ones of the API.
+ - users page: GET /users/ with the given page size
+ - organization details: GET /organizations/{id}, with its first page of users
+ - export chunk: a chunk of GET /users/export?format=ndjson
+
+Usage: python -m benchmarks.compression [number of users per page]
+"""
+import json
+import os
+import random
+import sys
+import tempfile
+import timeit
+
+for name, value in (("DB_SCHEME", "sqlite"), ("DB_SERVER", ""), ("DB_PORT", ""), ("DB_USER", ""),
+                    ("DB_PASSWORD", ""), ("DB_NAME", os.path.join(tempfile.gettempdir(), "benchmark.sqlite"))):
+    os.environ.setdefault(name, value)
+
+from app.compression import BrotliCompressor, GzipCompressor, brotli  # noqa: E402
+from app.db.models import User  # noqa: E402
+from app.encoders import dumps  # noqa: E402
+from app.schemas.organization import OrganizationDetailsDTO, OrganizationDTO  # noqa: E402
+from app.schemas.page import PageDTO  # noqa: E402
+from app.schemas.user import UserDTO  # noqa: E402
+from app.settings import settings  # noqa: E402
+from benchmarks.dataset import DOMAINS, FIRST_NAMES, LAST_NAMES  # noqa: E402
+
+
+def create_users(size: int):
+    rng = random.Random(0)
+    users = []
+    for i in range(1, size + 1):
+        first_name, last_name = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        email = "%s.%s%s@%s" % (first_name.lower(), last_name.lower(), rng.randint(1, 9999), rng.choice(DOMAINS))
+        users.append(User(id=i, email=email, first_name=first_name, last_name=last_name,
+                          is_active=rng.random() > 0.1, is_admin=rng.random() > 0.95, organization_id=1))
+    return users
+
+
+def create_payloads(size: int):
+    users = create_users(size + 1)
+    page = PageDTO[UserDTO].from_models(users, size, UserDTO.from_model)
+    org = OrganizationDTO(id=1, name="Example organization")
+    details = OrganizationDetailsDTO.construct(id=org.id, name=org.name, users=page.items, users_next_cursor=size)
+    export = "".join(json.dumps({"id": i.id, "email": i.email, "first_name": i.first_name, "last_name": i.last_name,
+                                 "is_active": i.is_active, "is_admin": i.is_admin,
+                                 "organization_id": i.organization_id}) + "\n" for i in users)
+    return [("users page", dumps(page)), ("organization details", dumps(details)), ("export chunk", export.encode())]
+
+
+def create_compressors():
+    """
+    The levels around the configured ones, which are marked with a star, and the extremes.
+    """
+    def levels(configured: int, others):
+        return [("%s%s" % (i, " *" if i == configured else ""), i) for i in sorted(set(others) | {configured})]
+
+    compressors = [("gzip %s" % name, lambda i=i: GzipCompressor(i))
+                   for name, i in levels(settings.COMPRESSION_GZIP_LEVEL, (1, 5, 6, 9))]
+    if brotli is not None:
+        compressors += [("br %s" % name, lambda i=i: BrotliCompressor(i))
+                        for name, i in levels(settings.COMPRESSION_BROTLI_QUALITY, (1, 4, 5, 6, 11))]
+    return compressors
+
+
+def main(size: int):
+    print("%s users per page, brotli %s" % (size, "installed" if brotli else "not installed"))
+    for name, payload in create_payloads(size):
+        print()
+        print("%s: %s bytes" % (name, len(payload)))
+        print("%-10s %10s %8s %12s %14s" % ("encoding", "bytes", "ratio", "ms/response", "MB/s of input"))
+        for encoding, create in create_compressors():
+            body = create().finish(payload)
+            number = 10
+            seconds = min(timeit.repeat(lambda: create().finish(payload), number=number, repeat=3)) / number
+            print("%-10s %10s %7.1f%% %12.3f %14.1f" % (encoding, len(body), 100.0 * len(body) / len(payload),
+                                                        seconds * 1e3, len(payload) / seconds / 1e6))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100)
@@ -0,0 +1,140 @@
+"""
+Synthetic dataset of the load tests: organizations, users, roles and rights, with the roles of
+each user and the rights of each role. The same seed always gives the same dataset, so the runs of
+different commits are comparable.
+The rows are built by the factories of the tests, then inserted in bulk (executemany), in batches.
+
+The DB is the one of the DB_* environment variables, SQLite benchmark.sqlite in the temporary directory
+by default. Its tables are dropped and created again.
+
+Usage: python -m benchmarks.dataset [users] [organizations] [roles] [rights]
+"""
+import os
+import random
+import sys
+import tempfile
+from typing import Dict, Iterable, List, NamedTuple
+
+for name, value in (("DB_SCHEME", "sqlite"), ("DB_SERVER", ""), ("DB_PORT", ""), ("DB_USER", ""),
+                    ("DB_PASSWORD", ""), ("DB_NAME", os.path.join(tempfile.gettempdir(), "benchmark.sqlite"))):
+    os.environ.setdefault(name, value)
+
+from sqlalchemy import Table, func, select, text  # noqa: E402
+
+from app.db.database import Base, engine  # noqa: E402
+from app.db.models import Organization, Right, Role, RoleRight, User, UserRole  # noqa: E402
+from app.tests.utils.utils import (create_random_organization, create_random_right, create_random_role,  # noqa: E402
+                                   create_random_user)
+
+BATCH_SIZE = 5000
+
+# Words of the user names and emails, shared by the payloads of the other benchmarks
+FIRST_NAMES = ["James", "Mary", "John", "Patricia", "Robert", "Jennifer", "Michael", "Linda", "William", "Elizabeth",
+               "David", "Barbara", "Richard", "Susan", "Joseph", "Jessica", "Thomas", "Sarah", "Charles", "Karen"]
+LAST_NAMES = ["Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Rodriguez", "Martinez",
+              "Hernandez", "Lopez", "Gonzalez", "Wilson", "Anderson", "Thomas", "Taylor", "Moore", "Jackson", "Martin"]
+DOMAINS = ["example.com", "example.org", "mail.example.net", "corp.example.com"]
+
+
+class DatasetSize(NamedTuple):
+    users: int = 10000
+    organizations: int = 10
+    roles: int = 50
+    rights: int = 200
+    roles_per_user: int = 2
+    rights_per_role: int = 10
+
+
+def insert(table: Table, rows: Iterable[dict]):
+    """
+    Inserts the rows with one executemany per batch, a multi-row INSERT on Postgres.
+    """
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            engine.execute(table.insert(), batch)
+            batch = []
+    if batch:
+        engine.execute(table.insert(), batch)
+
+
+def reset_sequences(tables: List[Table]):
+    """
+    The IDs are inserted explicitly, so the Postgres sequences have to be moved past them.
+    SQLite picks the next ID from the table itself.
+    """
+    if engine.dialect.name != "postgresql":
+        return
+    for table in tables:
+        engine.execute(text('SELECT setval(pg_get_serial_sequence(\'"%s"\', \'id\'), '
+                            'coalesce(max(id), 0) + 1, false) FROM "%s"' % (table.name, table.name)))
+
+
+def seed(size: DatasetSize, random_seed: int = 0) -> Dict[str, int]:
+    """
+    Creates the tables again and fills them with the dataset.
+    :param size: number of rows of each entity, and of associations of each user and role
+    :param random_seed: seed of the random values
+    :return: the number of rows of each table
+    """
+    random.seed(random_seed)
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    insert(Organization.__table__, (
+        {"id": i, "name": "%s %s" % (random.choice(LAST_NAMES), create_random_organization().name)}
+        for i in range(1, size.organizations + 1)
+    ))
+    insert(Right.__table__, (
+        {"id": i, "name": right.name, "description": right.description}
+        for i, right in ((i, create_random_right()) for i in range(1, size.rights + 1))
+    ))
+    insert(Role.__table__, (
+        {"id": i, "name": role.name, "description": role.description}
+        for i, role in ((i, create_random_role()) for i in range(1, size.roles + 1))
+    ))
+    insert(User.__table__, (create_user(i, size) for i in range(1, size.users + 1)))
+
+    right_ids = range(1, size.rights + 1)
+    insert(RoleRight.__table__, (
+        {"role_id": role_id, "right_id": right_id}
+        for role_id in range(1, size.roles + 1)
+        for right_id in random.sample(right_ids, min(size.rights_per_role, size.rights))
+    ))
+    role_ids = range(1, size.roles + 1)
+    insert(UserRole.__table__, (
+        {"user_id": user_id, "role_id": role_id}
+        for user_id in range(1, size.users + 1)
+        for role_id in random.sample(role_ids, min(size.roles_per_user, size.roles))
+    ))
+
+    tables = [Organization.__table__, Right.__table__, Role.__table__, User.__table__,
+              RoleRight.__table__, UserRole.__table__]
+    reset_sequences(tables)
+    return {i.name: engine.execute(select([func.count()]).select_from(i)).scalar() for i in tables}
+
+
+def create_user(id: int, size: DatasetSize) -> dict:
+    """
+    A user of a random organization, with a realistic name, so the name filters and the search
+    do not match every user.
+    """
+    user = create_random_user(is_admin=random.random() < 0.05)
+    first_name, last_name = random.choice(FIRST_NAMES), random.choice(LAST_NAMES)
+    # The ID keeps the email unique, the random part comes from the factory
+    email = "%s.%s.%s.%s@%s" % (first_name.lower(), last_name.lower(), id, user.email[:8], random.choice(DOMAINS))
+    return {
+        "id": id,
+        "email": email,
+        "first_name": first_name,
+        "last_name": last_name,
+        "is_active": random.random() > 0.1,
+        "is_admin": user.is_admin,
+        "organization_id": random.randint(1, size.organizations),
+    }
+
+
+if __name__ == "__main__":
+    size = DatasetSize(*[int(i) for i in sys.argv[1:5]])
+    print(seed(size))
@@ -0,0 +1,336 @@
+"""
+Load test of every endpoint of the API, on the synthetic dataset of benchmarks.dataset.
+The dataset is seeded, then the API is served by uvicorn in this process, and each endpoint is sent
+the given number of requests by the given number of concurrent clients, one endpoint after the other:
+reads first, then writes, then deletes of the rows the writes created.
+The latency percentiles, throughput, errors and DB queries per request of each endpoint are written
+to a JSON file, along with the commit and the DB, so runs can be compared across commits.
+
+The DB is the one of the DB_* environment variables, SQLite benchmark.sqlite in the temporary directory
+by default. For a local Postgres: DB_SCHEME=postgresql DB_SERVER=localhost DB_PORT=5432 DB_USER=... DB_PASSWORD=... DB_NAME=...
+
+Usage: python -m benchmarks.load [--users 10000] [--requests 200] [--concurrency 8] [--output report.json]
+                                 [--baseline previous.json] [--url http://host:port]
+With --url, the requests go to an API running elsewhere, on a DB seeded beforehand with
+benchmarks.dataset, and the DB queries are not counted.
+"""
+import argparse
+import contextvars
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from benchmarks.dataset import FIRST_NAMES, LAST_NAMES, DatasetSize, seed  # Sets the default DB environment variables first
+
+import requests
+import uvicorn
+from fastapi.routing import APIRoute
+
+from app.db.database import engine
+from app.db.queries import QueryStats, record_queries
+from app.main import app
+from app.metrics import request_metrics
+
+# Path of each route, by name
+ROUTES = {i.name: i.path for i in app.routes if isinstance(i, APIRoute)}
+
+
+class Request(NamedTuple):
+    method: str
+    path: str
+    params: Optional[dict] = None
+    json: Optional[object] = None
+    data: Optional[str] = None
+    # Status of a successful response
+    status: int = 200
+
+
+class Endpoint(NamedTuple):
+    """
+    Requests sent to the route of the given name, the i-th request of the run being request(i).
+    """
+    name: str
+    request: Callable[[int], Request]
+    # Number of requests, when it is bounded by the rows created by a previous endpoint
+    count: Optional[Callable[[], int]] = None
+
+
+def pick(i: int, count: int) -> int:
+    """
+    ID of the i-th request among count rows, spread over the table rather than hitting its first rows.
+    """
+    return 1 + (i * 7919) % count
+
+
+def create_endpoints(size: DatasetSize, created: Dict[str, List[int]]) -> List[Endpoint]:
+    """
+    :param size: size of the seeded dataset, the IDs of its rows going from 1 to the number of rows
+    :param created: IDs of the rows created by the write endpoints, by route name, to be deleted at the end
+    """
+    def user(i):
+        return pick(i, size.users)
+
+    def org(i):
+        return pick(i, size.organizations)
+
+    def role(i):
+        return pick(i, size.roles)
+
+    def right(i):
+        return pick(i, size.rights)
+
+    def name(i):
+        return FIRST_NAMES[i % len(FIRST_NAMES)]
+
+    def new_user(prefix, i):
+        return {"email": "%s.%s@load.example.com" % (prefix, i), "first_name": name(i),
+                "last_name": LAST_NAMES[i % len(LAST_NAMES)], "organization_id": org(i)}
+
+    def bulk(i):
+        return "".join(json.dumps(new_user("bulk.%s" % i, j)) + "\n" for j in range(100))
+
+    return [
+        # Reads
+        Endpoint("home", lambda i: Request("GET", "/", status=307)),
+        Endpoint("user-get-all", lambda i: Request("GET", "/users/", params={"limit": 100, "after": user(i)})),
+        Endpoint("user-get-all", lambda i: Request("GET", "/users/", params={"organization_id": org(i), "name": name(i)})),
+        Endpoint("user-get-all", lambda i: Request("GET", "/users/", params={"fields": "id,email,first_name"})),
+        Endpoint("user-get-details", lambda i: Request("GET", "/users/%s" % user(i))),
+        Endpoint("user-get-rights", lambda i: Request("GET", "/users/%s/rights" % user(i))),
+        Endpoint("user-export", lambda i: Request("GET", "/users/export", params={"organization_id": org(i)})),
+        Endpoint("organization-get-all", lambda i: Request("GET", "/organizations/")),
+        Endpoint("organization-get-details", lambda i: Request("GET", "/organizations/%s" % org(i))),
+        Endpoint("organization-get-users", lambda i: Request("GET", "/organizations/%s/users" % org(i))),
+        Endpoint("role-get-all", lambda i: Request("GET", "/roles/")),
+        Endpoint("role-get-details", lambda i: Request("GET", "/roles/%s" % role(i))),
+        Endpoint("right-get-all", lambda i: Request("GET", "/rights/")),
+        Endpoint("right-get-details", lambda i: Request("GET", "/rights/%s" % right(i))),
+        Endpoint("permission-check", lambda i: Request("POST", "/permissions/check", json=[
+            {"user_id": user(i + j), "right_id": right(i + j)} for j in range(100)])),
+        Endpoint("search", lambda i: Request("GET", "/search/", params={"q": LAST_NAMES[i % len(LAST_NAMES)][:5]})),
+        Endpoint("monitoring-pool", lambda i: Request("GET", "/monitoring/pool")),
+        Endpoint("monitoring-cache", lambda i: Request("GET", "/monitoring/cache")),
+        Endpoint("metrics", lambda i: Request("GET", "/metrics")),
+        # Writes
+        Endpoint("user-create", lambda i: Request("POST", "/users/", json=new_user("load", i))),
+        Endpoint("user-bulk-import", lambda i: Request("POST", "/users/bulk", data=bulk(i))),
+        Endpoint("user-update", lambda i: Request("PUT", "/users/%s" % user(i), json={
+            "first_name": name(i + 1), "organization_id": org(i)})),
+        Endpoint("user-add-roles", lambda i: Request("PUT", "/users/%s/roles" % user(i), json=[role(i)])),
+        Endpoint("user-remove-roles", lambda i: Request("DELETE", "/users/%s/roles" % user(i), json=[role(i)])),
+        Endpoint("organization-create", lambda i: Request("POST", "/organizations/", json={"name": "load %s" % i})),
+        Endpoint("organization-update", lambda i: Request("PUT", "/organizations/%s" % created["organization-create"][i],
+                                                          json={"name": "load updated %s" % i}),
+                 lambda: len(created["organization-create"])),
+        Endpoint("role-create", lambda i: Request("POST", "/roles/", json={"name": "load %s" % i})),
+        Endpoint("role-create-batch", lambda i: Request("POST", "/roles/batch", json=[
+            {"name": "load batch %s %s" % (i, j)} for j in range(10)])),
+        Endpoint("role-update", lambda i: Request("PUT", "/roles/%s" % created["role-create"][i],
+                                                  json={"name": "load updated %s" % i, "description": "updated"}),
+                 lambda: len(created["role-create"])),
+        Endpoint("role-add-rights", lambda i: Request("PUT", "/roles/%s/rights" % role(i), json=[right(i)])),
+        Endpoint("role-remove-rights", lambda i: Request("DELETE", "/roles/%s/rights" % role(i), json=[right(i)])),
+        Endpoint("right-create", lambda i: Request("POST", "/rights/", json={"name": "load %s" % i})),
+        Endpoint("right-create-batch", lambda i: Request("POST", "/rights/batch", json=[
+            {"name": "load batch %s %s" % (i, j)} for j in range(10)])),
+        Endpoint("right-update", lambda i: Request("PUT", "/rights/%s" % created["right-create"][i],
+                                                   json={"name": "load updated %s" % i, "description": "updated"}),
+                 lambda: len(created["right-create"])),
+        # Deletes of the created rows
+        Endpoint("user-delete", lambda i: Request("DELETE", "/users/%s" % created["user-create"][i]),
+                 lambda: len(created["user-create"])),
+        Endpoint("organization-delete", lambda i: Request("DELETE", "/organizations/%s" % created["organization-create"][i]),
+                 lambda: len(created["organization-create"])),
+        Endpoint("role-delete", lambda i: Request("DELETE", "/roles/%s" % created["role-create"][i]),
+                 lambda: len(created["role-create"])),
+        Endpoint("right-delete", lambda i: Request("DELETE", "/rights/%s" % created["right-create"][i]),
+                 lambda: len(created["right-create"])),
+    ]
+
+
+class BackgroundServer(uvicorn.Server):
+    """
+    Serves the API in a thread of this process, where the DB queries can be counted.
+    The thread runs in a copy of the context of the caller, so the queries are recorded by its record_queries() block.
+    """
+
+    def install_signal_handlers(self):
+        # Signal handlers can only be installed by the main thread
+        pass
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=contextvars.copy_context().run, args=(self.run,), daemon=True)
+        self.thread.start()
+        while not self.started:
+            if not self.thread.is_alive():
+                raise RuntimeError("The API could not be started")
+            time.sleep(0.05)
+        return self
+
+    def __exit__(self, *args):
+        self.should_exit = True
+        self.thread.join()
+
+
+def percentile(values: List[float], rank: float) -> float:
+    """
+    Nearest-rank percentile of sorted values.
+    """
+    index = max(0, min(len(values) - 1, int(round(rank / 100 * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+def run_endpoint(url: str, endpoint: Endpoint, count: int, concurrency: int, queries: Optional[QueryStats],
+                 created: Dict[str, List[int]]) -> dict:
+    local = threading.local()
+
+    def send(i: int):
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        request = endpoint.request(i)
+        started = time.perf_counter()
+        response = local.session.request(request.method, url + request.path, params=request.params, json=request.json,
+                                         data=request.data, allow_redirects=False)
+        latency = time.perf_counter() - started
+        if response.status_code == request.status and endpoint.name.endswith("-create"):
+            created[endpoint.name].append(response.json()["id"])
+        return request, latency, response.status_code == request.status
+
+    count_before = queries.count if queries else 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(send, range(count)))
+    elapsed = time.perf_counter() - started
+    if queries:
+        # The queries of a request are added once it is done, which may be after the client got the response
+        while request_metrics.in_flight:
+            time.sleep(0.001)
+    latencies = sorted(i[1] * 1e3 for i in results)
+    request = results[0][0]
+    return {
+        "name": endpoint.name,
+        "method": request.method,
+        "path": ROUTES[endpoint.name],
+        # Tells apart the requests of the same route with different query parameters
+        "query": ",".join(request.params or {}),
+        "requests": count,
+        "errors": sum(1 for i in results if not i[2]),
+        "throughput": round(count / elapsed, 1),
+        "mean_ms": round(sum(latencies) / count, 3),
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "queries_per_request": round((queries.count - count_before) / count, 2) if queries else None,
+    }
+
+
+def run_and_print(url: str, endpoint: Endpoint, count: int, concurrency: int, queries: Optional[QueryStats],
+                  created: Dict[str, List[int]], report: dict):
+    count = endpoint.count() if endpoint.count else count
+    if count:
+        report["endpoints"].append(run_endpoint(url, endpoint, count, concurrency, queries, created))
+        print_result(report["endpoints"][-1])
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(size: DatasetSize, random_seed: int, count: int, concurrency: int, url: Optional[str] = None) -> dict:
+    """
+    Seeds the dataset, unless the API runs elsewhere, and sends the requests of every endpoint.
+    :return: the report of the run
+    """
+    created = {i: [] for i in ("user-create", "organization-create", "role-create", "right-create")}
+    endpoints = create_endpoints(size, created)
+    missing = [i for i in ROUTES if i not in {j.name for j in endpoints}]
+    if missing:
+        print("No requests for the routes %s" % ", ".join(missing), file=sys.stderr)
+
+    report = {
+        "commit": git_commit(),
+        "date": datetime.utcnow().isoformat(),
+        "python": sys.version.split()[0],
+        "db": None if url else engine.dialect.name,
+        "dataset": size._asdict(),
+        "seed": random_seed,
+        "requests": count,
+        "concurrency": concurrency,
+        "endpoints": [],
+    }
+    if url:
+        for endpoint in endpoints:
+            run_and_print(url, endpoint, count, concurrency, None, created, report)
+        return report
+
+    report["rows"] = seed(size, random_seed)
+    # uvloop only provides an event loop to the main thread
+    config = uvicorn.Config(app, host="127.0.0.1", port=0, loop="asyncio", log_level="warning", access_log=False)
+    with record_queries() as queries, BackgroundServer(config) as server:
+        port = server.servers[0].sockets[0].getsockname()[1]
+        for endpoint in endpoints:
+            run_and_print("http://127.0.0.1:%s" % port, endpoint, count, concurrency, queries, created, report)
+    return report
+
+
+def print_result(result: dict, baseline: Optional[dict] = None):
+    route = "%s?%s" % (result["path"], result["query"]) if result["query"] else result["path"]
+    line = "%-6s %-40s %8.2f ms p50 %8.2f ms p95 %8.2f ms p99 %8.1f req/s" % (
+        result["method"], route[:40], result["p50_ms"], result["p95_ms"], result["p99_ms"], result["throughput"])
+    if result["queries_per_request"] is not None:
+        line += " %6.2f queries" % result["queries_per_request"]
+    if result["errors"]:
+        line += " %s errors" % result["errors"]
+    if baseline:
+        p50 = 100 * (result["p50_ms"] / baseline["p50_ms"] - 1)
+        p95 = 100 * (result["p95_ms"] / baseline["p95_ms"] - 1)
+        line += " (p50 %+.0f%%, p95 %+.0f%%)" % (p50, p95)
+    print(line)
+
+
+def compare(report: dict, baseline: dict):
+    """
+    Prints the results of the run against the ones of the same endpoints in a previous run.
+    """
+    print("Against %s (%s)" % (baseline["commit"], baseline["date"]))
+    previous = {(i["name"], i["query"]): i for i in baseline["endpoints"]}
+    for result in report["endpoints"]:
+        print_result(result, previous.get((result["name"], result["query"])))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    defaults = DatasetSize()
+    for name in DatasetSize._fields:
+        parser.add_argument("--" + name.replace("_", "-"), type=int, default=getattr(defaults, name))
+    parser.add_argument("--seed", type=int, default=0, help="seed of the dataset")
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent clients")
+    parser.add_argument("--output", help="JSON report, load-<db>-<commit>.json by default")
+    parser.add_argument("--baseline", help="JSON report of a previous run to compare with")
+    parser.add_argument("--url", help="URL of an API already running, on a seeded DB")
+    args = parser.parse_args()
+
+    size = DatasetSize(*[getattr(args, i) for i in DatasetSize._fields])
+    report = run(size, args.seed, args.requests, args.concurrency, args.url)
+    output = args.output or "load-%s-%s.json" % (report["db"] or "remote", (report["commit"] or "unknown")[:10])
+    with open(output, "w") as file:
+        json.dump(report, file, indent=2)
+    print("Report written to %s" % output)
+    if args.baseline:
+        with open(args.baseline) as file:
+            compare(report, json.load(file))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Micro-benchmark of the serialization of a GET /users/ page, per user:
+ - validated: the DTOs are validated when built, and again against the response_model of the route,
+   then encoded by jsonable_encoder and the standard json module, as FastAPI does by default.
+ - trusted: the DTOs are built without validation, and sent with DTOResponse (orjson when installed).
+
+Usage: python -m benchmarks.serialization [number of users per page]
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import timeit
+
+for name, value in (("DB_SCHEME", "sqlite"), ("DB_SERVER", ""), ("DB_PORT", ""), ("DB_USER", ""),
+                    ("DB_PASSWORD", ""), ("DB_NAME", os.path.join(tempfile.gettempdir(), "benchmark.sqlite"))):
+    os.environ.setdefault(name, value)
+
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_response_field  # noqa: E402
+from starlette.responses import JSONResponse  # noqa: E402
+
+from app.db.models import User  # noqa: E402
+from app.encoders import orjson  # noqa: E402
+from app.routers.responses import DTOResponse  # noqa: E402
+from app.schemas.page import PageDTO  # noqa: E402
+from app.schemas.user import UserDTO  # noqa: E402
+
+
+def validated(users, field) -> bytes:
+    items = users[:-1]
+    page = PageDTO[UserDTO](
+        items=[UserDTO(id=i.id, email=i.email, is_active=i.is_active, is_admin=i.is_admin,
+                       first_name=i.first_name, last_name=i.last_name) for i in items],
+        next_cursor=items[-1].id,
+    )
+    content = asyncio.get_event_loop().run_until_complete(serialize_response(field=field, response_content=page))
+    return JSONResponse(content).body
+
+
+def trusted(users) -> bytes:
+    return DTOResponse(PageDTO[UserDTO].from_models(users, len(users) - 1, UserDTO.from_model)).body
+
+
+def main(size: int):
+    users = [User(id=i, email="user%s@example.com" % i, first_name="First %s" % i, last_name="Last %s" % i,
+                  is_active=True, is_admin=False) for i in range(1, size + 2)]
+    field = create_response_field(name="response", type_=PageDTO[UserDTO])
+    assert json.loads(validated(users, field)) == json.loads(trusted(users))
+
+    print("%s users per page, orjson %s" % (size, "installed" if orjson else "not installed"))
+    for name, run in (("validated", lambda: validated(users, field)), ("trusted", lambda: trusted(users))):
+        number = 20
+        seconds = min(timeit.repeat(run, number=number, repeat=5)) / number
+        print("%-10s %8.2f ms per page %8.2f us per user" % (name, seconds * 1e3, seconds * 1e6 / size))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100)